@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Measures the cost of Events lookups as the number of stored events grows.
+With the indexed store the per lookup cost should stay flat.
+
+Usage: PYTHONPATH=src python bench/bench_events.py
+"""
+import timeit
+
+from otest.events import EV_CONDITION
+from otest.events import EV_FAULT
+from otest.events import EV_HTTP_REQUEST
+from otest.events import EV_RESPONSE
+from otest.events import Events
+
+TYPES = [EV_HTTP_REQUEST, EV_RESPONSE, EV_CONDITION]
+
+
+def populate(num):
+    events = Events()
+    for i in range(num):
+        events.store(TYPES[i % len(TYPES)], i, sender='bench')
+    events.store(EV_FAULT, 'fault')
+    return events
+
+
+def lookups(events):
+    events.last(EV_FAULT)
+    events.last_item(EV_FAULT)
+    events.get_data(EV_FAULT)
+    events.by_ref('nothing')
+    events.by_index(events.events[len(events) // 2].timestamp)
+
+
+if __name__ == '__main__':
+    rounds = 1000
+    print('{:>8} {:>14}'.format('events', 'usec/lookup'))
+    for num in [100, 1000, 10000, 100000]:
+        _ev = populate(num)
+        t = timeit.timeit(lambda: lookups(_ev), number=rounds)
+        print('{:>8} {:>14.2f}'.format(num, t / rounds * 1e6))
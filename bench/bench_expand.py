@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Cost of RPFlow.expanded_conf over all the flow descriptions in tests/flows
+with factories that scan their module with inspect.getmembers on every
+lookup (what all factories did before otest.registry) and with factories
+that go through the registry, with and without RPFlow's memo.
+
+The operation classes and functions used by tests/flows are defined by
+oidctest, so it has to be installed.
+
+Usage: PYTHONPATH=src python bench/bench_expand.py
+"""
+import inspect
+import os
+import sys
+import timeit
+
+from otest import Unknown
+from otest.flow import RPFlow
+from otest.registry import FUNCTIONS
+from otest.registry import OPERATIONS
+
+from oidctest.op import func
+from oidctest.op import oper
+
+FLOW_DIR = os.path.join(os.path.dirname(__file__), '..', 'tests', 'flows')
+
+OPER_MODULES = ['oidctest.op.oper', 'otest.aus.operation', 'otest.operation']
+FUNC_MODULES = ['oidctest.op.func', 'otest.func']
+
+
+def scan(module, name, predicate):
+    for fname, obj in inspect.getmembers(sys.modules[module]):
+        if predicate(obj) and fname == name:
+            return obj
+    return None
+
+
+def chain(lookup, modules, predicate=None):
+    def factory(name):
+        for module in modules:
+            obj = lookup(module, name, predicate)
+            if obj:
+                return obj
+        if predicate is not inspect.isfunction:
+            raise Unknown(name)
+        return None
+    return factory
+
+
+def registry(reg):
+    return lambda module, name, predicate: reg.lookup(module, name)
+
+
+def expand_all(flows, memo=True):
+    for tid in flows.keys():
+        if not memo:
+            # Every name goes to the factories, as before RPFlow memoized
+            flows._resolved_version = None
+        flows.expanded_conf(tid)
+
+
+if __name__ == '__main__':
+    assert oper and func
+
+    before = RPFlow(FLOW_DIR, None,
+                    {'': chain(scan, OPER_MODULES, inspect.isclass)},
+                    chain(scan, FUNC_MODULES, inspect.isfunction))
+    after = RPFlow(FLOW_DIR, None,
+                   {'': chain(registry(OPERATIONS), OPER_MODULES)},
+                   chain(registry(FUNCTIONS), FUNC_MODULES,
+                         inspect.isfunction))
+
+    rounds = 10
+    print('{} flow descriptions'.format(len(list(before.keys()))))
+    for label, flows, memo in [('before (scan)', before, False),
+                               ('registry', after, False),
+                               ('registry + memo', after, True)]:
+        expand_all(flows)
+        t = timeit.timeit(lambda: expand_all(flows, memo), number=rounds)
+        print('{:>16}: {:8.2f} ms for all test IDs'.format(
+            label, t / rounds * 1000))
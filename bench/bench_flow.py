@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Latency of rendering the test list (FlowState.display_info) for the flow
+descriptions in tests/flows, with a cold and a warm flow description cache.
+A cold cache is what every call cost before the cache was introduced.
+
+Usage: PYTHONPATH=src python bench/bench_flow.py
+"""
+import os
+import timeit
+
+from otest.flow import FlowState
+from otest.flow import GRPS
+from otest.flow import SpecCache
+
+FLOW_DIR = os.path.join(os.path.dirname(__file__), '..', 'tests', 'flows')
+
+
+def list_page(flows):
+    tids = flows.matches_profile('C.T.T.T')
+    return flows.display_info(tids)
+
+
+if __name__ == '__main__':
+    cache = SpecCache()
+    flows = FlowState(FLOW_DIR, None, {}, None, display_order=GRPS,
+                      spec_cache=cache)
+    rounds = 50
+
+    def cold():
+        cache.invalidate()
+        list_page(flows)
+
+    print('{} flow descriptions'.format(len(list(flows.keys()))))
+    for label, func in [('before (cold)', cold),
+                        ('after (warm)', lambda: list_page(flows))]:
+        t = timeit.timeit(func, number=rounds)
+        print('{:>14}: {:8.2f} ms/page'.format(label, t / rounds * 1000))
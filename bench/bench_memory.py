@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Compares the memory used by the events of a session before and after the
+compact Event representation.
+
+For every flow description in tests/flows a conversation is simulated,
+storing the events a real run of the flow would store. This is repeated for
+a number of sessions and the resulting RSS is reported.
+
+Usage: PYTHONPATH=src python bench/bench_memory.py [-n sessions]
+
+Each measurement runs in its own process, first with a replica of the old
+dict based Event class and then with the current one.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from otest import events
+from otest.check import OK
+from otest.check import State
+from otest.events import EV_CONDITION
+from otest.events import EV_HTTP_REQUEST
+from otest.events import EV_HTTP_RESPONSE
+from otest.events import EV_OPERATION
+from otest.events import EV_PROTOCOL_RESPONSE
+from otest.events import EV_REQUEST
+from otest.events import EV_RESPONSE
+from otest.events import Events
+
+FLOW_DIR = os.path.join(os.path.dirname(__file__), '..', 'tests', 'flows')
+
+BODY = json.dumps({
+    'access_token': 'ZDZjNWFmNzgtN2IxMi00YTY1LTk2NTEtODIyZjg5Ym' * 4,
+    'token_type': 'Bearer', 'expires_in': 7200,
+    'id_token': 'eyJhbGciOiJSUzI1NiIsImtpZCI6IjEifQ.' + 'x' * 800})
+
+
+class LegacyEvent(object):
+    """The Event class as it looked before __slots__ were introduced"""
+
+    def __init__(self, timestamp=0, typ='', data=None, ref='', sub='',
+                 sender='', direction=0, **kwargs):
+        self.timestamp = timestamp or time.time()
+        self.typ = typ
+        self.data = data
+        try:
+            self.ref = ref.lower()
+        except AttributeError:
+            self.ref = ref
+        self.sub = sub
+        self.sender = sender
+        self.direction = direction
+        self.kwargs = kwargs
+
+
+class LegacyHTTPResponse(object):
+    def __init__(self, response):
+        self.status_code = response.status_code
+        self.url = response.url
+        self.headers = response.headers
+        self.text = response.text
+
+
+class HttpResp(object):
+    def __init__(self, text):
+        self.status_code = 400
+        self.url = 'https://op.example.com/token'
+        self.headers = {'content-type': 'application/json'}
+        self.text = text
+
+
+def run_flow(spec):
+    _ev = Events()
+    for oper in spec['sequence']:
+        if isinstance(oper, dict):
+            oper = list(oper.keys())[0]
+        _ev.store(EV_OPERATION, oper, sender='run_flow')
+        _ev.store(EV_REQUEST, {'url': 'https://op.example.com/' + oper},
+                  sender=oper)
+        _ev.store(EV_HTTP_REQUEST, 'POST', sender=oper)
+        # Fresh copies of the text, as if read from the network
+        _ev.store(EV_HTTP_RESPONSE, HttpResp(''.join(list(BODY))),
+                  sender=oper)
+        _ev.store(EV_RESPONSE, ''.join(list(BODY)), sender=oper)
+        _ev.store(EV_PROTOCOL_RESPONSE, json.loads(BODY), sender=oper)
+        _ev.store(EV_CONDITION, State('check-http-response', OK),
+                  sender=oper)
+    return _ev
+
+
+def measure(sessions, legacy):
+    if legacy:
+        events.Event = LegacyEvent
+        events.HTTPResponse = LegacyHTTPResponse
+
+    specs = []
+    for fn in sorted(os.listdir(FLOW_DIR)):
+        if fn.endswith('.json'):
+            with open(os.path.join(FLOW_DIR, fn)) as fp:
+                specs.append(json.load(fp))
+
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    keep = []
+    for _ in range(sessions):
+        keep.append([run_flow(spec) for spec in specs])
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    num = sum(len(e) for s in keep for e in s)
+    return {'flows': len(specs), 'events': num, 'rss_kb': after - before}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', dest='sessions', type=int, default=20)
+    parser.add_argument('--legacy', action='store_true')
+    parser.add_argument('--child', action='store_true')
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.sessions, args.legacy)))
+        sys.exit(0)
+
+    res = {}
+    for label, extra in [('before', ['--legacy']), ('after', [])]:
+        out = subprocess.check_output(
+            [sys.executable, __file__, '--child', '-n', str(args.sessions)] +
+            extra)
+        res[label] = json.loads(out.decode())
+
+    print('{} flows x {} sessions = {} events'.format(
+        res['after']['flows'], args.sessions, res['after']['events']))
+    for label in ['before', 'after']:
+        print('{:>7}: {:>8} kB'.format(label, res[label]['rss_kb']))
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Cost of Flow.matches_profile, as done on every SessionHandler.init_session,
+with the profile index against a scan with match_usage over all flow
+descriptions (what matches_profile did before the index).
+
+Usage: PYTHONPATH=src python bench/bench_profile.py
+"""
+import os
+import timeit
+
+from otest.flow import Flow
+from otest.flow import match_usage
+from otest.flow import SpecCache
+from otest.prof_util import from_profile
+
+FLOW_DIR = os.path.join(os.path.dirname(__file__), '..', 'tests', 'flows')
+PROFILES = ['C.T.T.T', 'C.T.T.T.se', 'CIT.T.T.T.sen.+', 'C.F.T.F']
+
+
+def scan(flows, profile):
+    _use = from_profile(profile)
+    return [tid for tid, spec in flows._items() if match_usage(spec, **_use)]
+
+
+if __name__ == '__main__':
+    flows = Flow(FLOW_DIR, None, spec_cache=SpecCache())
+    rounds = 200
+
+    for prof in PROFILES:
+        assert flows.matches_profile(prof) == scan(flows, prof)
+
+    print('{} flow descriptions'.format(len(list(flows.keys()))))
+    for label, func in [
+            ('before (scan)',
+             lambda: [scan(flows, p) for p in PROFILES]),
+            ('after (index)',
+             lambda: [flows.matches_profile(p) for p in PROFILES])]:
+        t = timeit.timeit(func, number=rounds)
+        print('{:>14}: {:8.1f} us/profile'.format(
+            label, t / rounds / len(PROFILES) * 1e6))
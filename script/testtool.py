@@ -26,11 +26,14 @@ from oic.utils.http_util import ServiceError
 from oic.utils.http_util import SeeOther
 from oic.utils import http_util
 
+from otest.batch import BatchRunner
 from otest.events import Events
 from otest.events import EV_REQUEST
 from otest.events import EV_RESPONSE
 from otest.flow import FlowState
 from otest.session import SessionHandler
+from otest.session_store import SessionCodec
+from otest.session_store import make_store
 from otest.rp.endpoints import static_mime
 from otest.rp.handling import WebIh
 from otest.rp.setup import as_arg_setup
@@ -127,14 +130,23 @@ def absolute_url(url, startpage):
 
 
 class Application(object):
-    def __init__(self, base_url, **kwargs):
+    def __init__(self, base_url, session_store='memory', **kwargs):
         self.base_url = base_url
         self.kwargs = kwargs
         self.events = Events()
         self.endpoints = {}
-        self.session_conf = {}
+        self.session_conf = make_store(
+            session_store,
+            SessionCodec(self.new_session_handler, self.restore_conversation))
         self.internal = kwargs['internal']
 
+    def new_session_handler(self):
+        return SessionHandler(**self.kwargs)
+
+    def restore_conversation(self, sh, conv):
+        tester = WebTester(None, sh, **self.kwargs)
+        tester.restore_conversation(conv, **self.kwargs)
+
     def store_response(self, response):
         self.events.store(EV_RESPONSE, response.info())
 
@@ -191,13 +203,24 @@ class Application(object):
         self.session_conf[sid] = sh
         return sid
 
+    def save_session_handler(self, sh):
+        """
+        Write a changed session handler back to the session store. Stores
+        that serialize keep a copy, so this has to be done after anything
+        that changes the session.
+        """
+        try:
+            self.session_conf[sh['sid']] = sh
+        except KeyError:
+            pass
+
     def init_session(self, tester, sh, test_id=''):
-        sid = self.store_session_handler(sh)
-        # session['session_info'] = sh
         try:
-            del self.session_conf[sid]['flow']
+            del sh['flow']
         except KeyError:
             pass
+        sid = self.store_session_handler(sh)
+        # session['session_info'] = sh
 
         try:
             args = sh['test_conf']
@@ -256,6 +279,51 @@ class Application(object):
         else:
             return resp(environ, start_response), 0
 
+    def run_all(self, info, sh, environ, start_response):
+        """
+        Run all the tests in the session concurrently. If a test waits for
+        interaction the batch is stopped and the test is continued in this
+        session.
+        """
+        # The paused test, if any, is continued through <sid>/<endpoint>
+        try:
+            _sid = sh['sid']
+        except KeyError:
+            _sid = self.store_session_handler(sh)
+
+        def make_tester(flows):
+            _kwargs = dict(self.kwargs)
+            _kwargs['flows'] = flows
+            return WebTester(info, sh.copy(flows), **_kwargs)
+
+        def progress(done, total, res):
+            logger.info('{}/{} {}'.format(done, total, res))
+
+        def is_paused(res):
+            return not (res.result is True or res.result is False or
+                        res.result is None)
+
+        runner = BatchRunner(make_tester, self.kwargs['flows'],
+                             concurrency=self.kwargs['concurrency'],
+                             progress=progress, is_paused=is_paused)
+        results = runner.run(sh['flow_names'], sid=_sid, **self.kwargs)
+        if runner.paused:
+            sh.take_over(runner.paused.session)
+            self.save_session_handler(sh)
+            return runner.paused.result(environ, start_response)
+
+        for res in results:
+            if res.result is True or res.result is False:
+                continue
+            elif res.result:
+                return res.result(environ, start_response)
+            else:
+                resp = ServiceError('Unkown service error')
+                return resp(environ, start_response)
+
+        tester = WebTester(info, sh, **self.kwargs)
+        return tester.display_test_list()
+
     # publishes the OP endpoints
     def application(self, environ, start_response):
         session = environ['beaker.session']
@@ -270,7 +338,7 @@ class Application(object):
         try:
             sh = session['session_info']
         except KeyError:
-            sh = SessionHandler(**self.kwargs)
+            sh = self.new_session_handler()
             #sh.session_init()
             session['session_info'] = sh
 
@@ -299,7 +367,6 @@ class Application(object):
             else:
                 if qs:
                     sh['test_conf'] = dict([(k, v[0]) for k, v in qs.items()])
-                    # self.session_conf[sh['sid']] = sh
                 else:
                     return self.init_session(tester, sh)
 
@@ -311,11 +378,13 @@ class Application(object):
 
             info.profile = tester.sh.profile = qs['response_type'][0]
             sh.session_init()
+            self.save_session_handler(sh)
 
             if 'test_id' in qs:
                 (res, _path) = self.run_test(tester, qs['test_id'][0],
                                              sh['sid'], environ,
                                              start_response)
+                self.save_session_handler(tester.sh)
                 if res:
                     return res
             else:
@@ -345,6 +414,7 @@ class Application(object):
 
             (res, _path) = self.run_test(tester, _path, _sid, environ,
                                          start_response)
+            self.save_session_handler(tester.sh)
             if res:
                 return res
         elif _path == 'display':
@@ -361,12 +431,18 @@ class Application(object):
         elif _path.startswith("test_info"):
             p = _path.split("/")
             try:
+                if len(p) > 2:
+                    return info.test_info(p[1], page=int(p[2]))
                 return info.test_info(p[1])
-            except KeyError:
+            except (KeyError, ValueError):
                 return info.not_found()
         elif _path == 'all':
+            if self.kwargs.get('concurrency', 1) > 1:
+                return self.run_all(info, sh, environ, start_response)
+
             for test_id in sh['flow_names']:
                 resp = tester.run(test_id, **self.kwargs)
+                self.save_session_handler(tester.sh)
                 if resp is True or resp is False:
                     continue
                 elif resp:
@@ -420,6 +496,7 @@ class Application(object):
                     jlog.info({"service": service})
                     try:
                         resp = self.handle(environ, tester, sid, service)
+                        self.session_conf[sid] = tester.sh
                         return resp(environ, start_response)
                     except Exception as err:
                         print("%s" % err)
@@ -512,6 +589,19 @@ if __name__ == '__main__':
         help="CA certs to use to verify HTTPS server certificates, "
              "if HTTPS is used and no server CA certs are defined then "
              "no cert verification will be done")
+    parser.add_argument(
+        '-n', dest='concurrency', type=int, default=1,
+        help='How many tests that should be run at the same time when '
+             'running all tests')
+    parser.add_argument(
+        '-S', dest='session_store', default='memory',
+        help="Where sessions are kept: 'memory', 'sqlite:<database file>' or "
+             "'file:<directory>'. Several server processes can share a "
+             "sqlite or file store")
+    parser.add_argument(
+        '-J', dest='journal_dir',
+        help='Directory where the events of each test are journaled as they '
+             'happen')
     parser.add_argument(
         '-x', dest='xport', help='ONLY for testing')
     parser.add_argument(dest="config")
@@ -570,10 +660,22 @@ if __name__ == '__main__':
     if args.ca_certs:
         kwargs['ca_certs'] = args.ca_certs
 
+    if args.concurrency > 1:
+        kwargs['concurrency'] = args.concurrency
+
+    _journal_dir = args.journal_dir or tool_args.get('journal_dir')
+    if _journal_dir:
+        kwargs['journal_dir'] = _journal_dir
+
+    # The test info template streams the trace, see otest.handling
+    if tool_args.get('stream_trace'):
+        kwargs['stream_trace'] = True
+
     if args.path2port:
         kwargs['path'] = as_args['instance_path']
 
-    _app = Application(base=as_args['name'], **kwargs)
+    _app = Application(base=as_args['name'],
+                       session_store=args.session_store, **kwargs)
     _app.endpoints = {
         '.well-known/openid-configuration': 'providerinfo_endpoint'
     }
@@ -54,5 +54,8 @@ setup(
         'robobrowser'
     ],
     zip_safe=False,
-    scripts=['script/testtool.py', 'script/make_keys.py']
+    scripts=['script/testtool.py', 'script/make_keys.py'],
+    entry_points={
+        'console_scripts': ['otest-compile-flows = otest.bundle:main']
+    }
 )
@@ -0,0 +1,107 @@
+"""
+    asyncio support
+    ~~~~~~~~~~~~~~~
+
+    Lets many conversations share one event loop. Operations and testers
+    have async variants (Operation.acall/arun, Tester.arun/arun_flow).
+    Anything that only has a synchronous implementation is run in an
+    executor, so existing operations keep working unchanged.
+
+    HTTP requests are sent with the entity's async_http_request coroutine,
+    if it has one. Otherwise the ordinary http_request is run in the
+    executor.
+
+    :copyright: (c) 2016 by Roland Hedberg.
+    :license: APACHE 2.0, see LICENSE for more details.
+"""
+import asyncio
+import functools
+import logging
+
+__author__ = 'roland'
+
+logger = logging.getLogger(__name__)
+
+# The executor synchronous code is run in, None means the event loop's
+# default executor.
+EXECUTOR = None
+
+
+async def run_in_executor(func, *args, **kwargs):
+    """
+    Run a synchronous function without blocking the event loop.
+
+    :param func: The function
+    :return: Whatever the function returns
+    """
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(
+        EXECUTOR, functools.partial(func, *args, **kwargs))
+
+
+async def http_request(entity, url, method='GET', **kwargs):
+    """
+    Async variant of entity.http_request.
+
+    :param entity: The client/server instance that does the request
+    :param url: Where to send the request
+    :param method: HTTP method
+    :param kwargs: Extra arguments passed on to the entity
+    :return: A requests.Response like instance
+    """
+    try:
+        _send = entity.async_http_request
+    except AttributeError:
+        return await run_in_executor(entity.http_request, url, method,
+                                     **kwargs)
+    return await _send(url, method, **kwargs)
+
+
+async def call(oper, *args, **kwargs):
+    """
+    Run an operation, with acall if it has one otherwise in the executor.
+    """
+    try:
+        _acall = oper.acall
+    except AttributeError:
+        return await run_in_executor(oper, *args, **kwargs)
+    return await _acall(*args, **kwargs)
+
+
+def overrides(obj, base, method):
+    """
+    Whether the class of obj has its own implementation of a method, that
+    is one that differs from the one in base.
+    """
+    return getattr(type(obj), method) is not getattr(base, method)
+
+
+async def run_tests(make_tester, test_ids, concurrency=100, **kw_args):
+    """
+    Run a number of tests on the running event loop.
+
+    :param make_tester: Function that returns a new Tester instance
+    :param test_ids: The test IDs
+    :param concurrency: Max number of conversations going on at the same
+        time
+    :param kw_args: Passed on to Tester.arun
+    :return: What Tester.arun returned for each test, in the order of
+        test_ids. If a test raised an exception that is what's returned
+        for it.
+    """
+    _sem = asyncio.Semaphore(concurrency)
+
+    async def _run(test_id):
+        async with _sem:
+            tester = make_tester()
+            return await tester.arun(test_id, **kw_args)
+
+    return await asyncio.gather(*[_run(tid) for tid in test_ids],
+                                return_exceptions=True)
+
+
+def run(coro):
+    """
+    Run a coroutine to completion on the current event loop.
+    """
+    return asyncio.get_event_loop().run_until_complete(coro)
@@ -0,0 +1,208 @@
+"""
+    Streaming log archives
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Builds tar archives of the log files of a profile piece by piece, as
+    they are sent, so an archive never has to be kept in memory or written
+    to disk first. Memory use is bounded by the chunk size whatever the
+    number and size of the log files.
+
+    Archives can be gzip compressed and, if the zstandard package is
+    installed, zstd compressed.
+
+    :copyright: (c) 2016 by Roland Hedberg.
+    :license: APACHE 2.0, see LICENSE for more details.
+"""
+import logging
+import os
+import tarfile
+import zlib
+
+from otest.result_writer import RESULT_WRITER
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+__author__ = 'roland'
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+# file name extension -> content type
+CONTENT_TYPE = {
+    'tar': 'application/x-tar',
+    'tar.gz': 'application/gzip',
+    'tgz': 'application/gzip',
+    'tar.zst': 'application/zstd',
+}
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def compressions():
+    """
+    :return: The archive file name extensions that are supported
+    """
+    _ext = ['tar', 'tar.gz', 'tgz']
+    if zstandard is not None:
+        _ext.append('tar.zst')
+    return _ext
+
+
+def split_extension(name):
+    """
+    :param name: Archive file name
+    :return: Tuple of name without extension and extension, extension is
+        None if it's not a supported archive
+    """
+    for ext in sorted(compressions(), key=len, reverse=True):
+        if name.endswith('.' + ext):
+            return name[:-(len(ext) + 1)], ext
+    return name, None
+
+
+def log_members(log_dir, arcdir=''):
+    """
+    The log files in a directory.
+
+    :param log_dir: The directory
+    :param arcdir: The directory the files are placed in in the archive
+    :return: list of (archive member name, path) tuples
+    """
+    members = []
+    for item in sorted(os.listdir(log_dir)):
+        # Hidden files and files being written
+        if item.startswith(".") or item.endswith('.tmp'):
+            continue
+        fn = os.path.join(log_dir, item)
+        if not os.path.isfile(fn):
+            continue
+        if not item.endswith('.txt'):
+            item = '{}.txt'.format(item)
+        members.append((os.path.join(arcdir, item) if arcdir else item, fn))
+    return members
+
+
+def _member(name, path, chunk_size):
+    """
+    A tar header followed by the content of the file, padded to whole
+    blocks.
+    """
+    try:
+        fp = open(path, 'rb')
+    except (IOError, OSError) as err:
+        logger.warning('Not archiving {}: {}'.format(path, err))
+        return
+
+    with fp:
+        _stat = os.fstat(fp.fileno())
+        info = tarfile.TarInfo(name)
+        info.size = _stat.st_size
+        info.mtime = int(_stat.st_mtime)
+        info.mode = 0o644
+        yield info.tobuf(format=tarfile.PAX_FORMAT)
+
+        left = info.size
+        while left:
+            data = fp.read(min(chunk_size, left))
+            if not data:
+                # The file shrunk, the header says how much there should be
+                data = bytes(min(chunk_size, left))
+            left -= len(data)
+            yield data
+
+    _rest = info.size % tarfile.BLOCKSIZE
+    if _rest:
+        yield bytes(tarfile.BLOCKSIZE - _rest)
+
+
+def iter_tar(members, chunk_size=CHUNK_SIZE):
+    """
+    A tar archive in chunks of about chunk_size bytes.
+
+    :param members: Iterable of (archive member name, path) tuples
+    :param chunk_size: Size of the chunks
+    :return: generator of bytes
+    """
+    _buf = bytearray()
+    for name, path in members:
+        for data in _member(name, path, chunk_size):
+            _buf.extend(data)
+            if len(_buf) >= chunk_size:
+                yield bytes(_buf)
+                _buf = bytearray()
+    # End of archive
+    _buf.extend(bytes(2 * tarfile.BLOCKSIZE))
+    yield bytes(_buf)
+
+
+def compress(chunks, ext):
+    """
+    :param chunks: Iterable of bytes
+    :param ext: Archive file name extension
+    :return: generator of compressed bytes
+    """
+    if ext == 'tar':
+        for chunk in chunks:
+            yield chunk
+        return
+
+    if ext in ['tar.gz', 'tgz']:
+        # gzip header and trailer
+        comp = zlib.compressobj(6, zlib.DEFLATED, 31)
+    elif ext == 'tar.zst' and zstandard is not None:
+        comp = zstandard.ZstdCompressor().compressobj()
+    else:
+        raise ArchiveError('Unsupported archive type: {}'.format(ext))
+
+    for chunk in chunks:
+        data = comp.compress(chunk)
+        if data:
+            yield data
+    yield comp.flush()
+
+
+def iter_archive(log_dir, arcdir='', ext='tar', chunk_size=CHUNK_SIZE,
+                 writer=RESULT_WRITER):
+    """
+    An archive of the log files in a directory.
+
+    :param log_dir: The directory
+    :param arcdir: The directory the files are placed in in the archive
+    :param ext: Archive file name extension, one of compressions()
+    :param chunk_size: Size of the chunks read and sent
+    :param writer: ResultWriter whose queued files should be included
+    :return: generator of bytes
+    """
+    if ext not in compressions():
+        raise ArchiveError('Unsupported archive type: {}'.format(ext))
+
+    if writer is not None:
+        writer.flush()
+    return compress(iter_tar(log_members(log_dir, arcdir), chunk_size), ext)
+
+
+def archive_response(environ, start_response, log_dir, name,
+                     writer=RESULT_WRITER):
+    """
+    Serve an archive of the log files in a directory.
+
+    :param log_dir: The directory
+    :param name: The archive file name, the extension decides the type of
+        archive
+    :return: WSGI iterable
+    """
+    arcdir, ext = split_extension(name)
+    if ext is None:
+        raise ArchiveError('Unsupported archive type: {}'.format(name))
+
+    _iter = iter_archive(log_dir, arcdir, ext, writer=writer)
+    start_response('200 OK', [
+        ('Content-Type', CONTENT_TYPE[ext]),
+        ('Content-Disposition', 'attachment; filename="{}"'.format(name))])
+    return _iter
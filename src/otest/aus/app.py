@@ -4,6 +4,8 @@ import os
 from oic.utils.http_util import BadRequest
 from oic.utils.http_util import SeeOther
 
+from otest.archive import archive_response
+from otest.archive import split_extension
 from otest.events import EV_HTTP_ARGS
 from otest.result import safe_url
 
@@ -23,6 +25,26 @@ class WebApplication(object):
         self.pick_grp = pick_grp
         self.path = path
 
+    @staticmethod
+    def archive(info, path, environ, start_response):
+        """
+        Stream an archive of the log files of a profile.
+
+        :param path: tar/<issuer>[/<tag>]/<profile>.<archive type>
+        """
+        _path = path.replace(":", "%3A")
+        parts = _path.split('/')[1:]
+        if not parts or [p for p in parts if p in ['', '.', '..']]:
+            return info.not_found()
+
+        profile, ext = split_extension(parts[-1])
+        log_dir = os.path.join("log", *(parts[:-1] + [profile]))
+        if ext is None or not os.path.isdir(log_dir):
+            # An archive made by summation.create_tar_archive
+            return info.static(_path)
+
+        return archive_response(environ, start_response, log_dir, parts[-1])
+
     def application(self, environ, start_response):
         logger.info("Connection from: %s" % environ["REMOTE_ADDR"])
         session = environ['beaker.session']
@@ -84,8 +106,7 @@ class WebApplication(object):
 
             return info.display_log("log", *parts)
         elif _path.startswith("tar"):
-            _path = _path.replace(":", "%3A")
-            return info.static(_path)
+            return self.archive(info, _path, environ, start_response)
 
         if _path == "reset":
             sh.reset_session()
@@ -100,8 +121,10 @@ class WebApplication(object):
         elif _path.startswith("test_info"):
             p = _path.split("/")
             try:
+                if len(p) > 2:
+                    return info.test_info(p[1], page=int(p[2]))
                 return info.test_info(p[1])
-            except KeyError:
+            except (KeyError, ValueError):
                 return info.not_found()
         elif _path == "continue":
             resp = tester.cont(environ, self.webenv)
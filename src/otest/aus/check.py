@@ -1,7 +1,5 @@
-import inspect
 import json
 import logging
-import sys
 
 from oic.oauth2 import SUCCESSFUL
 from oic.oauth2.message import ErrorResponse
@@ -20,6 +18,7 @@ from otest.events import EV_HTTP_RESPONSE
 from otest.events import EV_PROTOCOL_RESPONSE
 from otest.events import EV_RESPONSE
 from otest.events import NoSuchEvent
+from otest.registry import CHECKS
 
 logger = logging.getLogger(__name__)
 
@@ -95,6 +94,7 @@ class CheckHTTPResponse(CriticalError):
     """
     cid = "check-http-response"
     msg = "OP error"
+    pure = True
 
     def _func(self, conv):
         res = {}
@@ -135,6 +135,7 @@ class CheckHTTPErrorResponse(Warnings):
     """
     cid = "check-http-error-response"
     msg = "OP error"
+    pure = True
 
     def _func(self, conv):
         res = {}
@@ -168,6 +169,7 @@ class VerifyErrorResponse(ExpectedError):
     """
     cid = "verify-err-response"
     msg = "OP error"
+    pure = True
 
     def _func(self, conv):
         res = {}
@@ -384,6 +386,7 @@ class VerifyError(Error):
     type.
     """
     cid = "verify-error"
+    pure = True
 
     def _func(self, conv):
         try:
@@ -429,6 +432,7 @@ class CheckErrorResponse(ExpectedError):
     """
     cid = "check-error-response"
     msg = "OP error"
+    pure = True
 
     def _func(self, conv):
         res = {}
@@ -475,6 +479,7 @@ class VerifyErrorMessage(ExpectedError):
     """
     cid = "verify-error-response"
     msg = "OP error"
+    pure = True
 
     def _func(self, conv):
         try:
@@ -508,6 +513,7 @@ class VerifyAuthnResponse(ExpectedError):
     """
     cid = "verify-authn-response"
     msg = "OP error"
+    pure = True
 
     def _func(self, conv):
         try:
@@ -531,6 +537,7 @@ class VerifyAuthnOrErrorResponse(ExpectedError):
     """
     cid = "authn-response-or-error"
     msg = "Expected authentication response or error message"
+    pure = True
 
     def _func(self, conv):
         try:
@@ -566,6 +573,7 @@ class VerifyResponse(ExpectedError):
     """
     cid = "verify-response"
     msg = "Expected OpenID Connect response"
+    pure = True
     doc = """
     :param response_cls: Which responses the test tool has received
     :type response_cls: list of strings
@@ -609,14 +617,4 @@ class VerifyResponse(ExpectedError):
 
 
 def factory(cid):
-    for name, obj in inspect.getmembers(sys.modules[__name__]):
-        if inspect.isclass(obj) and issubclass(obj, Check):
-            try:
-                if obj.cid == cid:
-                    return obj
-            except AttributeError:
-                pass
-
-    from otest.check import factory as a_factory
-
-    return a_factory(cid)
+    return CHECKS.find(cid, [__name__, 'otest.check'])
@@ -4,6 +4,9 @@ from oic.oic import RegistrationResponse
 from oic.utils.authn.client import CLIENT_AUTHN_METHOD
 from otest.events import EV_RESPONSE
 from otest.events import EV_PROTOCOL_RESPONSE
+from otest.http_pool import HTTP_POOL
+from otest.keyjar import KeyJarView
+from otest.keyjar import kid_index
 
 __author__ = 'roland'
 
@@ -12,6 +15,13 @@ class OicClient(oic.Client):
     def __init__(self, *args, **kwargs):
         oic.Client.__init__(self, *args, **kwargs)
         self.conv = None
+        self.http_pool = None
+        self.http_session = None
+
+    def http_request(self, url, method="GET", **kwargs):
+        if self.http_pool is None:
+            return oic.Client.http_request(self, url, method, **kwargs)
+        return self.http_pool.client_request(self, url, method, **kwargs)
 
     def store_response(self, clinst, text):
         self.conv.events.store(EV_RESPONSE, text)
@@ -22,6 +32,13 @@ class ExtClient(client.Client):
     def __init__(self, *args, **kwargs):
         client.Client.__init__(self, *args, **kwargs)
         self.conv = None
+        self.http_pool = None
+        self.http_session = None
+
+    def http_request(self, url, method="GET", **kwargs):
+        if self.http_pool is None:
+            return client.Client.http_request(self, url, method, **kwargs)
+        return self.http_pool.client_request(self, url, method, **kwargs)
 
     def store_response(self, clinst, text):
         self.conv.events.store(EV_RESPONSE, text)
@@ -29,38 +46,47 @@ class ExtClient(client.Client):
 
 
 class Factory(object):
-    def __init__(self, client_cls):
+    def __init__(self, client_cls, http_pool=HTTP_POOL):
+        """
+        :param client_cls: The client class
+        :param http_pool: otest.http_pool.HTTPPool instance shared by all
+            the clients made, None means no pooling.
+        """
         self.client_cls = client_cls
+        self.http_pool = http_pool
 
     def adjust_kid(self, kidd, keyjar):
         """
         Verify that the set of keys assigned to different usage is still
-        around.
+        around. If a kid is gone the first usable key of the same type is
+        used instead.
         
         :param kidd: Dictionary {usage: {key_type: kid}} 
         :param keyjar:  A KeyJar instance
         :return: A corrected kid dictionary
         """
+        _index = kid_index(keyjar)
         res = {}
         for usage, spec in kidd.items():
             res[usage] = {}
             for key_type, _id in spec.items():
-                if not keyjar.get(usage, key_type, kid=_id):
-                    l = keyjar.get(usage, key_type)
+                if _index.get(usage, key_type, kid=_id):
+                    res[usage][key_type] = _id
+                else:
+                    l = _index.get(usage, key_type)
                     if l:
                         res[usage][key_type] = l[0].kid
-                else:
-                    res[usage][key_type] = _id
         return res
 
     def make_client(self, **kw_args):
         """
-        Have to get own copy of keyjar
+        Have to get own copy of keyjar. The copy shares key material with
+        the original until keys are changed, see otest.keyjar.
 
         :param kw_args:
         :return:
         """
-        c_keyjar = kw_args["keyjar"].copy()
+        c_keyjar = KeyJarView(kw_args["keyjar"])
         args = {'client_authn_method': CLIENT_AUTHN_METHOD, 'keyjar': c_keyjar}
         try:
             args['verify_ssl'] = kw_args['verify_ssl']
@@ -70,6 +96,8 @@ class Factory(object):
             c_keyjar.verify_ssl = kw_args['verify_ssl']
 
         _cli = self.client_cls(**args)
+        if self.http_pool is not None and hasattr(_cli, 'http_pool'):
+            _cli.http_pool = self.http_pool
 
         try:
             _kid = kw_args['kid']
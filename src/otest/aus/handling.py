@@ -11,7 +11,11 @@ from otest.check import ERROR
 from otest.check import OK
 from otest.check import WARNING
 from otest.check import INCOMPLETE
+from otest.aus.preproc.testinfo import iter_trace_output
 from otest.handling import InfoHandling
+from otest.handling import respond_with_trace
+from otest.result_index import RESULT_INDEX
+from otest.result_index import log_entries
 from otest.utils import with_or_without_slash
 from otest.summation import represent_result
 
@@ -26,7 +30,8 @@ TEST_RESULTS = {OK: "OK", ERROR: "ERROR", WARNING: "WARNING",
 class WebIh(InfoHandling):
     def __init__(self, conf=None, flows=None, profile_handler=None,
                  lookup=None, cache=None, environ=None, start_response=None,
-                 session=None, base_url='', **kwargs):
+                 session=None, base_url='', result_index=RESULT_INDEX,
+                 **kwargs):
         InfoHandling.__init__(self, flows=flows,
                               profile_handler=profile_handler,
                               cache=cache, session=session, **kwargs)
@@ -36,6 +41,7 @@ class WebIh(InfoHandling):
         self.environ = environ
         self.start_response = start_response
         self.base_url = base_url
+        self.result_index = result_index
 
     def flow_list(self):
         try:
@@ -65,21 +71,43 @@ class WebIh(InfoHandling):
 
         return resp(self.environ, self.start_response, **argv)
 
-    def test_info(self, testid):
+    def test_info(self, testid, page=None):
+        """
+        :param testid: Test ID
+        :param page: If given, only this page of the trace is shown
+        """
         resp = Response(mako_template="testinfo.mako",
                         template_lookup=self.lookup,
                         headers=[])
 
         info = self.flows.test_info[testid]
+        _events = info['events']
+        _page = _events.page(page or 0)
+        if page is not None and not 0 <= page < _page.pages:
+            return self.not_found()
 
         argv = {
             "profile": info["profile_info"],
-            "events": info['events'],
-            "result": represent_result(info['events']).replace("\n", "<br>\n"),
-            'base': self.base_url
+            "events": _events,
+            "result": represent_result(_events).replace("\n", "<br>\n"),
+            'base': self.base_url,
+            'page': _page
         }
 
-        return resp(self.environ, self.start_response, **argv)
+        if not self.stream_trace:
+            return resp(self.environ, self.start_response, **argv)
+
+        if page is None:
+            _trace = iter_trace_output(_events)
+        else:
+            # Elapsed time is still counted from the start of the test
+            try:
+                _start = _events.events[0].timestamp
+            except IndexError:
+                _start = 0
+            _trace = iter_trace_output(_page, _start)
+        return respond_with_trace(resp, self.environ, self.start_response,
+                                  _trace, **argv)
 
     def not_found(self):
         """Called if no URL matches."""
@@ -126,12 +154,8 @@ class WebIh(InfoHandling):
                 resp = Response("No saved logs")
                 return resp(self.environ, self.start_response)
 
-            for _name in os.listdir(path):
-                if _name.startswith("."):
-                    continue
-                fn = os.path.join(path, _name)
-                if os.path.isfile(fn):
-                    item.append((unquote(_name), fn))
+            for _name in log_entries(path, index=self.result_index):
+                item.append((unquote(_name), os.path.join(path, _name)))
         else:
             if issuer:
                 argv = {'issuer': unquote(issuer), 'profile': ''}
@@ -145,12 +169,9 @@ class WebIh(InfoHandling):
                 resp = Response("No saved logs")
                 return resp(self.environ, self.start_response)
 
-            for _name in os.listdir(path):
-                if _name.startswith("."):
-                    continue
-                fn = os.path.join(path, _name)
-                if os.path.isdir(fn):
-                    item.append((unquote(_name), os.path.join(path, _name)))
+            for _name in log_entries(path, dirs=True,
+                                     index=self.result_index):
+                item.append((unquote(_name), os.path.join(path, _name)))
 
         resp = Response(mako_template="logs.mako",
                         template_lookup=self.lookup,
@@ -19,6 +19,8 @@ from otest.check import OK
 from otest.check import WARNING
 from otest.check import INCOMPLETE
 from otest.handling import InfoHandling
+from otest.result_index import RESULT_INDEX
+from otest.result_index import log_entries
 from otest.result import safe_url
 from otest.utils import with_or_without_slash
 from otest.summation import represent_result
@@ -34,7 +36,7 @@ TEST_RESULTS = {OK: "OK", ERROR: "ERROR", WARNING: "WARNING",
 class WebIh(InfoHandling):
     def __init__(self, conf=None, flow_state=None, profile_handler=None,
                  cache=None, session=None, base_url='',
-                 pre_html=None, **kwargs):
+                 pre_html=None, result_index=RESULT_INDEX, **kwargs):
         InfoHandling.__init__(self, flow_state=flow_state,
                               profile_handler=profile_handler,
                               cache=cache, session=session, **kwargs)
@@ -42,6 +44,7 @@ class WebIh(InfoHandling):
         self.conf = conf
         self.base_url = base_url
         self.pre_html = pre_html
+        self.result_index = result_index
 
     def flow_list(self):
         try:
@@ -119,12 +122,8 @@ class WebIh(InfoHandling):
             if path is None:
                 return "No saved logs"
 
-            for _name in os.listdir(path):
-                if _name.startswith("."):
-                    continue
-                fn = os.path.join(path, _name)
-                if os.path.isfile(fn):
-                    item.append((unquote(_name), fn))
+            for _name in log_entries(path, index=self.result_index):
+                item.append((unquote(_name), os.path.join(path, _name)))
         else:
             if issuer:
                 argv = {'issuer': unquote(issuer), 'profile': ''}
@@ -137,12 +136,9 @@ class WebIh(InfoHandling):
             if path is None:
                 return b'No saved logs'
 
-            for _name in os.listdir(path):
-                if _name.startswith("."):
-                    continue
-                fn = os.path.join(path, _name)
-                if os.path.isdir(fn):
-                    item.append((unquote(_name), os.path.join(path, _name)))
+            for _name in log_entries(path, dirs=True,
+                                     index=self.result_index):
+                item.append((unquote(_name), os.path.join(path, _name)))
 
         item.sort()
         _msg = self.pre_html['logs.html'].format(
@@ -1,10 +1,8 @@
 import functools
-import inspect
 import json
 import logging
 import os
 import time
-import sys
 
 from Cryptodome.PublicKey import RSA
 from future.backports.urllib.parse import urlparse
@@ -21,7 +19,9 @@ from otest import Unknown
 from otest import operation
 
 from otest.aus.request import SyncGetRequest
+from otest.keyjar import private_keys
 from otest.operation import request_with_client_http_session
+from otest.registry import OPERATIONS
 
 __author__ = 'roland'
 
@@ -90,6 +90,8 @@ class RotateKey(Operation):
     def __call__(self):
         keyjar = self.conv.entity.keyjar
         self.conv.entity.original_keyjar = keyjar.copy()
+        # The old key is changed in place
+        private_keys(keyjar)
 
         # invalidate the old key
         old_kid = self.op_args["old_kid"]
@@ -172,6 +174,8 @@ class RotateKeys(Operation):
             raise RequirementsNotMet("No dynamic key handling")
 
         r = urlparse(_uri)
+        # The old keys are changed in place
+        private_keys(self.conv.entity.keyjar)
         # find the old key for this key usage and mark that as inactive
         for kb in self.conv.entity.keyjar.issuer_keys[""]:
             for key in list(kb.keys()):
@@ -221,10 +225,9 @@ class Cache(Operation):
 
 
 def factory(name):
-    for fname, obj in inspect.getmembers(sys.modules[__name__]):
-        if inspect.isclass(obj):
-            if name == fname:
-                return obj
+    obj = OPERATIONS.lookup(__name__, name)
+    if obj:
+        return obj
 
     from otest import operation
 
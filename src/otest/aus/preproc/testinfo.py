@@ -6,19 +6,29 @@ def do_assertions(out):
     return summation.condition(out, True)
 
 
-def trace_output(events):
+def iter_trace_output(events, start=0):
     """
+    Render the trace as a HTML table one event at the time.
 
+    :param events: Anything that iterates over events, for instance an
+        otest.events.EventPage instance
+    :param start: Time the elapsed time is counted from, if not given the
+        time of the first event
+    :return: generator of HTML lines
     """
-    element = ['<table class="table table-bordered table-condensed">']
-    start = 0
+    yield '<table class="table table-bordered table-condensed">'
     for event in events:
         if not start:
             start = event.timestamp
-        # element.append(layout(start, event))
-        element.append(row(start, event))
-    element.append("</table>")
-    return "\n".join(element)
+        yield row(start, event)
+    yield "</table>"
+
+
+def trace_output(events):
+    """
+
+    """
+    return "\n".join(iter_trace_output(events))
 
 
 def profile_output(pinfo, version=''):
@@ -1,7 +1,5 @@
 import copy
-import inspect
 import logging
-import sys
 
 from bs4 import BeautifulSoup
 from oic.exception import IssuerMismatch
@@ -16,6 +14,7 @@ from oic.oic.message import IdToken
 from oic.utils.http_util import Redirect
 from requests.models import Response
 
+from otest import aio
 from otest import Break
 from otest import Unknown
 from otest import operation
@@ -30,6 +29,7 @@ from otest.events import EV_REDIRECT_URL
 from otest.events import EV_REQUEST
 from otest.events import EV_RESPONSE
 from otest.prof_util import RESPONSE
+from otest.registry import OPERATIONS
 
 __author__ = 'rolandh'
 
@@ -118,10 +118,14 @@ class SyncRequest(Request):
     def do_request(self, client, url, body, ht_args):
         response = client.http_request(url, method=self.method, data=body,
                                        **ht_args)
+        return self.received(response)
 
+    def received(self, response):
+        """
+        Record a HTTP response, common to do_request and ado_request.
+        """
         self.conv.events.store(EV_HTTP_RESPONSE, response,
                                sender=self.__class__.__name__)
-
         return response
 
     def handle_response(self, r, csi):
@@ -213,7 +217,7 @@ class SyncRequest(Request):
 
         return resp
 
-    def run(self):
+    def prepare_request(self):
         _client = self.conv.entity
 
         url, body, ht_args, csi = _client.request_info(
@@ -229,11 +233,35 @@ class SyncRequest(Request):
             http_args.update(ht_args)
 
         self.conv.events.store(EV_REQUEST, csi, sender=self.__class__.__name__)
-        http_response = self.do_request(_client, url, body, http_args)
+        return url, body, http_args, csi
+
+    def run(self):
+        url, body, http_args, csi = self.prepare_request()
+        http_response = self.do_request(self.conv.entity, url, body,
+                                        http_args)
 
         self.catch_exception_and_error(self.handle_response, r=http_response,
                                        csi=csi)
 
+    async def ado_request(self, client, url, body, ht_args):
+        response = await aio.http_request(client, url, method=self.method,
+                                          data=body, **ht_args)
+        return self.received(response)
+
+    async def arun(self):
+        if aio.overrides(self, SyncRequest, 'run') or aio.overrides(
+                self, SyncRequest, 'do_request'):
+            return await aio.run_in_executor(self.run)
+
+        url, body, http_args, csi = self.prepare_request()
+        http_response = await self.ado_request(self.conv.entity, url, body,
+                                               http_args)
+
+        # Parsing the response may mean fetching keys
+        await aio.run_in_executor(self.catch_exception_and_error,
+                                  self.handle_response, r=http_response,
+                                  csi=csi)
+
 
 class AsyncRequest(Request):
     request_cls = None
@@ -403,10 +431,9 @@ class SyncDeleteRequest(SyncRequest):
 
 
 def factory(name):
-    for fname, obj in inspect.getmembers(sys.modules[__name__]):
-        if inspect.isclass(obj):
-            if name == fname:
-                return obj
+    obj = OPERATIONS.lookup(__name__, name)
+    if obj:
+        return obj
 
     obj = operation.factory(name)
     if not obj:
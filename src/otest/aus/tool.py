@@ -1,3 +1,4 @@
+import functools
 import logging
 # from urllib.parse import parse_qs
 from urllib.parse import quote_plus
@@ -6,6 +7,7 @@ import cherrypy
 from oic.utils.http_util import Redirect
 from oic.utils.http_util import Response
 
+from otest import aio
 from otest import Break, ConditionError
 from otest import Done
 from otest import exception_trace
@@ -50,7 +52,15 @@ class Tester(tool.Tester):
         except KeyError:
             return safe_path('dummy', self.sh.profile, test_id)
 
-    def run_flow(self, test_id, index=0, profiles=None, conf=None):
+    def _flow(self, test_id, index, conf):
+        """
+        The steps of a flow, shared by run_flow and arun_flow.
+
+        A generator that yields what is to be run: the operations and,
+        last, the flow's assertions. The caller runs them and sends back
+        the result or throws in the exception they raised. What the flow
+        returns is the StopIteration value.
+        """
         logger.info("<=<=<=<=< %s >=>=>=>=>" % test_id)
         self.flows.complete[test_id] = False
         self.conv.test_id = test_id
@@ -84,7 +94,7 @@ class Tester(tool.Tester):
                 _oper.setup(self.profiles.PROFILEMAP)
                 if _oper.fail:
                     break
-                resp = _oper()
+                resp = yield _oper
             except Break:
                 break
             except cherrypy.HTTPError:
@@ -110,7 +120,8 @@ class Tester(tool.Tester):
             try:
                 if self.conv.flow["assert"]:
                     _ver = Verify(self.check_factory, self.conv)
-                    _ver.test_sequence(self.conv.flow["assert"])
+                    yield functools.partial(_ver.test_sequence,
+                                            self.conv.flow["assert"])
             except (KeyError, Break):
                 self.conv.events.store(EV_CONDITION, State('Done', status=OK))
             except ConditionError:
@@ -123,6 +134,38 @@ class Tester(tool.Tester):
         tinfo = self.store_result(res)
         return tinfo['state']
 
+    def run_flow(self, test_id, index=0, profiles=None, conf=None):
+        steps = self._flow(test_id, index, conf)
+        try:
+            step = next(steps)
+            while True:
+                try:
+                    resp = step()
+                except Exception as err:
+                    step = steps.throw(err)
+                else:
+                    step = steps.send(resp)
+        except StopIteration as res:
+            return res.value
+
+    async def arun_flow(self, test_id, index=0, profiles=None, conf=None):
+        """
+        Async variant of run_flow, operations are run with aio.call and the
+        assertions in the executor.
+        """
+        steps = self._flow(test_id, index, conf)
+        try:
+            step = next(steps)
+            while True:
+                try:
+                    resp = await aio.call(step)
+                except Exception as err:
+                    step = steps.throw(err)
+                else:
+                    step = steps.send(resp)
+        except StopIteration as res:
+            return res.value
+
 
 class ClTester(Tester):
     pass
@@ -0,0 +1,189 @@
+"""
+    Batch execution of test flows
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Runs a number of independent tests concurrently. Every test gets its
+    own Tester instance, and by that its own Conversation, client (with its
+    own copy of the keyjar) and cookie jar. Test information is collected
+    per worker and merged into the shared FlowState in the order the
+    tests were given, regardless of the order they finished in.
+
+    A test that stops to wait for user interaction can't be continued by
+    the worker. When that happens the batch is stopped, tests that hasn't
+    started are not run, and the paused test's session is handed back to
+    the caller so it can be continued there.
+
+    :copyright: (c) 2016 by Roland Hedberg.
+    :license: APACHE 2.0, see LICENSE for more details.
+"""
+import copy
+import logging
+from concurrent.futures import as_completed
+from concurrent.futures import CancelledError
+from concurrent.futures import ThreadPoolExecutor
+
+from otest import exception_trace
+
+__author__ = 'roland'
+
+logger = logging.getLogger(__name__)
+
+
+def _unique(test_ids):
+    res = []
+    for tid in test_ids:
+        if tid not in res:
+            res.append(tid)
+    return res
+
+
+class BatchResult(object):
+    def __init__(self, test_id, result=None, test_info=None, complete=None,
+                 error=None, session=None):
+        self.test_id = test_id
+        # What Tester.run returned
+        self.result = result
+        self.test_info = test_info
+        self.complete = complete
+        self.error = error
+        # The worker's SessionHandler
+        self.session = session
+        self.paused = False
+
+    def __repr__(self):
+        return '<BatchResult {} state={}>'.format(self.test_id, self.state)
+
+    @property
+    def state(self):
+        try:
+            return self.test_info['state']
+        except (KeyError, TypeError):
+            return None
+
+
+def worker_flows(flows):
+    """
+    A FlowState that shares everything with flows except where the test
+    information is stored.
+    """
+    _flows = copy.copy(flows)
+    _flows.test_info = {}
+    _flows.complete = {}
+    return _flows
+
+
+class BatchRunner(object):
+    def __init__(self, make_tester, flows, concurrency=4, executor=None,
+                 progress=None, is_paused=None):
+        """
+        :param make_tester: Function that given a FlowState returns a new
+            Tester instance that uses that FlowState. The Tester must also
+            have its own SessionHandler, see SessionHandler.copy.
+        :param flows: The shared FlowState instance
+        :param concurrency: How many tests that are run at the same time
+        :param executor: A concurrent.futures.Executor to use instead of
+            a thread pool with concurrency workers.
+        :param progress: Function that is called as progress(done, total,
+            batch_result) every time a test has finished
+        :param is_paused: Function that given a BatchResult tells whether
+            the test is waiting for user interaction.
+        """
+        self.make_tester = make_tester
+        self.flows = flows
+        self.concurrency = concurrency
+        self.executor = executor
+        self.progress = progress
+        self.is_paused = is_paused
+        # The first test that paused, the one the caller should continue
+        self.paused = None
+
+    def run_one(self, test_id, **kw_args):
+        _flows = worker_flows(self.flows)
+        tester = self.make_tester(_flows)
+        try:
+            res = tester.run(test_id, **kw_args)
+        except Exception as err:
+            exception_trace('batch', err, logger)
+            return BatchResult(test_id,
+                               test_info=_flows.test_info.get(test_id),
+                               complete=_flows.complete.get(test_id),
+                               error=err, session=tester.sh)
+
+        return BatchResult(test_id, res, _flows.test_info.get(test_id),
+                           _flows.complete.get(test_id), session=tester.sh)
+
+    def iter_results(self, test_ids, **kw_args):
+        """
+        Run the tests, results are returned as the tests are done.
+        If a test pauses, tests that hasn't started are cancelled while the
+        running ones are allowed to finish.
+
+        :param test_ids: The test IDs
+        :param kw_args: Passed on to Tester.run
+        :return: generator of BatchResult instances in completion order
+        """
+        _tids = _unique(test_ids)
+        self.paused = None
+        if self.executor is None:
+            executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        else:
+            executor = self.executor
+
+        try:
+            futures = [executor.submit(self.run_one, tid, **kw_args)
+                       for tid in _tids]
+            done = 0
+            for fut in as_completed(futures):
+                try:
+                    res = fut.result()
+                except CancelledError:
+                    continue
+
+                if res.error is None and self.is_paused and self.is_paused(
+                        res):
+                    res.paused = True
+                    if self.paused is None:
+                        self.paused = res
+                        for _fut in futures:
+                            _fut.cancel()
+                    else:
+                        logger.warning(
+                            '{} paused after {}, it can not be '
+                            'continued'.format(res.test_id,
+                                               self.paused.test_id))
+                done += 1
+                if self.progress:
+                    self.progress(done, len(_tids), res)
+                yield res
+        finally:
+            if self.executor is None:
+                executor.shutdown(wait=True)
+
+    def merge(self, results):
+        """
+        Add the collected test information to the shared FlowState.
+        """
+        for res in results:
+            if res.test_info is not None:
+                self.flows.test_info[res.test_id] = res.test_info
+            if res.complete is not None:
+                self.flows.complete[res.test_id] = res.complete
+
+    def run(self, test_ids, **kw_args):
+        """
+        Run the tests and merge the test information into the shared
+        FlowState.
+
+        :param test_ids: The test IDs
+        :param kw_args: Passed on to Tester.run
+        :return: list of BatchResult instances in the order of test_ids.
+            Tests that were not run because another test paused are left
+            out.
+        """
+        _res = {}
+        for res in self.iter_results(test_ids, **kw_args):
+            _res[res.test_id] = res
+
+        results = [_res[tid] for tid in _unique(test_ids) if tid in _res]
+        self.merge(results)
+        return results
@@ -0,0 +1,315 @@
+"""
+    Precompiled flow bundles
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Packs a directory of flow descriptions (<test_id>.json files) into one
+    file that can be memory mapped.
+
+    Layout::
+
+        MAGIC (4 bytes) VERSION (1 byte) index length (4 bytes, big endian)
+        index (JSON)
+        flow descriptions (JSON), one after the other
+
+    The index holds the offset and length, relative to the end of the
+    index, of every flow description, the modification time and size of
+    the file each description was read from and a name table mapping
+    operation class and function names to where they are defined.
+
+    A description in a bundle is only used as long as the file it was read
+    from is unchanged, so a bundle never hides edits to the flow directory.
+
+    :copyright: (c) 2016 by Roland Hedberg.
+    :license: APACHE 2.0, see LICENSE for more details.
+"""
+import importlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+
+from otest import Unknown
+
+__author__ = 'roland'
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'OTFB'
+VERSION = 2
+HEADER = struct.Struct('>4sBI')
+BUNDLE_NAME = 'flows.bundle'
+
+
+class BundleError(Exception):
+    pass
+
+
+def _qualified_name(obj):
+    return '{}:{}'.format(obj.__module__, obj.__name__)
+
+
+def source_stat(path):
+    """
+    :return: [modification time in nanoseconds, size] of a file
+    """
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def import_name(qname):
+    """
+    Import a class or function given its qualified name.
+
+    :param qname: A name on the format <module>:<name>
+    :return: The class or function
+    """
+    module, name = qname.split(':', 1)
+    return getattr(importlib.import_module(module), name)
+
+
+def name_table(specs, cls_factories=None, func_factory=None, use=''):
+    """
+    Resolve the operation class and function names used in flow
+    descriptions.
+
+    :param specs: Dictionary of flow descriptions keyed on test ID
+    :param cls_factories: Class factories keyed on use
+    :param func_factory: Function factory
+    :param use: Which class factory to try first
+    :return: Dictionary with 'classes' and 'functions' name tables
+    """
+    from otest.flow import _get_cls
+    from otest.flow import _get_func
+
+    table = {'classes': {}, 'functions': {}}
+    if not cls_factories:
+        return table
+
+    for tid, spec in specs.items():
+        for oper in spec.get('sequence', []):
+            if isinstance(oper, dict):
+                name, funcs = list(oper.items())[0]
+            else:
+                name, funcs = oper, {}
+
+            if name not in table['classes']:
+                try:
+                    table['classes'][name] = _qualified_name(
+                        _get_cls(name, cls_factories, use))
+                except Exception:
+                    raise Unknown("{}: unknown class '{}'".format(tid, name))
+
+            if not func_factory:
+                continue
+
+            for fname in funcs:
+                if fname not in table['functions']:
+                    func = list(_get_func({fname: None}, func_factory))[0]
+                    table['functions'][fname] = _qualified_name(func)
+
+    return table
+
+
+def compile_flows(fdir, path='', cls_factories=None, func_factory=None,
+                  use=''):
+    """
+    Write a flow bundle.
+
+    :param fdir: Directory with flow descriptions
+    :param path: Where to write the bundle, default fdir/flows.bundle
+    :return: The path of the bundle
+    """
+    if not path:
+        path = os.path.join(fdir, BUNDLE_NAME)
+
+    specs = {}
+    sources = {}
+    for fn in sorted(os.listdir(fdir)):
+        if fn.endswith('.json'):
+            _path = os.path.join(fdir, fn)
+            # Before it's read, so a change while reading is noticed
+            sources[fn[:-5]] = source_stat(_path)
+            with open(_path, 'r') as fp:
+                specs[fn[:-5]] = json.load(fp)
+
+    tests = {}
+    blobs = []
+    offset = 0
+    for tid in sorted(specs.keys()):
+        blob = json.dumps(specs[tid], sort_keys=True).encode('utf-8')
+        tests[tid] = [offset, len(blob)]
+        blobs.append(blob)
+        offset += len(blob)
+
+    index = {
+        'tests': tests,
+        'names': name_table(specs, cls_factories, func_factory, use),
+        'sources': sources,
+        'use': use
+    }
+    _index = json.dumps(index, sort_keys=True).encode('utf-8')
+
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as fp:
+        fp.write(HEADER.pack(MAGIC, VERSION, len(_index)))
+        fp.write(_index)
+        for blob in blobs:
+            fp.write(blob)
+    os.rename(tmp, path)
+    return path
+
+
+class FlowBundle(object):
+    def __init__(self, path, fdir=None):
+        """
+        :param path: Path to the bundle
+        :param fdir: The flow directory the bundle was made from. If given
+            descriptions are checked against the files in it, see
+            is_current()
+        """
+        self.path = path
+        self.fdir = fdir
+        self._fp = open(path, 'rb')
+        self._mm = mmap.mmap(self._fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, index_len = HEADER.unpack(self._mm[:HEADER.size])
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise BundleError('Not a flow bundle: {}'.format(path))
+
+        _start = HEADER.size
+        index = json.loads(self._mm[_start:_start + index_len].decode('utf-8'))
+        self._base = _start + index_len
+        self.tests = index['tests']
+        self.names = index['names']
+        self.use = index['use']
+        self.sources = index['sources']
+        self._specs = {}
+        self._stale = set()
+
+    def keys(self):
+        return self.tests.keys()
+
+    def __contains__(self, tid):
+        return tid in self.tests
+
+    def is_current(self, tid):
+        """
+        Whether the description in the bundle is the same as the one in
+        the flow directory. Always true if there is no flow directory.
+
+        :param tid: Test ID
+        """
+        if self.fdir is None:
+            return True
+
+        try:
+            _stat = source_stat(os.path.join(self.fdir, tid + '.json'))
+        except OSError:
+            _stat = None
+        if _stat == self.sources.get(tid):
+            return True
+
+        if tid not in self._stale:
+            self._stale.add(tid)
+            logger.warning('{} has changed since the flow bundle {} was '
+                           'made'.format(tid, self.path))
+        return False
+
+    def get(self, tid):
+        """
+        Get a parsed flow description. Must not be modified by the caller.
+
+        :param tid: Test ID
+        :return: Flow description
+        """
+        try:
+            return self._specs[tid]
+        except KeyError:
+            pass
+
+        offset, length = self.tests[tid]
+        _start = self._base + offset
+        spec = json.loads(self._mm[_start:_start + length].decode('utf-8'))
+        self._specs[tid] = spec
+        return spec
+
+    def resolve_class(self, name):
+        return import_name(self.names['classes'][name])
+
+    def resolve_func(self, name):
+        return import_name(self.names['functions'][name])
+
+    def close(self):
+        self._mm.close()
+        self._fp.close()
+
+
+def find_bundle(fdir):
+    """
+    Find a flow bundle for a flow directory.
+
+    :param fdir: Either a flow directory or a path to a bundle
+    :return: Path to the bundle or None
+    """
+    if os.path.isfile(fdir):
+        return fdir
+
+    path = os.path.join(fdir, BUNDLE_NAME)
+    if not os.path.isfile(path):
+        return None
+
+    return path
+
+
+def open_bundle(fdir):
+    """
+    Open the flow bundle for a flow directory, if there is a usable one.
+
+    :param fdir: Either a flow directory or a path to a bundle
+    :return: FlowBundle instance or None
+    """
+    path = find_bundle(fdir)
+    if not path:
+        return None
+
+    try:
+        if path == fdir:
+            return FlowBundle(path)
+        return FlowBundle(path, fdir)
+    except (BundleError, KeyError, ValueError) as err:
+        logger.warning('Ignoring flow bundle {}: {}'.format(path, err))
+        return None
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Pack a directory of flow descriptions into a bundle')
+    parser.add_argument('-o', dest='output', help='Bundle file name')
+    parser.add_argument(
+        '-c', dest='config',
+        help='Tool configuration module with TOOL_ARGS, used to resolve '
+             'class and function names')
+    parser.add_argument('-u', dest='use', default='',
+                        help='Which class factory to use first')
+    parser.add_argument(dest='flowdir')
+    args = parser.parse_args()
+
+    cls_factories = func_factory = None
+    if args.config:
+        sys.path.insert(0, '.')
+        _conf = importlib.import_module(args.config)
+        cls_factories = _conf.TOOL_ARGS['cls_factories']
+        func_factory = _conf.TOOL_ARGS['func_factory']
+
+    path = compile_flows(args.flowdir, args.output or '', cls_factories,
+                         func_factory, args.use)
+    print('Wrote {}'.format(path))
+
+
+if __name__ == '__main__':
+    main()
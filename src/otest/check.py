@@ -6,9 +6,9 @@
     :license: APACHE 2.0, see LICENSE for more details.
 """
 from future.backports.urllib.parse import parse_qs
+from future.utils import with_metaclass
 
 import json
-import inspect
 import traceback
 import sys
 
@@ -17,6 +17,7 @@ from otest.events import EV_PROTOCOL_RESPONSE
 from otest.events import EV_REDIRECT_URL
 from otest.events import EV_RESPONSE
 from otest.events import EV_HTTP_RESPONSE
+from otest.registry import CHECKS
 
 from oic.oic import message
 
@@ -98,7 +99,24 @@ class State(object):
         return txt
 
 
-class Check(object):
+class CheckMeta(type):
+    """
+    Registers every check class that defines a cid in the check registry
+    when the class is created.
+
+    A class that has its own _func isn't pure unless it says so, even if
+    the class it's based on is.
+    """
+
+    def __init__(cls, name, bases, attrs):
+        super(CheckMeta, cls).__init__(name, bases, attrs)
+        if '_func' in attrs and 'pure' not in attrs:
+            cls.pure = False
+        if 'cid' in attrs:
+            CHECKS.add(cls)
+
+
+class Check(with_metaclass(CheckMeta, object)):
     """ General test
     """
 
@@ -106,6 +124,9 @@ class Check(object):
     msg = "OK"
     mti = True
     state_cls = State
+    # True if the check does nothing but read conv.events. Such checks may
+    # be run concurrently over a snapshot of the events, see otest.verify
+    pure = False
 
     def __init__(self, **kwargs):
         self._status = OK
@@ -207,6 +228,7 @@ class CheckHTTPResponse(CriticalError):
     """
     cid = "http_response"
     msg = "Incorrect HTTP status_code"
+    pure = True
 
     def _func(self, conv):
         _response = conv.events.last_item(EV_HTTP_RESPONSE)
@@ -230,15 +252,26 @@ class CheckHTTPResponse(CriticalError):
 
 
 def factory(cid):
-    for name, obj in inspect.getmembers(sys.modules[__name__]):
-        if inspect.isclass(obj):
-            try:
-                if obj.cid == cid:
-                    return obj
-            except AttributeError:
-                pass
+    return CHECKS.lookup(__name__, cid)
+
 
-    return None
+def list_checks(layers=None):
+    """
+    List all checks, for tooling.
+
+    :param layers: Check modules in search order, default
+        otest.registry.CHECK_LAYERS
+    :return: list of (check ID, module, class name, description) tuples
+    """
+    res = []
+    for cid, cls in CHECKS.checks(layers):
+        try:
+            _desc = " ".join(
+                [str(s).strip() for s in cls.__doc__.strip().split("\n")])
+        except AttributeError:
+            _desc = ""
+        res.append((cid, cls.__module__, cls.__name__, _desc))
+    return res
 
 
 def get_provider_info(conv):
@@ -0,0 +1,435 @@
+"""
+    Session checkpoints
+    ~~~~~~~~~~~~~~~~~~~
+
+    Checkpoint and restore of a running session: the session information,
+    the conversation with its flow index and events, and the state of the
+    entity (client registration and keys). A checkpoint can be restored in
+    another process so a test can be resumed without replaying the flow.
+
+    A checkpoint file is a sequence of frames. Each frame is a header,
+    magic, format version, frame type and payload length, followed by a
+    zlib compressed pickle of a record. The first frame is a full
+    checkpoint, the frames following it are deltas that only contain what
+    has changed since the frame before: changed session information, new
+    events and, if it changed, the entity state. If the events of the
+    conversation have been reset since the frame before a full checkpoint
+    is written instead. A frame that wasn't completely written, because
+    the process died, is ignored when the checkpoint is loaded.
+
+    :copyright: (c) 2016 by Roland Hedberg.
+    :license: APACHE 2.0, see LICENSE for more details.
+"""
+import hashlib
+import logging
+import os
+import pickle
+import struct
+import threading
+import time
+import uuid
+import zlib
+
+from oic.utils.keyio import KeyBundle
+
+__author__ = 'roland'
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'OTCP'
+VERSION = 1
+
+# Frame types
+FULL = 0
+DELTA = 1
+
+# magic, version, frame type, payload length
+HEADER = struct.Struct('>4sBBI')
+
+# Entity attributes that are part of the entity state, unless the entity
+# has its own export_state/import_state methods
+ENTITY_ATTRIBUTES = ['client_id', 'client_secret', 'registration_response',
+                     'registration_access_token', 'provider_info',
+                     'behaviour', 'redirect_uris', 'kid']
+
+BUNDLE_ATTRIBUTES = ['source', 'remote', 'cache_time', 'time_out', 'etag',
+                     'imp_jwks', 'last_updated']
+
+
+class CheckpointError(Exception):
+    pass
+
+
+def _pickle(item):
+    return pickle.dumps(item, pickle.HIGHEST_PROTOCOL)
+
+
+def _digest(item):
+    return hashlib.sha1(_pickle(item)).digest()
+
+
+def portable_event(event):
+    """
+    :param event: Event state as returned by otest.conversation.event_state
+    :return: The same event state or, if the event data can't be
+        serialized, one where the data is replaced by its string
+        representation.
+    """
+    try:
+        _pickle(event)
+    except Exception:
+        event = list(event)
+        event[2] = '{}'.format(event[2])
+        event = tuple(event)
+    return event
+
+
+def bundle_state(kb):
+    """
+    :param kb: KeyBundle instance
+    :return: The keys, including private parts, and where they came from
+    """
+    # Not kb.keys() since that may fetch keys from a remote source
+    state = {'keys': [k.serialize(private=True) for k in kb._keys]}
+    for attr in BUNDLE_ATTRIBUTES:
+        state[attr] = getattr(kb, attr)
+    return state
+
+
+def restore_bundle(state):
+    kb = KeyBundle(state['keys'])
+    for attr in BUNDLE_ATTRIBUTES:
+        setattr(kb, attr, state[attr])
+    return kb
+
+
+def keyjar_state(keyjar, issuers=None):
+    """
+    :param keyjar: KeyJar instance
+    :param issuers: The issuers whose keys should be included, None means
+        all of them
+    :return: Dictionary with issuer as key and a list of key bundle states
+        as value
+    """
+    if issuers is None:
+        issuers = list(keyjar.issuer_keys.keys())
+
+    state = {}
+    for iss in issuers:
+        try:
+            state[iss] = [bundle_state(kb) for kb in keyjar.issuer_keys[iss]]
+        except KeyError:
+            pass
+    return state
+
+
+def restore_keyjar(keyjar, state):
+    """
+    Replace the keys of the issuers in the state.
+
+    :param keyjar: KeyJar instance
+    :param state: What keyjar_state returned
+    """
+    for iss, bundles in state.items():
+        keyjar[iss] = [restore_bundle(kb) for kb in bundles]
+
+
+def entity_state(entity):
+    """
+    The client registration and key information of an entity. An entity
+    that has an export_state method provides its own state.
+
+    :param entity: Client or Provider instance
+    :return: Dictionary
+    """
+    _export = getattr(entity, 'export_state', None)
+    if _export is not None:
+        return _export()
+
+    state = {}
+    for attr in ENTITY_ATTRIBUTES:
+        try:
+            val = getattr(entity, attr)
+        except AttributeError:
+            continue
+        try:
+            _pickle(val)
+        except Exception as err:
+            logger.warning('Can not checkpoint entity attribute {}: {}'.format(
+                attr, err))
+        else:
+            state[attr] = val
+
+    try:
+        state['keyjar'] = keyjar_state(entity.keyjar)
+    except AttributeError:
+        pass
+    return state
+
+
+def restore_entity(entity, state):
+    """
+    :param entity: Client or Provider instance, typically a new one
+    :param state: What entity_state returned
+    """
+    _import = getattr(entity, 'import_state', None)
+    if _import is not None:
+        _import(state)
+        return
+
+    for attr, val in state.items():
+        if attr == 'keyjar':
+            restore_keyjar(entity.keyjar, val)
+        else:
+            setattr(entity, attr, val)
+
+
+def frame(kind, record):
+    """
+    :param kind: FULL or DELTA
+    :param record: The checkpoint record
+    :return: bytes
+    """
+    payload = zlib.compress(_pickle(record))
+    return HEADER.pack(MAGIC, VERSION, kind, len(payload)) + payload
+
+
+def read_frames(data):
+    """
+    :param data: The content of a checkpoint file
+    :return: list of (frame type, record) tuples
+    """
+    frames = []
+    offset = 0
+    while offset < len(data):
+        if len(data) - offset < HEADER.size:
+            logger.warning('Ignoring incomplete checkpoint frame')
+            break
+        magic, version, kind, length = HEADER.unpack_from(data, offset)
+        if magic != MAGIC:
+            raise CheckpointError('Not a checkpoint')
+        if version != VERSION:
+            raise CheckpointError(
+                'Unsupported checkpoint format version: {}'.format(version))
+        _start = offset + HEADER.size
+        if len(data) - _start < length:
+            logger.warning('Ignoring incomplete checkpoint frame')
+            break
+        try:
+            record = pickle.loads(zlib.decompress(data[_start:_start + length]))
+        except Exception as err:
+            raise CheckpointError(
+                'Could not read checkpoint frame: {}'.format(err))
+        frames.append((kind, record))
+        offset = _start + length
+    return frames
+
+
+class Checkpoint(object):
+    """
+    A checkpoint file for one session. Remembers what was written last so
+    following checkpoints can be written as deltas.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.chain = None
+        self.seq = 0
+        # Where the last frame this instance wrote ends
+        self.size = 0
+        self._digests = {}
+        self._conv_digests = {}
+        self._conv = None
+        self._events = 0
+        # Timestamp of the last event written
+        self._last_event = None
+        self._entity = None
+
+    def _conv_state(self, sh):
+        try:
+            conv = sh['conv']
+        except KeyError:
+            return None, None
+        state = conv.export_state()
+        state['events'] = [portable_event(ev) for ev in state['events']]
+        if conv.entity is not None:
+            state['entity'] = entity_state(conv.entity)
+        return conv, state
+
+    def _record(self, sh, delta):
+        """
+        Build a checkpoint record and remember what it contains.
+
+        :return: The record, as a delta if delta is True
+        """
+        record = {'chain': self.chain, 'seq': self.seq, 'time': time.time(),
+                  'tool_version': sh.tool_version}
+
+        digests = {}
+        _dict = {}
+        for key, val in sh.items():
+            if key == 'conv':
+                continue
+            digests[key] = _digest(val)
+            if not delta or self._digests.get(key) != digests[key]:
+                _dict[key] = val
+        record['dict'] = _dict
+        if delta:
+            record['removed'] = [k for k in self._digests if k not in digests]
+        self._digests = digests
+
+        conv, _state = self._conv_state(sh)
+        if conv is None:
+            record['conv'] = None
+            self._conv = None
+            self._entity = None
+            return record
+
+        _entity = _state.pop('entity', None)
+        _events = _state.pop('events')
+        conv_digests = dict([(k, _digest(v)) for k, v in _state.items()])
+
+        if delta and conv is self._conv and len(_events) >= self._events:
+            record['conv'] = dict(
+                [(k, v) for k, v in _state.items()
+                 if self._conv_digests.get(k) != conv_digests[k]])
+            record['events'] = (self._events, _events[self._events:])
+        else:
+            record['conv'] = _state
+            record['events'] = (0, _events)
+            # A new conversation, the entity must be included
+            self._entity = None
+
+        _edigest = _digest(_entity)
+        if not delta or _edigest != self._entity:
+            record['entity'] = _entity
+        self._entity = _edigest
+
+        self._conv = conv
+        self._conv_digests = conv_digests
+        self._events = len(_events)
+        try:
+            self._last_event = conv.events.events[-1].timestamp
+        except IndexError:
+            self._last_event = None
+        return record
+
+    def _events_appended(self, sh):
+        """
+        Whether the events of the conversation are the ones last written,
+        possibly with new ones added. Not the case if the events have been
+        reset, then the event where the last frame ended is gone.
+        """
+        try:
+            conv = sh['conv']
+        except KeyError:
+            return True
+        if conv is not self._conv or not self._events:
+            return True
+
+        try:
+            _event = conv.events.events[self._events - 1]
+        except IndexError:
+            return False
+        return _event.timestamp == self._last_event
+
+    def _delta_possible(self):
+        if self.chain is None:
+            return False
+        try:
+            # Someone else may have written to the file
+            return os.path.getsize(self.filename) == self.size
+        except OSError:
+            return False
+
+    def dump(self, sh, delta=True):
+        """
+        Write a checkpoint of the session.
+
+        :param sh: SessionHandler instance
+        :param delta: Append a delta to the checkpoint file if possible,
+            otherwise replace the file with a full checkpoint.
+        """
+        if delta and self._delta_possible() and self._events_appended(sh):
+            self.seq += 1
+            data = frame(DELTA, self._record(sh, True))
+            with open(self.filename, 'ab') as fp:
+                fp.write(data)
+            self.size += len(data)
+        else:
+            self.chain = uuid.uuid4().hex
+            self.seq = 0
+            data = frame(FULL, self._record(sh, False))
+            # Write and rename so readers never see a partial file
+            tmp = '{}.{}.{}.tmp'.format(self.filename, os.getpid(),
+                                        threading.current_thread().ident)
+            with open(tmp, 'wb') as fp:
+                fp.write(data)
+            os.rename(tmp, self.filename)
+            self.size = len(data)
+
+    def load(self):
+        """
+        Read the checkpoint file and apply the deltas to the full
+        checkpoint.
+
+        :return: Session state in the form SessionHandler.export_state
+            returns it, with the entity state added to the conversation
+            state.
+        """
+        try:
+            with open(self.filename, 'rb') as fp:
+                data = fp.read()
+        except (IOError, OSError) as err:
+            raise CheckpointError('Could not read checkpoint: {}'.format(err))
+
+        frames = read_frames(data)
+        if not frames or frames[0][0] != FULL:
+            raise CheckpointError('No full checkpoint in {}'.format(
+                self.filename))
+
+        _dict = {}
+        conv = None
+        events = []
+        entity = None
+        for index, (kind, record) in enumerate(frames):
+            if kind == FULL:
+                if index:
+                    raise CheckpointError('Full checkpoint after delta')
+                self.chain = record['chain']
+            elif record['chain'] != self.chain or record['seq'] != self.seq + 1:
+                raise CheckpointError('Checkpoint delta out of sequence')
+
+            self.seq = record['seq']
+            tool_version = record['tool_version']
+            _dict.update(record['dict'])
+            for key in record.get('removed', []):
+                _dict.pop(key, None)
+
+            if record['conv'] is None:
+                conv = None
+                events = []
+                entity = None
+                continue
+
+            _start, _events = record['events']
+            if conv is None or _start == 0:
+                conv = dict(record['conv'])
+            else:
+                conv.update(record['conv'])
+            events = events[:_start] + list(_events)
+            try:
+                entity = record['entity']
+            except KeyError:
+                pass
+
+        # What was loaded isn't remembered, the next checkpoint is a full one
+        self.chain = None
+
+        state = {'tool_version': tool_version, 'dict': _dict}
+        if conv is not None:
+            conv['events'] = events
+            if entity is not None:
+                conv['entity'] = entity
+            state['conv'] = conv
+        return state
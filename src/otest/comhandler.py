@@ -1,4 +1,5 @@
 import logging
+from otest import aio
 from otest import FatalError
 from otest.contenthandler import HandlerResponse
 from otest.events import EV_HTTP_RESPONSE
@@ -73,3 +74,13 @@ class ComHandler(object):
 
             if not handled:
                 return HandlerResponse(False)
+
+    async def acall(self, http_response, target_url='', auto_close_urls=None,
+                    conv=None, **kwargs):
+        """
+        Async variant of __call__. Content handlers are synchronous so the
+        whole thing is run in an executor.
+        """
+        return await aio.run_in_executor(
+            self, http_response, target_url=target_url,
+            auto_close_urls=auto_close_urls, conv=conv, **kwargs)
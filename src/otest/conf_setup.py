@@ -216,4 +216,16 @@ def construct_app_args(args, conf, operations, func, default_profiles,
         "profile_handler": ProfileHandler
     }
 
+    # Where the events of each test are journaled, if anywhere
+    _journal_dir = getattr(args, 'journal_dir', None) or \
+        inst_conf['tool'].get('journal_dir') or \
+        getattr(conf, 'JOURNAL_DIR', None)
+    if _journal_dir:
+        app_args['journal_dir'] = _journal_dir
+
+    # The test info template streams the trace, see otest.handling
+    if inst_conf['tool'].get('stream_trace') or \
+            getattr(conf, 'STREAM_TRACE', False):
+        app_args['stream_trace'] = True
+
     return _path, app_args
@@ -1,6 +1,6 @@
-import json
 import logging
 #from otest.interaction import Interaction
+from otest.events import Event
 from otest.events import Events
 
 __author__ = 'roland'
@@ -8,6 +8,16 @@ __author__ = 'roland'
 logger = logging.getLogger(__name__)
 
 
+# Attributes that are part of the conversation state, see export_state
+STATE_ATTRIBUTES = ['flow', 'test_id', 'info', 'index', 'sequence', 'cache',
+                    'features', 'operator_id', 'extra_args', 'entity_id']
+
+
+def event_state(event):
+    return (event.timestamp, event.typ, event.data, event.ref, event.sub,
+            event.sender, event.direction, event._kwargs or {})
+
+
 class Conversation(object):
     def __init__(self, flow, entity, msg_factory, check_factory=None,
                  features=None, opid=None, **extra_args):
@@ -30,32 +40,39 @@ class Conversation(object):
         self.tool_config = {}
         self.conf = None
 
-    def dump_state(self, filename):
-        state = {
-            "client": {
-                "behaviour": self.entity.behaviour,
-                "keyjar": self.entity.keyjar.dump(),
-                "provider_info": self.entity.provider_info.to_json(),
-                "client_id": self.entity.client_id,
-                "client_secret": self.entity.client_secret,
-            },
-            "sequence": self.flow,
-            "flow_index": self.index,
-            "client_config": self.entity.conf,
-            "condition": self.events.get('condition')
-        }
+    def export_state(self):
+        """
+        The state of the conversation, without the entity, the message
+        and check factories and the communication handler. Which have to
+        be provided by whoever restores the conversation.
 
-        try:
-            state["client"][
-                "registration_resp"] = \
-                self.entity.registration_response.to_json()
-        except AttributeError:
-            pass
-
-        txt = json.dumps(state)
-        _fh = open(filename, "w")
-        _fh.write(txt)
-        _fh.close()
+        :return: Dictionary
+        """
+        state = {}
+        for attr in STATE_ATTRIBUTES:
+            try:
+                state[attr] = getattr(self, attr)
+            except AttributeError:
+                pass
+        state['events'] = [event_state(ev) for ev in self.events]
+        return state
+
+    @classmethod
+    def from_state(cls, state, entity=None, msg_factory=None,
+                   check_factory=None):
+        """
+        Restore a conversation from what export_state returned.
+        """
+        conv = cls(state.get('flow'), entity, msg_factory, check_factory)
+        for attr in STATE_ATTRIBUTES:
+            if attr in state:
+                setattr(conv, attr, state[attr])
+
+        for (timestamp, typ, data, ref, sub, sender, direction,
+             kwargs) in state.get('events', []):
+            conv.events.append(Event(timestamp, typ, data, ref, sub, sender,
+                                     direction, **kwargs))
+        return conv
 
     def get_tool_attribute(self, *attr, **kwargs):
         """
@@ -1,4 +1,9 @@
+import bisect
+import html
+import itertools
 import json
+import sys
+import threading
 import time
 
 from oic.oauth2 import Message
@@ -11,6 +16,7 @@ OUTGOING = 2
 
 # standard event labels
 EV_ASSERTION = 'assertion'
+EV_CACHED_RESULT = 'cached result'
 EV_CONDITION = 'condition'
 EV_EXCEPTION = 'exception'
 EV_END = 'end'
@@ -21,6 +27,7 @@ EV_HANDLER_RESPONSE = 'handler response'
 EV_HTML_SRC = 'html src'
 EV_HTTP_ARGS = 'http args'
 EV_HTTP_INFO = 'http info'
+EV_HTTP_POOL = 'http pool'
 EV_HTTP_REQUEST = 'http request'
 EV_HTTP_RESPONSE = 'http response'
 EV_HTTP_RESPONSE_HEADER = 'http response header'
@@ -41,6 +48,52 @@ EV_URL = 'url'
 EV_JWS_HEADER = 'JWS header'
 EV_JWE_HEADER = 'JWE header'
 
+# Events that record what checks said about the other events. Storing them
+# doesn't change the version of an Events instance.
+VERIFICATION_EVENTS = [EV_ASSERTION, EV_CACHED_RESULT, EV_CONDITION]
+
+
+# Event timestamps are nanoseconds since the epoch. They are stored with
+# the events and compared with timestamps made by other processes.
+NS_PER_SEC = 1000000000
+
+try:
+    _time_ns = time.time_ns
+except AttributeError:  # Python < 3.7
+    def _time_ns():
+        return int(time.time() * NS_PER_SEC)
+
+_clock_lock = threading.Lock()
+_last_tick = [0]
+_sequence = itertools.count(1)
+
+
+def now():
+    """
+    A strictly increasing clock. Two calls never return the same value even
+    if the underlying clock has not moved between them, or has been set
+    back.
+
+    :return: Time in nanoseconds as an integer
+    """
+    with _clock_lock:
+        tick = _time_ns()
+        if tick <= _last_tick[0]:
+            tick = _last_tick[0] + 1
+        _last_tick[0] = tick
+    return tick
+
+
+def elapsed(start, event):
+    """
+    Time between start and when the event happened.
+
+    :param start: Start time in nanoseconds
+    :param event: An Event instance
+    :return: Seconds as a float with microsecond resolution
+    """
+    return round((event.timestamp - start) / NS_PER_SEC, 6)
+
 
 class NoSuchEvent(Exception):
     pass
@@ -102,7 +155,30 @@ class HTTPRequest(Base):
         return _res
 
 
+def _intern(value):
+    try:
+        return sys.intern(value)
+    except TypeError:
+        return value
+
+
+def _pack(value):
+    """
+    Text is kept as UTF-8 encoded bytes until someone asks for it.
+
+    :return: 2-tuple (value, packed or not)
+    """
+    if isinstance(value, str):
+        try:
+            return value.encode('utf-8'), True
+        except UnicodeEncodeError:
+            pass
+    return value, False
+
+
 class HTTPResponse(object):
+    __slots__ = ['status_code', 'url', 'headers', '_text', '_packed']
+
     def __init__(self, response):
         try:
             self.status_code = response.status_code
@@ -124,21 +200,102 @@ class HTTPResponse(object):
         else:
             self.text = ''
 
+    @property
+    def text(self):
+        if self._packed:
+            try:
+                self._text = self._text.decode('utf-8')
+            except AttributeError:  # Unpacked by someone else meanwhile
+                pass
+            self._packed = False
+        return self._text
+
+    @text.setter
+    def text(self, value):
+        self._text, self._packed = _pack(value)
+
+
+# Events whose payload are kept packed until first access
+LAZY_PAYLOAD = [EV_RESPONSE]
+
 
 class Event(object):
+    """
+    Something that happened during a test.
+
+    What is made from the event when a trace is shown (text lines, HTML rows
+    and so on) is kept with it, see render(). That is thrown away if the
+    data of the event is replaced or if changed() is called.
+    """
+    __slots__ = ['timestamp', 'seq', 'typ', '_data', '_packed', 'ref', 'sub',
+                 'sender', 'direction', '_kwargs', '_render']
+
     def __init__(self, timestamp=0, typ='', data=None, ref='', sub='',
                  sender='', direction=0, **kwargs):
-        self.timestamp = timestamp or time.time()
-        self.typ = typ
+        if timestamp:
+            self.timestamp = timestamp
+        else:
+            self.timestamp = now()
+        self.seq = next(_sequence)
+        self.typ = _intern(typ)
         self.data = data
         try:
-            self.ref = ref.lower()
+            self.ref = _intern(ref.lower())
         except AttributeError:
             self.ref = ref
         self.sub = sub
-        self.sender = sender
+        self.sender = _intern(sender)
         self.direction = direction
-        self.kwargs = kwargs
+        self._kwargs = kwargs or None
+
+    @property
+    def data(self):
+        if self._packed:
+            try:
+                self._data = self._data.decode('utf-8')
+            except AttributeError:  # Unpacked by someone else meanwhile
+                pass
+            self._packed = False
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._render = None
+        if self.typ in LAZY_PAYLOAD:
+            self._data, self._packed = _pack(value)
+        else:
+            self._data = value
+            self._packed = False
+
+    @property
+    def kwargs(self):
+        if self._kwargs is None:
+            self._kwargs = {}
+        return self._kwargs
+
+    def render(self, kind, func):
+        """
+        Something made from the event. It's only made the first time it's
+        asked for.
+
+        :param kind: What is made, there is one of each kind
+        :param func: Function that given the event makes it
+        :return: What func returned
+        """
+        try:
+            return self._render[kind]
+        except KeyError:
+            pass
+        except TypeError:
+            self._render = {}
+        res = self._render[kind] = func(self)
+        return res
+
+    def changed(self):
+        """
+        Has to be called if the data of the event is modified in place.
+        """
+        self._render = None
 
     def __str__(self):
         return '{}:{}:{}'.format(self.timestamp, self.typ, self.data)
@@ -159,75 +316,210 @@ class Event(object):
         return '{}:{}'.format(self.timestamp, self.typ)
 
 
+# Number of events per page, see Events.page()
+PAGE_SIZE = 100
+
+
 class Events(object):
-    def __init__(self):
+    """
+    An ordered store of events.
+
+    Apart from the list of events in the order they where stored, indexes
+    on type, ref, sender and direction are kept up to date so that lookups
+    don't have to scan the whole list.
+
+    If a journal (otest.journal.Journal) is given every event is also
+    written to it as it is stored.
+
+    Once a verdict (otest.summation.Verdict) has been attached it's fed
+    every event that is stored.
+
+    The version is bumped every time an event other than one of the
+    VERIFICATION_EVENTS is stored, or the store is reset. Results of checks
+    that only read the events (see otest.verify) are kept in check_results
+    and can be reused as long as the version is the same.
+
+    Events stored are always later than the events already there, also
+    those that were made somewhere else, for instance by another worker
+    whose clock is ahead of ours. See now().
+    """
+
+    def __init__(self, journal=None):
+        self.journal = journal
+        self.verdict = None
+        self.version = 0
+        self.check_results = {}
         self.events = []
+        # The latest timestamp seen and what's added to the clock to get
+        # past it
+        self._latest = 0
+        self._offset = 0
+        self._by_typ = {}
+        self._by_ref = {}
+        self._by_sender = {}
+        self._by_direction = {}
+        # Events and their timestamps sorted on timestamp
+        self._timestamps = []
+        self._by_time = []
+
+    @staticmethod
+    def _add(index, key, event):
+        try:
+            index[key].append(event)
+        except KeyError:
+            index[key] = [event]
+
+    def _index(self, event):
+        self._add(self._by_typ, event.typ, event)
+        self._add(self._by_ref, event.ref, event)
+        self._add(self._by_sender, event.sender, event)
+        self._add(self._by_direction, event.direction, event)
+        if self.verdict is not None:
+            self.verdict.add(event)
+
+        ts = event.timestamp
+        if not self._timestamps or ts >= self._timestamps[-1]:
+            self._timestamps.append(ts)
+            self._by_time.append(event)
+        else:
+            i = bisect.bisect_right(self._timestamps, ts)
+            self._timestamps.insert(i, ts)
+            self._by_time.insert(i, event)
+
+    def _reindex(self):
+        # Made again when it's needed
+        self.verdict = None
+        self._by_typ = {}
+        self._by_ref = {}
+        self._by_sender = {}
+        self._by_direction = {}
+        self._timestamps = []
+        self._by_time = []
+        for event in self.events:
+            self._index(event)
 
     def store(self, typ, data, ref='', sub='', sender='', direction=0,
               **kwargs):
-        index = time.time()
+        """
+        Store an event.
+
+        :return: The timestamp of the event, can be used with by_index
+        """
+        index = self.now()
 
         typ = typ.lower()
         if typ == EV_HTTP_RESPONSE:  # only store part of the instance
             data = HTTPResponse(data)
 
-        self.events.append(
-            Event(int(index), typ, data, ref, sub, sender, direction, **kwargs))
+        self.append(
+            Event(index, typ, data, ref, sub, sender, direction, **kwargs))
         return index
 
+    def now(self):
+        """
+        The clock, see otest.events.now, moved forward if needed so that
+        it's later than all events there are. Once moved it keeps running
+        at the normal pace so the time between events is still right. Only
+        this instance is affected.
+
+        :return: Time in nanoseconds as an integer
+        """
+        tick = now() + self._offset
+        if tick <= self._latest:
+            self._offset += self._latest - tick + 1
+            tick = self._latest + 1
+        return tick
+
+    def snapshot(self):
+        """
+        A copy of the store as it is now that isn't affected by events stored
+        later on. The events themselves are shared, not copied. The copy
+        has no journal and no verdict.
+
+        :return: An Events instance
+        """
+        _copy = Events()
+        _copy.version = self.version
+        _copy.events = self.events[:]
+        _copy._latest = self._latest
+        _copy._offset = self._offset
+        for attr in ['_by_typ', '_by_ref', '_by_sender', '_by_direction']:
+            setattr(_copy, attr, dict(
+                (key, val[:]) for key, val in getattr(self, attr).items()))
+        _copy._timestamps = self._timestamps[:]
+        _copy._by_time = self._by_time[:]
+        return _copy
+
     def by_index(self, index):
-        l = [e for e in self.events if e.timestamp == index]
-        if l:
-            return l[0]
+        i = bisect.bisect_left(self._timestamps, index)
+        if i < len(self._timestamps) and self._timestamps[i] == index:
+            return self._by_time[i]
         else:
             raise KeyError(index)
 
+    def between(self, start, end=None):
+        """
+        Events that happened in a time interval.
+
+        :param start: Start of interval, inclusive
+        :param end: End of interval, exclusive. If not given everything
+            from start and onwards.
+        :return: List of events sorted on timestamp
+        """
+        i = bisect.bisect_left(self._timestamps, start)
+        if end is None:
+            return self._by_time[i:]
+        j = bisect.bisect_left(self._timestamps, end)
+        return self._by_time[i:j]
+
     def by_ref(self, ref):
         try:
             lr = ref.lower()
         except AttributeError:
             lr = ref
-        return [e for e in self.events if e.ref == lr]
+        return self._by_ref.get(lr, [])[:]
 
     def by_direction(self, direction):
-        return [e for e in self.events if e.direction == direction]
+        return self._by_direction.get(direction, [])[:]
+
+    def by_sender(self, sender):
+        return self._by_sender.get(sender, [])[:]
 
     def get(self, typ):
-        ltyp = typ.lower()
-        return [ev for ev in self.events if ev.typ == ltyp]
+        return self._by_typ.get(typ.lower(), [])[:]
 
     def get_data(self, typ, sender=''):
+        _evs = self._by_typ.get(typ.lower(), [])
         if sender:
-            return [d.data for d in self.get(typ) if d.sender == sender]
+            return [d.data for d in _evs if d.sender == sender]
         else:
-            return [d.data for d in self.get(typ)]
+            return [d.data for d in _evs]
 
     def get_messages(self, typ, msg_cls):
         res = []
-        for m in self.get(typ):
+        for m in self._by_typ.get(typ.lower(), []):
             if m.data.__class__ == msg_cls:
                 res.append(m.data)
         # return [m.data for m in self.get(typ) if isinstance(m.data, msg_cls)]
         return res
 
     def last(self, typ):
-        res = self.get(typ)
-        if len(res):
-            return res[-1]
-        else:
+        try:
+            return self._by_typ[typ.lower()][-1]
+        except (KeyError, IndexError):
             return None
 
     def get_message(self, typ, msg_cls):
-        l = self.get_messages(typ, msg_cls)
-        if l:
-            return l[-1]
+        for m in reversed(self._by_typ.get(typ.lower(), [])):
+            if m.data.__class__ == msg_cls:
+                return m.data
 
         raise NoSuchEvent('{}:{}'.format(typ, msg_cls))
 
     def last_item(self, typ):
-        l = self.get_data(typ)
-        if l:
-            return l[-1]
+        ev = self.last(typ)
+        if ev is not None:
+            return ev.data
 
         raise NoSuchEvent(typ)
 
@@ -243,6 +535,13 @@ class Events(object):
     def append(self, event):
         assert isinstance(event, Event)
         self.events.append(event)
+        if event.timestamp > self._latest:
+            self._latest = event.timestamp
+        self._index(event)
+        if event.typ not in VERIFICATION_EVENTS:
+            self.version += 1
+        if self.journal is not None:
+            self.journal.write(event)
 
     def extend(self, events):
         for event in events:
@@ -252,9 +551,7 @@ class Events(object):
         return self.events.__iter__()
 
     def last_of(self, types):
-        l = self.events[:]
-        l.reverse()
-        for ev in l:
+        for ev in reversed(self.events):
             if ev.typ in types:
                 return ev.data
 
@@ -262,47 +559,43 @@ class Events(object):
 
     def __contains__(self, event):
         ts = event.timestamp
-        for ev in self.events:
-            if event.timestamp == ev.timestamp:
-                if event == ev:
-                    return True
+        i = bisect.bisect_left(self._timestamps, ts)
+        while i < len(self._timestamps) and self._timestamps[i] == ts:
+            if event == self._by_time[i]:
+                return True
+            i += 1
 
         return False
 
     def sort(self):
         self.events.sort(key=lambda event: event.timestamp)
+        self._reindex()
 
     def to_html(self, form='table'):
-        if form == 'list':
-            text = ['<ul>']
-            for ev in self.events:
-                text.append('<li> {}'.format(ev))
-            text.append('</ul>')
-        else:
-            text = ['<table border=1 width="600">']
-            for ev in self.events:
-                if isinstance(ev.data, Message):
-                    _data = json.dumps(ev.data.to_dict(), sort_keys=True,
-                                       indent=4, separators=(',', ': '))
-                else:
-                    _data = ev.data
-                text.append(
-                    '<tr><td>{time}</td><td>{typ}</td>'
-                    '<td>{data}}</td></tr>'.format(
-                        time=ev.timestamp, typ=ev.typ, data=_data))
-            text.append('</table>')
-
-        return '\n'.join(text)
+        return '\n'.join(EventPage(self, 0, None).html(form))
+
+    def page(self, number, size=PAGE_SIZE):
+        """
+        :param number: Page number, the first page is 0
+        :param size: Number of events per page
+        :return: An EventPage instance
+        """
+        return EventPage(self, number * size, size)
 
     def __str__(self):
         return '\n'.join(['{}'.format(ev) for ev in self.events])
 
     def reset(self):
         self.events = []
+        if self.journal is not None:
+            self.journal.reset()
+        self.version += 1
+        self.check_results = {}
+        self._reindex()
 
     def when(self, typ, msg):
         res = []
-        for m in self.get(typ):
+        for m in self._by_typ.get(typ.lower(), []):
             if m.data.__class__ == msg:
                 res.append(m.timestamp)
 
@@ -313,7 +606,7 @@ class Events(object):
 
     def timeline(self):
         start = self.events[0].timestamp
-        return [(ev.timestamp - start, ev.typ, ev.data) for ev in self.events]
+        return [(elapsed(start, ev), ev.typ, ev.data) for ev in self.events]
 
     def digest(self):
         res = []
@@ -353,10 +646,20 @@ def exception_to_str(event):
     return res
 
 
+def _message_json(event):
+    return json.dumps(event.data.to_dict(), sort_keys=True, indent=4,
+                      separators=(',', ': '))
+
+
+def message_json(event):
+    """
+    The message of the event as indented JSON.
+    """
+    return event.render('json', _message_json)
+
+
 def message_to_str(event):
-    return [event.data.__class__.__name__,
-            json.dumps(event.data.to_dict(), sort_keys=True, indent=4,
-                       separators=(',', ': '))]
+    return [event.data.__class__.__name__, message_json(event)]
 
 
 TO_STR = {
@@ -368,8 +671,8 @@ TO_STR = {
 }
 
 
-def layout(start, event):
-    elem = ['{}'.format(round(event.timestamp - start, 3))]
+def _layout(event):
+    elem = []
     if event.direction:
         if event.direction == OUTGOING:
             elem.append('-->')
@@ -388,24 +691,148 @@ def layout(start, event):
     return ' '.join(elem)
 
 
-def row(start, event):
-    if event.typ == EV_OPERATION:
-        _row = ['<tr class="info"><td>{}</td>'.format(
-            round(event.timestamp - start, 3))]
-    else:
-        _row = ['<tr><td>{}</td>'.format(
-            round(event.timestamp - start, 3))]
+def layout(start, event):
+    return '{:.6f} {}'.format(elapsed(start, event),
+                              event.render('text', _layout))
+
 
+def _row(event):
     try:
         p = TO_STR[event.typ](event)
-        _row.append(
-            '<td>{}</td><td><pre><code>{}</pre></code></td>'.format(
-                p[0],' '.join(p[1:])))
+        _row = ['<td>{}</td><td><pre><code>{}</pre></code></td>'.format(
+            p[0], ' '.join(p[1:]))]
     except KeyError:
-        _row.append('<td style="max-width: 500px; word-wrap: break-word;">{}</td>'.format(event.typ))
+        _row = ['<td style="max-width: 500px; word-wrap: break-word;">{}</td>'.format(event.typ)]
         if isinstance(event.data, Base):
             _row.append('<td style="max-width: 500px; word-wrap: break-word;">{}</td>'.format(event.data.to_str()))
         else:
             _row.append('<td style="max-width: 500px; word-wrap: break-word;">{}</td>'.format(str(event.data)))
     _row.append("</tr>")
-    return "".join(_row)
\ No newline at end of file
+    return "".join(_row)
+
+
+def row(start, event):
+    if event.typ == EV_OPERATION:
+        _start = '<tr class="info"><td>{:.6f}</td>'
+    else:
+        _start = '<tr><td>{:.6f}</td>'
+
+    return _start.format(elapsed(start, event)) + event.render('row', _row)
+
+
+def _json_data(event):
+    _data = event.data
+    if isinstance(_data, Message):
+        return _data.to_dict()
+    elif isinstance(_data, Base):
+        return _data.gather_args()
+    return _data
+
+
+def _json_item(event):
+    return json.dumps({'timestamp': event.timestamp, 'typ': event.typ,
+                       'data': _json_data(event)},
+                      sort_keys=True, default=str)
+
+
+def _html_row(event):
+    if isinstance(event.data, Message):
+        _data = message_json(event)
+    else:
+        _data = '{}'.format(event.data)
+    return '<tr><td>{time}</td><td>{typ}</td><td>{data}</td></tr>'.format(
+        time=event.timestamp, typ=html.escape(event.typ),
+        data=html.escape(_data))
+
+
+def _html_item(event):
+    return '<li> {}'.format(html.escape('{}'.format(event)))
+
+
+class EventPage(object):
+    """
+    A part of the events in an Events instance, offset events in and at
+    most limit events long. The events are rendered one at the time as
+    they are sent and only the ones on the page are rendered at all.
+    Rendered (and escaped) events are kept with the event, see Event.render.
+    """
+
+    def __init__(self, events, offset=0, limit=PAGE_SIZE):
+        """
+        :param events: An Events instance
+        :param offset: Index of the first event on the page
+        :param limit: Max number of events on the page, None means all
+            from offset and onwards
+        """
+        self.events = events
+        self.offset = max(offset, 0)
+        self.limit = limit
+
+    @property
+    def total(self):
+        return len(self.events)
+
+    @property
+    def number(self):
+        """The page number if all pages are limit long"""
+        if not self.limit:
+            return 0
+        return self.offset // self.limit
+
+    @property
+    def pages(self):
+        """Number of pages of this size"""
+        if not self.limit:
+            return 1
+        return max((self.total + self.limit - 1) // self.limit, 1)
+
+    def has_next(self):
+        return self.limit is not None and \
+            self.offset + self.limit < self.total
+
+    def has_previous(self):
+        return self.offset > 0
+
+    def _end(self):
+        if self.limit is None:
+            return self.total
+        return min(self.offset + self.limit, self.total)
+
+    def __iter__(self):
+        _events = self.events.events
+        for i in range(self.offset, self._end()):
+            yield _events[i]
+
+    def __len__(self):
+        return max(self._end() - self.offset, 0)
+
+    def html(self, form='table'):
+        """
+        :param form: 'table' or 'list'
+        :return: generator of HTML lines
+        """
+        if form == 'list':
+            yield '<ul>'
+            for event in self:
+                yield event.render('html_item', _html_item)
+            yield '</ul>'
+        else:
+            yield '<table border=1 width="600">'
+            for event in self:
+                yield event.render('html_row', _html_row)
+            yield '</table>'
+
+    def json(self):
+        """
+        The page as a JSON object with the keys offset, limit, total and
+        events.
+
+        :return: generator of pieces of JSON text
+        """
+        yield '{{"offset": {}, "limit": {}, "total": {}, "events": ['.format(
+            self.offset, json.dumps(self.limit), self.total)
+        sep = ''
+        for event in self:
+            yield sep + event.render('json_item', _json_item)
+            sep = ',\n'
+        yield ']}'
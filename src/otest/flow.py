@@ -1,18 +1,23 @@
+import copy
 import json
 import os
 import re
+import threading
+import time
 
 import logging
 from six import text_type
 
 from otest import Done
 from otest import Unknown
+from otest.bundle import open_bundle
 from otest.func import factory as ofactory
-from otest.summation import completed
-from otest.summation import eval_state
 from otest.summation import represent_result
+from otest.summation import verdict
 
 from otest.prof_util import from_profile
+from otest.registry import FUNCTIONS
+from otest.registry import OPERATIONS
 
 logger = logging.getLogger(__name__)
 
@@ -69,30 +74,219 @@ def replace_with_link(txt, links):
     return txt
 
 
+class SpecCache(object):
+    """
+    In-process cache of parsed flow descriptions.
+
+    A cached description is used as long as the file's modification time
+    and size are unchanged. If poll_interval is set the file is only
+    stat:ed again when that many seconds has passed since the last check.
+    """
+
+    def __init__(self, poll_interval=0):
+        self.poll_interval = poll_interval
+        # path -> ((mtime, size), content, time of last check)
+        self._files = {}
+        self._lock = threading.Lock()
+        # Bumped every time something in the cache changes
+        self.version = 0
+
+    def _lookup(self, path, loader):
+        now = time.time()
+        try:
+            key, content, checked = self._files[path]
+        except KeyError:
+            key = content = None
+        else:
+            if self.poll_interval and now - checked < self.poll_interval:
+                return content
+
+        st = os.stat(path)
+        _key = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            if _key != key:
+                content = loader(path)
+                self.version += 1
+            self._files[path] = (_key, content, now)
+        return content
+
+    @staticmethod
+    def _load_json(path):
+        with open(path, 'r') as fp:
+            return json.load(fp)
+
+    def get(self, path):
+        """
+        Get the parsed content of a flow description file.
+
+        :param path: Path to the file
+        :return: The parsed content. Must not be modified by the caller.
+        """
+        return self._lookup(path, self._load_json)
+
+    def listdir(self, path):
+        """
+        List a directory, the result is cached as long as the directory
+        is unchanged.
+        """
+        return self._lookup(path, os.listdir)
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is None:
+                self._files = {}
+            else:
+                self._files.pop(path, None)
+            self.version += 1
+
+
+SPEC_CACHE = SpecCache()
+
+# Least number of seconds between checks of whether the flow description
+# files have changed, see Flow.profile_index
+INDEX_POLL_INTERVAL = 2
+
+
+class FlowSpec(dict):
+    """
+    Copy-on-write view of a cached flow description. It's a dict and can be
+    used as one.
+
+    Mutable values (lists and dictionaries) are copied the first time they
+    are accessed, so the caller can change them without affecting the
+    cached original. Only json.dumps() reads the values without going
+    through __getitem__, which is fine since it doesn't change them.
+    """
+
+    def __init__(self, base):
+        dict.__init__(self, base)
+        # Keys whose values are the caller's own
+        self._own = set()
+
+    def __getitem__(self, key):
+        val = dict.__getitem__(self, key)
+        if key not in self._own:
+            self._own.add(key)
+            if isinstance(val, (dict, list)):
+                val = copy.deepcopy(val)
+                dict.__setitem__(self, key, val)
+        return val
+
+    def __setitem__(self, key, value):
+        self._own.add(key)
+        dict.__setitem__(self, key, value)
+
+    def __iter__(self):
+        return iter(list(dict.keys(self)))
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def setdefault(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            self[key] = default
+            return default
+
+    def pop(self, key, *default):
+        try:
+            val = self[key]
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+        del self[key]
+        return val
+
+    def popitem(self):
+        key = next(iter(self))
+        return key, self.pop(key)
+
+    def values(self):
+        return [self[key] for key in self]
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def copy(self):
+        return self.to_dict()
+
+    def to_dict(self):
+        """
+        :return: A plain dictionary that shares nothing with the cache
+        """
+        return dict((key, self[key]) for key in self)
+
+    def __reduce_ex__(self, protocol):
+        return dict, (self.to_dict(),)
+
+
 class Flow(object):
-    def __init__(self, fdir, profile_handler):
+    # See profile_index
+    index_poll_interval = INDEX_POLL_INTERVAL
+
+    def __init__(self, fdir, profile_handler, spec_cache=None):
         self.fdir = fdir
         self.profile_handler = profile_handler
+        self.spec_cache = spec_cache or SPEC_CACHE
+        self._bundle = None
+        self._bundle_checked = False
+        self._index = None
+        self._index_version = None
+        self._index_checked = 0
+
+    @property
+    def bundle(self):
+        """
+        A precompiled flow bundle (otest.bundle) if there is one for the
+        flow directory, otherwise None. Looked for on first use.
+        Descriptions in it are only used as long as the files they were
+        made from are unchanged.
+        """
+        if not self._bundle_checked:
+            self._bundle_checked = True
+            self._bundle = open_bundle(self.fdir)
+        return self._bundle
 
-    def __getitem__(self, tid):
+    @property
+    def _bundle_only(self):
         """
-        Get the flow description given a test ID
+        Whether fdir is a bundle rather than a flow directory.
+        """
+        return self.bundle is not None and self.bundle.fdir is None
 
-        :param tid: The test ID
-        :return: A dictionary representation of the description
+    def _spec(self, tid):
+        """
+        Get the shared, cached, flow description. Must not be modified.
         """
+        _bundle = self.bundle
+        if _bundle and _bundle.is_current(tid):
+            return _bundle.get(tid)
 
         fname = os.path.join(self.fdir, tid + '.json')
-        fp = open(fname, 'r')
         try:
-            _info = json.load(fp)
-        except Exception as err:
+            return self.spec_cache.get(fname)
+        except ValueError as err:
             logger.error(err)
             raise KeyError(tid)
-        finally:
-            fp.close()
 
-        return _info
+    def __getitem__(self, tid):
+        """
+        Get the flow description given a test ID
+
+        :param tid: The test ID
+        :return: A dictionary like representation of the description
+        """
+
+        return FlowSpec(self._spec(tid))
+
+    def _items(self):
+        for sfn in self.keys():
+            yield sfn, self._spec(sfn)
 
     def items(self):
         """
@@ -102,20 +296,62 @@ class Flow(object):
 
         :return:
         """
-        for fn in os.listdir(self.fdir):
-            if fn.endswith('.json'):
-                sfn = fn[:-5]
-                yield ((sfn, self[sfn]))
+        for sfn in self.keys():
+            yield ((sfn, self[sfn]))
 
     def keys(self):
         """
         Return all Test IDs
         :return: list of test IDs
         """
-        for fn in os.listdir(self.fdir):
+        if self._bundle_only:
+            for tid in self.bundle.keys():
+                yield tid
+            return
+
+        for fn in self.spec_cache.listdir(self.fdir):
             if fn.endswith('.json'):
                 yield (fn[:-5])
 
+    def _sources(self):
+        """
+        The test IDs together with the modification time and size of
+        their flow description files.
+        """
+        res = []
+        for tid in self.keys():
+            try:
+                st = os.stat(os.path.join(self.fdir, tid + '.json'))
+            except OSError:
+                continue
+            res.append((tid, st.st_mtime_ns, st.st_size))
+        return tuple(res)
+
+    @property
+    def profile_index(self):
+        """
+        The ProfileIndex for the flow descriptions. Rebuilt if a flow
+        description file has been added, removed or changed since it was
+        built. The files are only stat:ed again when index_poll_interval,
+        or the SpecCache's poll_interval if that is longer, seconds has
+        passed since the last check. In between a lookup is only a lookup
+        in the index.
+        """
+        if self._index is not None:
+            if self._bundle_only:
+                return self._index
+            _poll = max(self.index_poll_interval,
+                        self.spec_cache.poll_interval)
+            if _poll and time.time() - self._index_checked < _poll:
+                return self._index
+
+        self._index_checked = time.time()
+        _version = None if self._bundle_only else self._sources()
+        if self._index is None or _version != self._index_version:
+            self._index = ProfileIndex(self._items())
+            self._index_version = _version
+        return self._index
+
     def pick(self, key, value):
         """
         Pick a number of test descriptions base on a key,value pair.
@@ -124,16 +360,7 @@ class Flow(object):
         :param value:
         :return:
         """
-        tids = []
-        for tid, spec in self.items():
-            try:
-                _val = spec[key]
-            except KeyError:
-                pass
-            else:
-                if value == _val:
-                    tids.append(tid)
-        return tids
+        return self.profile_index.pick(key, value)
 
     def matches_profile(self, profile):
         """
@@ -141,18 +368,17 @@ class Flow(object):
         :param profile:
         :return:
         """
-
-        _tids = []
-        _use = from_profile(profile)
-        for tid, spec in self.items():
-            if match_usage(spec, **_use):
-                _tids.append(tid)
-        return _tids
+        return self.profile_index.matches_profile(profile)
 
     def mandatory_to_implement(self, tid, profile):
+        try:
+            return self.profile_index.mandatory_to_implement(tid, profile)
+        except KeyError:
+            pass
+
         _use = from_profile(profile)
         _use['return_type'] = _use['return_type'][0]
-        spec = self[tid]
+        spec = self._spec(tid)
         try:
             _mti = spec["MTI"]
         except KeyError:
@@ -174,6 +400,8 @@ class Flow(object):
         return {}
 
     def __contains__(self, item):
+        if self._bundle_only:
+            return item in self.bundle
         fname = os.path.join(self.fdir, item + '.json')
         return os.path.isfile(fname)
 
@@ -221,11 +449,71 @@ def _get_func(dic, func_factory):
 
 class RPFlow(Flow):
     def __init__(self, fdir, profile_handler, cls_factories, func_factory,
-                 use=''):
-        Flow.__init__(self, fdir, profile_handler)
+                 use='', spec_cache=None):
+        Flow.__init__(self, fdir, profile_handler, spec_cache=spec_cache)
         self.cls_factories = cls_factories
         self.func_factory = func_factory
         self.use = use
+        self._resolved = {}
+        self._resolved_version = None
+
+    def _memo(self):
+        """
+        Resolved classes and functions, forgotten if anything has been
+        registered or invalidated in the registries since.
+        """
+        _version = (OPERATIONS.version, FUNCTIONS.version)
+        if _version != self._resolved_version:
+            self._resolved = {'cls': {}, 'func': {}}
+            self._resolved_version = _version
+        return self._resolved
+
+    def _resolve_cls(self, name):
+        """
+        Use the bundle's precomputed name table if there is one that
+        matches, otherwise ask the class factories.
+        """
+        _memo = self._memo()['cls']
+        try:
+            return _memo[name]
+        except KeyError:
+            pass
+
+        cls = None
+        _bundle = self.bundle
+        if _bundle and _bundle.use == self.use:
+            try:
+                cls = _bundle.resolve_class(name)
+            except (KeyError, ImportError, AttributeError):
+                pass
+        if cls is None:
+            cls = _get_cls(name, self.cls_factories, self.use)
+
+        _memo[name] = cls
+        return cls
+
+    def _resolve_func(self, fname):
+        _memo = self._memo()['func']
+        try:
+            return _memo[fname]
+        except KeyError:
+            pass
+
+        func = None
+        if self.bundle:
+            try:
+                func = self.bundle.resolve_func(fname)
+            except (KeyError, ImportError, AttributeError):
+                pass
+        if func is None:
+            func = list(_get_func({fname: None}, self.func_factory))[0]
+
+        _memo[fname] = func
+        return func
+
+    def _resolve_funcs(self, dic):
+        return dict([(self._resolve_func(fname), val)
+                     for fname, val in dic.items()])
 
     def expanded_conf(self, tid):
         """
@@ -241,14 +529,14 @@ class RPFlow(Flow):
                     raise SyntaxError(tid)
                 key, val = list(oper.items())[0]
                 try:
-                    seq.append((_get_cls(key, self.cls_factories, self.use),
-                                _get_func(val, self.func_factory)))
+                    seq.append((self._resolve_cls(key),
+                                self._resolve_funcs(val)))
                 except Exception:
                     print('tid:{}'.format(tid))
                     raise
             else:
                 try:
-                    seq.append(_get_cls(oper, self.cls_factories, self.use))
+                    seq.append(self._resolve_cls(oper))
                 except Exception:
                     print('tid:{}'.format(tid))
                     raise
@@ -287,6 +575,163 @@ def match_usage(spec, **kwargs):
     return True
 
 
+class ProfileIndex(object):
+    """
+    Bitset index over a set of flow descriptions. Bit n in a mask
+    represents the n:th test ID in tids.
+
+    For every key that appears in some description's 'usage' there is a
+    mask of the descriptions that restrict it and, per allowed value, a
+    mask of the descriptions that accept that value. Matching a profile
+    is then one AND per usage key.
+    """
+
+    def __init__(self, items):
+        self.tids = []
+        self._pos = {}
+        self._specs = []
+        self._all = 0
+        # usage key -> mask of descriptions that restrict that key
+        self._restricts = {}
+        # usage key -> {allowed value: mask}
+        self._allowed = {}
+        # usage key -> {True/False: mask}, for boolean usage values
+        self._bools = {}
+        # descriptions with usage values that can't be indexed
+        self._irregular = 0
+        # MTI value -> mask of descriptions
+        self._mti = {}
+        # key -> ({value: mask}, [(unhashable value, mask)]), built on demand
+        self._fields = {}
+        self._profiles = {}
+
+        for tid, spec in items:
+            self._add(tid, spec)
+
+    def _add(self, tid, spec):
+        bit = 1 << len(self.tids)
+        self._pos[tid] = bit
+        self.tids.append(tid)
+        self._specs.append(spec)
+        self._all |= bit
+
+        for key, allowed in spec.get('usage', {}).items():
+            self._restricts[key] = self._restricts.get(key, 0) | bit
+            if isinstance(allowed, bool):
+                _masks = self._bools.setdefault(key, {})
+                _masks[allowed] = _masks.get(allowed, 0) | bit
+            elif isinstance(allowed, (list, tuple)):
+                _masks = self._allowed.setdefault(key, {})
+                for val in allowed:
+                    try:
+                        _masks[val] = _masks.get(val, 0) | bit
+                    except TypeError:
+                        self._irregular |= bit
+            else:
+                self._irregular |= bit
+
+        _mti = spec.get('MTI', [])
+        if 'DYN' in _mti and 'CNF' in _mti:
+            for typ in _mti:
+                try:
+                    self._mti[typ] = self._mti.get(typ, 0) | bit
+                except TypeError:
+                    pass
+
+    def _tids(self, mask):
+        return [tid for n, tid in enumerate(self.tids) if mask >> n & 1]
+
+    def _accepts(self, key, val):
+        """
+        Mask of the descriptions that accept val as value for key.
+        """
+        _mask = self._all & ~self._restricts[key]
+        if val is None:
+            return _mask
+
+        if key == 'return_type' and not isinstance(val, text_type):
+            val = val[0]
+
+        if isinstance(val, bool):
+            _mask |= self._bools.get(key, {}).get(val, 0)
+
+        try:
+            _mask |= self._allowed.get(key, {}).get(val, 0)
+        except TypeError:
+            # unhashable value, leave it to match_usage
+            _mask |= self._restricts[key]
+        return _mask
+
+    def matches_profile(self, profile):
+        try:
+            return list(self._profiles[profile])
+        except KeyError:
+            pass
+
+        _use = from_profile(profile)
+        mask = self._all
+        for key in self._restricts:
+            mask &= self._accepts(key, _use.get(key))
+
+        # The ones the index can't tell about
+        _check = self._irregular
+        for key in self._restricts:
+            try:
+                hash(_use.get(key))
+            except TypeError:
+                _check |= self._restricts[key]
+        if _check:
+            mask &= ~_check
+            for n, spec in enumerate(self._specs):
+                if _check >> n & 1 and match_usage(spec, **_use):
+                    mask |= 1 << n
+
+        self._profiles[profile] = self._tids(mask)
+        return list(self._profiles[profile])
+
+    def _field(self, key):
+        try:
+            return self._fields[key]
+        except KeyError:
+            pass
+
+        _masks = {}
+        _other = []
+        for n, spec in enumerate(self._specs):
+            try:
+                val = spec[key]
+            except KeyError:
+                continue
+            try:
+                _masks[val] = _masks.get(val, 0) | 1 << n
+            except TypeError:
+                _other.append((val, 1 << n))
+
+        self._fields[key] = (_masks, _other)
+        return self._fields[key]
+
+    def pick(self, key, value):
+        _masks, _other = self._field(key)
+        try:
+            mask = _masks.get(value, 0)
+        except TypeError:
+            mask = 0
+        for val, bit in _other:
+            if val == value:
+                mask |= bit
+        return self._tids(mask)
+
+    def mandatory_to_implement(self, tid, profile):
+        """
+        :raise KeyError: if tid isn't in the index
+        """
+        bit = self._pos[tid]
+        _use = from_profile(profile)
+        if not (_use['register'] and _use['discover']):
+            return False
+        return bool(self._mti.get(_use['return_type'][0], 0) & bit)
+
+
 def get_return_type(prof):
     try:
         return prof.split('.')[0]
@@ -318,9 +763,9 @@ def get_category(usage):
 
 class FlowState(RPFlow):
     def __init__(self, fdir, profile_handler, cls_factories, func_factory,
-                 display_order, use=''):
+                 display_order, use='', spec_cache=None):
         RPFlow.__init__(self, fdir, profile_handler, cls_factories,
-                        func_factory, use=use)
+                        func_factory, use=use, spec_cache=spec_cache)
         self.test_info = {}
         self.display_order = display_order
         self.complete = {}
@@ -333,18 +778,19 @@ class FlowState(RPFlow):
         return tinfo
 
     def _test_info(self, test_id, events, index, session):
+        _verdict = verdict(events)
         _info = {
             'test_id': test_id,
             "events": events,
             "index": index,
             "test_output": events.get('condition'),
-            "state": eval_state(events),
-            "complete": completed(events),
+            "state": _verdict.state,
+            "complete": _verdict.complete,
             "result": represent_result(events)
         }
 
         try:
-            _info["descr"] = self[test_id]["desc"]
+            _info["descr"] = self._spec(test_id)["desc"]
         except KeyError:
             _info['descr'] = session['flow']['desc']
 
@@ -364,7 +810,7 @@ class FlowState(RPFlow):
 
         interim = {}
         for tid in tids:
-            _spec = self[tid]
+            _spec = self._spec(tid)
             try:
                 _state = self.test_info[tid]['state']
             except KeyError:
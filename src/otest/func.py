@@ -1,6 +1,4 @@
-import inspect
 import json
-import sys
 
 #from urllib.parse import urlencode
 #from urllib.parse import urlparse
@@ -13,6 +11,7 @@ from otest.check import get_id_tokens
 from otest.check import State
 from otest.events import EV_CONDITION
 from otest.events import EV_RESPONSE
+from otest.registry import FUNCTIONS
 from otest.result import get_issuer
 from otest.tool import get_redirect_uris
 
@@ -250,9 +249,4 @@ def set_info_issuer(oper, args):
 
 
 def factory(name):
-    for fname, obj in inspect.getmembers(sys.modules[__name__]):
-        if inspect.isfunction(obj):
-            if fname == name:
-                return obj
-
-    return None
+    return FUNCTIONS.lookup(__name__, name)
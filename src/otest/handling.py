@@ -13,15 +13,94 @@ __author__ = 'roland'
 
 logger = logging.getLogger(__name__)
 
+# Put in a page where the lines of a trace should go, see stream_into()
+TRACE_MARK = '<!-- otest:trace -->'
+
+
+def stream_into(body, lines, mark=TRACE_MARK):
+    """
+    Sends a rendered page with lines put in where the mark is, one line at
+    the time. This way a large trace doesn't have to be rendered into one
+    string before it's sent. If the page doesn't contain the mark, the
+    lines are never rendered.
+
+    :param body: The page, an iterable of str or bytes
+    :param lines: Iterable of text lines
+    :param mark: Where in the page the lines go
+    :return: generator of whatever body contained
+    """
+    for chunk in body:
+        if isinstance(chunk, bytes):
+            _mark, _nl = mark.encode('utf-8'), b'\n'
+        else:
+            _mark, _nl = mark, '\n'
+
+        try:
+            head, tail = chunk.split(_mark, 1)
+        except ValueError:
+            yield chunk
+            continue
+
+        yield head
+        for line in lines:
+            if isinstance(chunk, bytes):
+                line = line.encode('utf-8')
+            yield line + _nl
+        yield tail
+
+
+def _contains(body, mark):
+    _bmark = mark.encode('utf-8')
+    for chunk in body:
+        if isinstance(chunk, bytes):
+            if _bmark in chunk:
+                return True
+        elif mark in chunk:
+            return True
+    return False
+
+
+def respond_with_trace(resp, environ, start_response, lines, **argv):
+    """
+    Render a page with a trace. The template gets TRACE_MARK as
+    trace_output and the lines are streamed in where it ends up, see
+    stream_into(). Only for templates that put ${trace_output} in the page
+    as it is. If the mark isn't in the rendered page the page is rendered
+    again with the whole trace, the lines joined.
+
+    :param resp: A oic.utils.http_util.Response instance
+    :param lines: Iterable of text lines
+    :param argv: Template arguments
+    :return: The body
+    """
+    argv['trace_output'] = TRACE_MARK
+    body = resp.reply(**argv)
+    if _contains(body, TRACE_MARK):
+        start_response(resp.status, resp.headers)
+        return stream_into(body, lines)
+
+    logger.warning('{} does not contain trace_output as it is'.format(
+        resp.mako_template))
+    argv['trace_output'] = '\n'.join(lines)
+    body = resp.reply(**argv)
+    start_response(resp.status, resp.headers)
+    return body
+
 
 class InfoHandling(object):
     def __init__(self, flow_state, desc=None, profile_handler=None,
-                 cache=None, session=None, **kwargs):
+                 cache=None, session=None, stream_trace=False, **kwargs):
+        """
+        :param stream_trace: Whether the test info template puts
+            ${trace_output} in the page, so the trace can be streamed into
+            it, see respond_with_trace
+        """
         self.flow_state = flow_state
         self.cache = cache
         self.profile_handler = profile_handler
         self.desc = desc
         self.session = session
+        self.stream_trace = stream_trace
 
     @property
     def profile(self):
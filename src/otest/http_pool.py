@@ -0,0 +1,216 @@
+"""
+    Pooled HTTP connections
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Keep-alive connection pools that are shared between conversations, so
+    running many tests against the same OP doesn't mean a new TCP
+    connection and TLS handshake per request.
+
+    Pools are keyed on (scheme, host, port, verify, client cert). Every
+    client has its own requests.Session, so cookies are never shared
+    between conversations, but all sessions use the same pooled adapters.
+
+    :copyright: (c) 2016 by Roland Hedberg.
+    :license: APACHE 2.0, see LICENSE for more details.
+"""
+import copy
+import logging
+import threading
+
+import requests
+from future.backports.urllib.parse import urlparse
+from oic.oauth2.exception import NonFatalException
+from oic.oauth2.util import set_cookie
+from oic.utils.sanitize import sanitize
+from requests.adapters import HTTPAdapter
+from six.moves.http_cookies import CookieError
+from six.moves.http_cookies import SimpleCookie
+
+from otest.events import EV_HTTP_POOL
+
+__author__ = 'roland'
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = {'http': 80, 'https': 443}
+
+
+def _stats():
+    return {'requests': 0, 'hits': 0, 'new_connections': 0,
+            'tls_handshakes': 0}
+
+
+class HTTPPool(object):
+    def __init__(self, maxsize=10):
+        """
+        :param maxsize: Max number of connections to keep per pool
+        """
+        self.maxsize = maxsize
+        # pool key -> HTTPAdapter
+        self._adapters = {}
+        # pool key -> statistics
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(url, verify=True, cert=None):
+        """
+        The key of the pool a request should use.
+
+        :param url: Request URL
+        :param verify: TLS server certificate verification, as in requests
+        :param cert: TLS client certificate, as in requests
+        :return: (scheme, host, port, verify, cert) tuple
+        """
+        _url = urlparse(url)
+        _scheme = _url.scheme.lower()
+        if isinstance(cert, list):
+            cert = tuple(cert)
+        return (_scheme, _url.hostname,
+                _url.port or DEFAULT_PORT.get(_scheme), verify, cert)
+
+    def adapter(self, key):
+        try:
+            return self._adapters[key]
+        except KeyError:
+            with self._lock:
+                if key not in self._adapters:
+                    self._adapters[key] = HTTPAdapter(
+                        pool_connections=1, pool_maxsize=self.maxsize)
+                    self._stats.setdefault(key, _stats())
+                return self._adapters[key]
+
+    @staticmethod
+    def session(client):
+        """
+        The client's own session, created on first use.
+        """
+        if client.http_session is None:
+            client.http_session = requests.Session()
+        return client.http_session
+
+    def request(self, session, method, url, **kwargs):
+        """
+        Send a request through the pool.
+
+        :param session: A requests.Session instance
+        :param method: HTTP method
+        :param url: Request URL
+        :param kwargs: Extra arguments to requests
+        :return: (response, pool information) tuple
+        """
+        key = self.key(url, kwargs.get('verify', True), kwargs.get('cert'))
+        adapter = self.adapter(key)
+        _scheme, _host, _port = key[:3]
+        session.mount('{}://{}/'.format(_scheme, urlparse(url).netloc),
+                      adapter)
+
+        try:
+            _pool = adapter.poolmanager.connection_from_url(url)
+        except Exception:
+            _pool = None
+        _before = _pool.num_connections if _pool is not None else 0
+
+        try:
+            r = session.request(method, url, **kwargs)
+        finally:
+            # Cookies are handled by the client, don't let the session
+            # keep any
+            session.cookies.clear()
+
+        # If requests to the same pool overlap this may be attributed to the
+        # wrong request, the totals are still correct.
+        _new = (_pool.num_connections - _before) if _pool is not None else 0
+        _new = max(_new, 0)
+        info = {
+            'pool': '{}://{}:{}'.format(_scheme, _host, _port),
+            'reused': _new == 0,
+            'new_connections': _new,
+            'tls_handshakes': _new if _scheme == 'https' else 0
+        }
+
+        with self._lock:
+            _stat = self._stats[key]
+            _stat['requests'] += 1
+            if info['reused']:
+                _stat['hits'] += 1
+            _stat['new_connections'] += info['new_connections']
+            _stat['tls_handshakes'] += info['tls_handshakes']
+
+        return r, info
+
+    def client_request(self, client, url, method="GET", **kwargs):
+        """
+        Does what oic's PBase.http_request does but through the pool. Cookies
+        are taken from and stored in the client's cookie jar.
+
+        :param client: OicClient/ExtClient instance
+        :param url: Request URL
+        :param method: HTTP method
+        :return: requests.Response instance
+        """
+        _kwargs = copy.copy(client.request_args)
+        if kwargs:
+            _kwargs.update(kwargs)
+
+        if client.cookiejar:
+            _kwargs["cookies"] = client._cookies()
+            logger.debug("SENT {} COOKIES".format(len(_kwargs["cookies"])))
+
+        if client.req_callback is not None:
+            _kwargs = client.req_callback(method, url, **_kwargs)
+
+        try:
+            r, info = self.request(self.session(client), method, url,
+                                   **_kwargs)
+        except Exception as err:
+            logger.error(
+                "http_request failed: %s, url: %s, htargs: %s, method: %s" % (
+                    err, url, sanitize(_kwargs), method))
+            raise
+
+        if client.events is not None:
+            client.events.store(EV_HTTP_POOL, info, ref=url)
+            client.events.store('HTTP response', r, ref=url)
+
+        try:
+            _cookie = r.headers["set-cookie"]
+            logger.debug("RECEIVED COOKIE")
+            try:
+                set_cookie(client.cookiejar, SimpleCookie(_cookie))
+            except CookieError as err:
+                logger.error(err)
+                raise NonFatalException(r, "{}".format(err))
+        except (AttributeError, KeyError):
+            pass
+
+        return r
+
+    def stats(self):
+        """
+        Pool statistics.
+
+        :return: Dictionary with pool key as key and a dictionary with the
+            number of requests, hits (requests on a reused connection), new
+            connections and TLS handshakes as value. Totals are under the
+            key 'total'.
+        """
+        res = {}
+        total = _stats()
+        with self._lock:
+            for key, _stat in self._stats.items():
+                res[key] = dict(_stat)
+                for attr, val in _stat.items():
+                    total[attr] += val
+        res['total'] = total
+        return res
+
+    def close(self):
+        with self._lock:
+            for adapter in self._adapters.values():
+                adapter.close()
+            self._adapters = {}
+
+
+# The pool shared by all clients made by aus.client.Factory
+HTTP_POOL = HTTPPool()
@@ -0,0 +1,214 @@
+"""
+    Append-only on-disk journal of events
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Every event stored in an Events instance that has a journal attached is
+    appended to a per-test file as soon as it is stored, so a crash does not
+    lose the trace.
+
+    Each record is one line: the length of the JSON document, a colon, the
+    JSON document and a newline. A record whose length doesn't match (a
+    partial write) marks the end of the journal.
+
+    :copyright: (c) 2016 by Roland Hedberg.
+    :license: APACHE 2.0, see LICENSE for more details.
+"""
+import importlib
+import json
+import logging
+import os
+from types import SimpleNamespace
+
+from oic.oauth2.message import Message
+
+from otest.check import State
+from otest.events import Base
+from otest.events import Event
+from otest.events import Events
+from otest.events import HTTPResponse
+
+__author__ = 'roland'
+
+logger = logging.getLogger(__name__)
+
+# fsync policies
+FSYNC_ALWAYS = 'always'  # flush and fsync after every event
+FSYNC_BATCH = 'batch'  # flush and fsync after every batch_size events
+FSYNC_NONE = 'none'  # leave it to the OS, flushed when closed
+
+JOURNAL_EXT = 'jnl'
+
+
+def _class_name(cls):
+    return '{}.{}'.format(cls.__module__, cls.__name__)
+
+
+def encode_data(data):
+    """
+    Convert event data into something that can be JSON serialized.
+
+    :param data: Event data
+    :return: JSON serializable representation
+    """
+    if isinstance(data, Message):
+        return {'__cls__': 'message', 'name': _class_name(data.__class__),
+                'value': data.to_dict()}
+    elif isinstance(data, State):
+        return {'__cls__': 'state',
+                'value': {'test_id': data.test_id, 'status': data.status,
+                          'name': data.name, 'mti': data.mti,
+                          'message': data.message, 'context': data.context}}
+    elif isinstance(data, HTTPResponse):
+        return {'__cls__': 'http_response',
+                'value': {'status_code': data.status_code, 'url': data.url,
+                          'headers': dict(data.headers), 'text': data.text}}
+    elif isinstance(data, Base):
+        return {'__cls__': 'base', 'value': data.gather_args()}
+    elif isinstance(data, type):
+        return _class_name(data)
+    elif isinstance(data, Exception):
+        return '{}'.format(data)
+
+    return data
+
+
+def _message_cls(name):
+    module, cls_name = name.rsplit('.', 1)
+    try:
+        return getattr(importlib.import_module(module), cls_name)
+    except (ImportError, AttributeError):
+        return Message
+
+
+def decode_data(data):
+    """
+    The reverse of encode_data. Classes are returned as their names.
+    """
+    if not isinstance(data, dict) or '__cls__' not in data:
+        return data
+
+    _typ = data['__cls__']
+    _val = data['value']
+    if _typ == 'message':
+        return _message_cls(data['name'])().from_dict(_val)
+    elif _typ == 'state':
+        return State(**_val)
+    elif _typ == 'http_response':
+        return HTTPResponse(SimpleNamespace(**_val))
+    elif _typ == 'base':
+        return Base(**_val)
+
+    return data
+
+
+def to_record(event):
+    return {
+        'timestamp': event.timestamp, 'seq': event.seq, 'typ': event.typ,
+        'data': encode_data(event.data), 'ref': event.ref, 'sub': event.sub,
+        'sender': encode_data(event.sender), 'direction': event.direction,
+        'kwargs': event.kwargs
+    }
+
+
+def from_record(rec):
+    return Event(rec['timestamp'], rec['typ'], decode_data(rec['data']),
+                 rec['ref'], rec['sub'], rec['sender'], rec['direction'],
+                 **rec['kwargs'])
+
+
+class Journal(object):
+    def __init__(self, path, fsync=FSYNC_BATCH, batch_size=32):
+        self.path = path
+        self.fsync = fsync
+        self.batch_size = batch_size
+        self._fp = None
+        self._pending = 0
+
+    def _open(self):
+        _dir = os.path.dirname(self.path)
+        if _dir and not os.path.isdir(_dir):
+            os.makedirs(_dir)
+        self._fp = open(self.path, 'ab')
+
+    def write(self, event):
+        if self._fp is None:
+            self._open()
+
+        rec = json.dumps(to_record(event), default=str).encode('utf-8')
+        self._fp.write('{}:'.format(len(rec)).encode('ascii'))
+        self._fp.write(rec)
+        self._fp.write(b'\n')
+
+        self._pending += 1
+        if self.fsync == FSYNC_ALWAYS:
+            self.sync()
+        elif self.fsync == FSYNC_BATCH and self._pending >= self.batch_size:
+            self.sync()
+
+    def sync(self):
+        if self._fp is None:
+            return
+        self._fp.flush()
+        if self.fsync != FSYNC_NONE:
+            os.fsync(self._fp.fileno())
+        self._pending = 0
+
+    def close(self):
+        """
+        Close the journal file. It's opened again if more events are
+        written.
+        """
+        if self._fp is not None:
+            self.sync()
+            self._fp.close()
+            self._fp = None
+
+    def reset(self):
+        """
+        Throw away everything written so far.
+        """
+        self.close()
+        if os.path.isfile(self.path):
+            open(self.path, 'wb').close()
+
+    def __iter__(self):
+        if self._fp is not None:
+            self._fp.flush()
+        return read_journal(self.path)
+
+
+def read_journal(path):
+    """
+    Stream the events in a journal, one at the time.
+
+    :param path: Path to the journal file
+    :return: generator of Event instances
+    """
+    with open(path, 'rb') as fp:
+        for line in fp:
+            try:
+                _len, rec = line.split(b':', 1)
+                _len = int(_len)
+            except ValueError:
+                logger.warning('Corrupt journal record in {}'.format(path))
+                return
+
+            if len(rec) != _len + 1 or not rec.endswith(b'\n'):
+                logger.warning('Truncated journal record in {}'.format(path))
+                return
+
+            yield from_record(json.loads(rec[:-1].decode('utf-8')))
+
+
+def load_events(path, events=None):
+    """
+    Read a journal back into an Events instance.
+
+    :param path: Path to the journal file
+    :param events: An Events instance to add the events to
+    :return: An Events instance
+    """
+    if events is None:
+        events = Events()
+    events.extend(read_journal(path))
+    return events
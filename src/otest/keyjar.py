@@ -0,0 +1,233 @@
+"""
+    Copy-on-write key jars
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Every test gets its own client and by that its own key jar. Instead of
+    copying all the keys in the tool's key jar for each test a KeyJarView
+    shares the key bundles with the key jar it was made from. The list of
+    bundles for an issuer is copied the first time bundles are added or
+    removed. The bundles themselves are only copied when keys are about to
+    be changed in place, for instance when keys are rotated, see
+    KeyJarView.private.
+
+    The key jar a view is made from must not be changed while there are
+    views of it.
+
+    :copyright: (c) 2016 by Roland Hedberg.
+    :license: APACHE 2.0, see LICENSE for more details.
+"""
+import copy
+import logging
+
+from oic.utils.keyio import KeyJar
+
+__author__ = 'roland'
+
+logger = logging.getLogger(__name__)
+
+
+def _usage(key_use):
+    # Same mapping as in KeyJar.get
+    if key_use in ["dec", "enc"]:
+        return "enc"
+    else:
+        return "sig"
+
+
+class KidIndex(object):
+    def __init__(self, keyjar, issuer=''):
+        """
+        An index over the active keys of one issuer.
+
+        :param keyjar: A KeyJar instance
+        :param issuer: Whose keys, "" == me
+        """
+        # kid -> key
+        self.kids = {}
+        # (usage, key type) -> list of keys, in key jar order
+        self.usable = {}
+
+        for kb in keyjar.issuer_keys.get(issuer, []):
+            for key in kb.keys():
+                if key.inactive_since:
+                    continue
+                if key.kid:
+                    self.kids.setdefault(key.kid, key)
+                _kty = key.kty.upper()
+                if key.use:
+                    _uses = [key.use]
+                else:
+                    _uses = ['sig', 'enc']
+                for _use in _uses:
+                    self.usable.setdefault((_use, _kty), []).append(key)
+
+    def get(self, key_use, key_type, kid=None):
+        """
+        Find usable keys.
+
+        :param key_use: A key useful for this usage (enc, dec, sig, ver)
+        :param key_type: Type of key (rsa, ec, oct, ..)
+        :param kid: A Key Identifier
+        :return: A possibly empty list of keys. If a kid is given the list
+            will contain at most one key.
+        """
+        _keys = self.usable.get((_usage(key_use), key_type.upper()), [])
+        if kid is None:
+            return _keys
+        return [k for k in _keys if k.kid == kid][:1]
+
+
+class KeyJarView(KeyJar):
+    def __init__(self, keyjar):
+        """
+        :param keyjar: The KeyJar instance whose keys should be shared
+        """
+        KeyJar.__init__(self, ca_certs=keyjar.ca_certs,
+                        verify_ssl=keyjar.verify_ssl,
+                        keybundle_cls=keyjar.keybundle_cls,
+                        remove_after=keyjar.remove_after)
+        self.issuer_keys = dict(keyjar.issuer_keys)
+        # Issuers whose list of bundles is still the one in keyjar
+        self._shared = set(self.issuer_keys.keys())
+        # Issuers whose bundles are still the ones in keyjar
+        self._shared_bundles = set(self.issuer_keys.keys())
+        # Bumped every time the view is changed
+        self.version = 0
+        self._index = {}
+
+    def _changed(self):
+        self.version += 1
+        self._index = {}
+
+    def _own(self, issuer):
+        """
+        Get a private list of bundles for an issuer.
+        """
+        if issuer in self._shared:
+            self.issuer_keys[issuer] = list(self.issuer_keys[issuer])
+            self._shared.discard(issuer)
+        self._changed()
+
+    def private(self, issuer=None):
+        """
+        Get private copies of the bundles, and the keys in them, for an
+        issuer. Must be called before keys are changed in place.
+
+        :param issuer: Whose keys, None means all issuers
+        """
+        if issuer is None:
+            issuers = list(self._shared_bundles)
+        else:
+            issuers = [issuer]
+
+        for iss in issuers:
+            if iss not in self._shared_bundles:
+                continue
+            _kbl = []
+            for kb in self.issuer_keys.get(iss, []):
+                _kb = copy.copy(kb)
+                _kb._keys = [copy.copy(k) for k in kb.available_keys()]
+                _kbl.append(_kb)
+            self.issuer_keys[iss] = _kbl
+            self._shared.discard(iss)
+            self._shared_bundles.discard(iss)
+        self._changed()
+
+    def is_private(self, issuer):
+        return issuer not in self._shared_bundles
+
+    def kid_index(self, issuer=''):
+        """
+        :param issuer: Whose keys, "" == me
+        :return: A KidIndex instance, kept until the view is changed
+        """
+        try:
+            return self._index[issuer]
+        except KeyError:
+            _index = KidIndex(self, issuer)
+            self._index[issuer] = _index
+            return _index
+
+    def add(self, issuer, url, **kwargs):
+        self._own(issuer)
+        return KeyJar.add(self, issuer, url, **kwargs)
+
+    def add_symmetric(self, issuer, key, usage=None):
+        self._own(issuer)
+        KeyJar.add_symmetric(self, issuer, key, usage)
+
+    def add_kb(self, issuer, kb):
+        self._own(issuer)
+        KeyJar.add_kb(self, issuer, kb)
+
+    def __setitem__(self, issuer, val):
+        KeyJar.__setitem__(self, issuer, val)
+        self._shared.discard(issuer)
+        self._shared_bundles.discard(issuer)
+        self._changed()
+
+    def remove_key(self, issuer, key_type, key):
+        self.private(issuer)
+        KeyJar.remove_key(self, issuer, key_type, key)
+
+    def update(self, kj):
+        for issuer in kj.issuer_keys.keys():
+            self._own(issuer)
+        KeyJar.update(self, kj)
+
+    def load_keys(self, pcr, issuer, replace=False):
+        self._own(issuer)
+        KeyJar.load_keys(self, pcr, issuer, replace)
+
+    def import_jwks(self, jwks, issuer):
+        self._own(issuer)
+        KeyJar.import_jwks(self, jwks, issuer)
+
+    def add_keyjar(self, keyjar):
+        for issuer in keyjar.issuer_keys.keys():
+            self._own(issuer)
+        KeyJar.add_keyjar(self, keyjar)
+
+    def restore(self, info):
+        KeyJar.restore(self, info)
+        for issuer in info.keys():
+            self._shared.discard(issuer)
+            self._shared_bundles.discard(issuer)
+        self._changed()
+
+    def remove_outdated(self):
+        # Only bundles that will actually lose keys have to be copied
+        for iss in list(self._shared_bundles):
+            for kb in self.issuer_keys.get(iss, []):
+                if any(k.inactive_since for k in kb.available_keys()):
+                    self.private(iss)
+                    break
+        KeyJar.remove_outdated(self)
+        self._changed()
+
+
+def private_keys(keyjar, issuer=''):
+    """
+    Make sure the keys of an issuer can be changed in place without
+    affecting anyone else.
+
+    :param keyjar: A KeyJar or KeyJarView instance
+    :param issuer: Whose keys, "" == me
+    """
+    try:
+        keyjar.private(issuer)
+    except AttributeError:
+        # An ordinary KeyJar, owns all its keys
+        pass
+
+
+def kid_index(keyjar, issuer=''):
+    """
+    :param keyjar: A KeyJar or KeyJarView instance
+    :param issuer: Whose keys, "" == me
+    :return: A KidIndex instance
+    """
+    try:
+        return keyjar.kid_index(issuer)
+    except AttributeError:
+        return KidIndex(keyjar, issuer)
@@ -1,21 +1,22 @@
+import asyncio
 import copy
-import inspect
 import json
 import logging
 import time
-import sys
 
 import cherrypy
 from jwkest import as_bytes
 from oic.oauth2.message import ErrorResponse
 from oic.oauth2.message import Message
 from otest import Break, ConfigurationError
+from otest import aio
 
 from otest.events import EV_EVENT
 from otest.events import EV_EXCEPTION
 from otest.events import EV_FUNCTION
 from otest.events import EV_PROTOCOL_RESPONSE
 from otest.events import EV_RESPONSE
+from otest.registry import OPERATIONS
 from otest.verify import Verify
 
 logger = logging.getLogger(__name__)
@@ -83,6 +84,12 @@ class Operation(object):
     def run(self, *args, **kwargs):
         return None
 
+    def pre_tests(self):
+        if self.tests["pre"]:
+            cls_name = self.__class__.__name__
+            _ver = Verify(self.check_factory, self.conv, cls_name=cls_name)
+            _ver.test_sequence(self.tests["pre"])
+
     def post_tests(self):
         if self.tests["post"]:
             cls_name = self.__class__.__name__
@@ -93,16 +100,33 @@ class Operation(object):
         if self.skip:
             return
         else:
-            cls_name = self.__class__.__name__
-            if self.tests["pre"] or self.tests["post"]:
-                _ver = Verify(self.check_factory, self.conv, cls_name=cls_name)
-            else:
-                _ver = None
+            self.pre_tests()
+            res = self.run(*args, **kwargs)
 
-            if self.tests["pre"]:
-                _ver.test_sequence(self.tests["pre"])
+            if res:
+                return res
 
-            res = self.run(*args, **kwargs)
+    async def arun(self, *args, **kwargs):
+        """
+        Async variant of run. Unless a subclass has an async
+        implementation run is done in an executor.
+        """
+        return await aio.run_in_executor(self.run, *args, **kwargs)
+
+    async def acall(self, *args, **kwargs):
+        """
+        Async variant of __call__. Operations that have their own __call__
+        have it run in an executor.
+        """
+        if aio.overrides(self, Operation, '__call__'):
+            return await aio.run_in_executor(self, *args, **kwargs)
+
+        if self.skip:
+            return
+        else:
+            # The checks may wait for each other, see Verify
+            await aio.run_in_executor(self.pre_tests)
+            res = await self.arun(*args, **kwargs)
 
             if res:
                 return res
@@ -285,6 +309,10 @@ class TimeDelay(Operation):
         time.sleep(self.delay)
         return None
 
+    async def acall(self, *args, **kwargs):
+        await asyncio.sleep(self.delay)
+        return None
+
 
 class ProtocolMessage(object):
     def __init__(self, conv, req_args, binding, msg_param=None):
@@ -314,7 +342,4 @@ class VerifyConfiguration(Operation):
 
 
 def factory(name):
-    for fname, obj in inspect.getmembers(sys.modules[__name__]):
-        if inspect.isclass(obj):
-            if name == fname:
-                return obj
+    return OPERATIONS.lookup(__name__, name)
@@ -0,0 +1,246 @@
+"""
+    Name registries
+    ~~~~~~~~~~~~~~~
+
+    Operation classes, functions and checks are found by name (or check ID)
+    in the module that defines them. Instead of scanning the module with
+    inspect.getmembers on every lookup a name to object map is built once
+    per module, the first time the module is asked for.
+
+    Objects can also be registered explicitly, these take precedence over
+    what is found in the module.
+
+    Checks are registered by otest.check.CheckMeta when the check class is
+    created, under the module that defines it and keyed on check ID.
+
+    :copyright: (c) 2016 by Roland Hedberg.
+    :license: APACHE 2.0, see LICENSE for more details.
+"""
+import importlib
+import inspect
+import logging
+import sys
+import threading
+
+__author__ = 'roland'
+
+logger = logging.getLogger(__name__)
+
+# The order in which check modules are searched when no other order is
+# given. The first module that has a check with a specific ID wins.
+CHECK_LAYERS = ['otest.aus.check', 'otest.rp.check', 'otest.check']
+
+
+def _name(name, obj):
+    return name
+
+
+class Registry(object):
+    def __init__(self, predicate, key=_name):
+        """
+        :param predicate: Which module members that should be registered
+        :param key: Function that given a member name and the member
+            returns the name it should be registered under
+        """
+        self.predicate = predicate
+        self.key = key
+        # module name -> {name: object}
+        self._modules = {}
+        # module name -> {name: object}, explicitly registered
+        self._registered = {}
+        self._lock = threading.Lock()
+        # Bumped every time a registration or invalidation is done
+        self.version = 0
+
+    def _scan(self, module):
+        names = {}
+        for name, obj in inspect.getmembers(sys.modules[module],
+                                            self.predicate):
+            # inspect.getmembers returns the members sorted by name, the
+            # first one wins. Which is what the old factories did.
+            names.setdefault(self.key(name, obj), obj)
+        return names
+
+    def names(self, module):
+        """
+        All the names known for a module.
+
+        :param module: Module name
+        :return: Dictionary with names as keys and objects as values
+        """
+        try:
+            names = self._modules[module]
+        except KeyError:
+            names = self._scan(module)
+            with self._lock:
+                self._modules[module] = names
+
+        _reg = self._registered.get(module)
+        if _reg:
+            names = names.copy()
+            names.update(_reg)
+        return names
+
+    def lookup(self, module, name):
+        """
+        Find an object given the name it's registered under.
+
+        :param module: Module name
+        :param name: Name of the object
+        :return: The object or None if there is no such name
+        """
+        try:
+            return self._registered[module][name]
+        except KeyError:
+            pass
+
+        try:
+            names = self._modules[module]
+        except KeyError:
+            names = self.names(module)
+
+        return names.get(name)
+
+    def register(self, module, obj, name=''):
+        """
+        Explicitly register an object.
+
+        :param module: Module name the object should be registered under
+        :param obj: The object
+        :param name: Name to register it under, if not given it's the name
+            the registry would have used for it
+        """
+        if not name:
+            name = self.key(obj.__name__, obj)
+        with self._lock:
+            self._registered.setdefault(module, {})[name] = obj
+            self.version += 1
+
+    def invalidate(self, module=None):
+        """
+        Forget what has been learned about a module, or all modules if no
+        module is given. Explicit registrations are kept.
+        """
+        with self._lock:
+            if module is None:
+                self._modules = {}
+            else:
+                self._modules.pop(module, None)
+            self.version += 1
+
+
+class CheckRegistry(object):
+    def __init__(self):
+        # module name -> {cid: check class}
+        self._modules = {}
+        # (module name, cid) -> all classes defined with that cid
+        self._duplicates = {}
+        self._lock = threading.Lock()
+        self.version = 0
+
+    def add(self, cls, module=''):
+        """
+        Register a check class.
+
+        :param cls: The check class, must have a cid attribute
+        :param module: Module to register it under, default is the module
+            the class is defined in.
+        """
+        module = module or cls.__module__
+        with self._lock:
+            _checks = self._modules.setdefault(module, {})
+            _old = _checks.get(cls.cid)
+            if _old is None or _old.__name__ == cls.__name__:
+                # new or redefined (reloaded module)
+                _checks[cls.cid] = cls
+            else:
+                _dup = self._duplicates.setdefault((module, cls.cid), [_old])
+                _dup.append(cls)
+                logger.warning('Duplicate check ID {} in {}: {}'.format(
+                    cls.cid, module, [c.__name__ for c in _dup]))
+                # Same as when the module was scanned with
+                # inspect.getmembers, the first in name order wins
+                if cls.__name__ < _old.__name__:
+                    _checks[cls.cid] = cls
+            self.version += 1
+
+    register = add
+
+    def lookup(self, module, cid):
+        """
+        Find a check defined in a specific module.
+
+        :param module: Module name
+        :param cid: Check ID
+        :return: Check class or None if there is no such check
+        """
+        try:
+            return self._modules[module][cid]
+        except KeyError:
+            return None
+
+    @staticmethod
+    def _load(module):
+        if module not in sys.modules:
+            try:
+                importlib.import_module(module)
+            except ImportError as err:
+                logger.debug('Could not import {}: {}'.format(module, err))
+
+    def find(self, cid, layers=None):
+        """
+        Find a check by searching a number of modules in order.
+
+        :param cid: Check ID
+        :param layers: The modules to search, default CHECK_LAYERS
+        :return: Check class or None if there is no such check
+        """
+        for module in layers or CHECK_LAYERS:
+            try:
+                return self._modules[module][cid]
+            except KeyError:
+                self._load(module)
+                try:
+                    return self._modules[module][cid]
+                except KeyError:
+                    pass
+        return None
+
+    def names(self, module):
+        """
+        All the checks defined in a module.
+
+        :param module: Module name
+        :return: Dictionary with check IDs as keys and classes as values
+        """
+        self._load(module)
+        return dict(self._modules.get(module, {}))
+
+    def checks(self, layers=None):
+        """
+        All the checks that can be found given a search order.
+
+        :param layers: The modules to search, default CHECK_LAYERS
+        :return: list of (check ID, check class) tuples sorted on check ID
+        """
+        res = {}
+        for module in reversed(layers or CHECK_LAYERS):
+            res.update(self.names(module))
+        return sorted(res.items())
+
+    def duplicates(self):
+        """
+        Check IDs that are used by more than one class in the same module.
+
+        :return: Dictionary with (module, cid) as keys and list of classes
+            as values
+        """
+        return dict(self._duplicates)
+
+
+# Operation classes, keyed on class name
+OPERATIONS = Registry(inspect.isclass)
+# Functions, keyed on function name
+FUNCTIONS = Registry(inspect.isfunction)
+# Checks, keyed on check ID
+CHECKS = CheckRegistry()
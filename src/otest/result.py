@@ -1,5 +1,5 @@
 import logging
-import os
+from functools import partial
 
 from future.backports.urllib.parse import quote
 from oic.oauth2.provider import Provider
@@ -10,10 +10,15 @@ from otest.check import NOT_APPLICABLE
 from otest.check import OK
 from otest.check import WARNING
 from otest.check import INCOMPLETE
+from otest.events import elapsed
+from otest.result_index import RESULT_INDEX
+from otest.result_writer import RESULT_WRITER
+from otest.result_writer import ensure_dir
 from otest.summation import condition
+from otest.summation import get_errors
 from otest.summation import represent_result
 from otest.summation import result_code
-from otest.summation import trace_output
+from otest.summation import iter_trace_output
 from otest.time_util import in_a_while
 
 SIGN = {OK: "+", WARNING: "!", ERROR: "-", INCOMPLETE: "?",
@@ -66,8 +71,7 @@ def safe_path(eid, ext='', *args):
     for arg in args[:-1]:
         path = '{}/{}'.format(path, arg)
 
-    if not os.path.isdir(path):
-        os.makedirs(path)
+    ensure_dir(path)
 
     fname = '{}/{}'.format(path, args[-1])
     if ext:
@@ -75,21 +79,61 @@ def safe_path(eid, ext='', *args):
     return fname
 
 
+def report(header, trace, conditions, result):
+    """
+    The text report of a test result, line by line.
+
+    :param header: Lines of general information
+    :param trace: Iterable of events
+    :param conditions: Lines describing the conditions
+    :param result: The result as text
+    :return: generator of text lines
+    """
+    sline = 60 * "="
+    for line in header:
+        yield line
+    for lines in [iter_trace_output(trace), conditions,
+                  ["RESULT: {}".format(result), ""]]:
+        yield ""
+        yield sline
+        yield ""
+        for line in lines:
+            yield line
+
+
 class Result(object):
     """
     Reads and writes test result information to files on disc.
     Keeps a cache for quick access.
+
+    The files are written by a ResultWriter, by default in the background,
+    and when written recorded in a ResultIndex.
     """
 
-    def __init__(self, session, profile_handler):
+    def __init__(self, session, profile_handler, writer=RESULT_WRITER,
+                 index=RESULT_INDEX):
         self.profile_handler = profile_handler
         self.session = session
         self.cache = {}
         self.logfile_extension = 'txt'
+        self.writer = writer
+        self.index = index
 
     def print_result(self, events):
         return represent_result(events)
 
+    def iter_report(self, header, events):
+        """
+        The report, rendered as it's consumed.
+
+        :param header: Lines of general information
+        :param events: otest.events.Events instance
+        :return: generator of text lines
+        """
+        for line in report(header, events, condition(events),
+                           self.print_result(events)):
+            yield line
+
     def op_based(self, test_id, tag=''):
         _sess = self.session
         _iss = _sess.iss
@@ -105,6 +149,51 @@ class Result(object):
         return safe_path(_sess['test_conf']['start_page'],
                          self.logfile_extension, _sess.profile, test_id)
 
+    def index_info(self, conv, tag=''):
+        """
+        Who was tested, with which profile and tag.
+
+        :return: Dictionary with issuer, profile and tag
+        """
+        _sess = self.session
+        if isinstance(conv.entity, Provider):
+            try:
+                issuer = _sess['test_conf']['start_page']
+            except KeyError:
+                issuer = ''
+        else:
+            issuer = getattr(_sess, 'iss', '') or get_issuer(conv)
+            if not tag:
+                tag = getattr(_sess, 'tag', '')
+
+        try:
+            profile = _sess.profile
+        except (AttributeError, KeyError):
+            profile = ''
+
+        if not isinstance(profile, str):
+            profile = '{}'.format(profile)
+
+        return {'issuer': issuer, 'profile': profile, 'tag': tag}
+
+    def record(self, file_name, test_id, status, events, **kwargs):
+        """
+        Add a result to the result index.
+
+        :param file_name: The log file
+        :param test_id: The test ID
+        :param status: Result code
+        :param events: otest.events.Events instance
+        :param kwargs: Issuer, profile and tag, see index_info
+        """
+        if len(events):
+            duration = elapsed(events.events[0].timestamp, events.events[-1])
+        else:
+            duration = 0.0
+        self.index.record(file_name, test_id, status=status,
+                          duration=duration, errors=get_errors(events),
+                          **kwargs)
+
     def write_info(self, tinfo, test_id='', file_name=None, tag=''):
         if not test_id:
             test_id = tinfo['test_id']
@@ -120,8 +209,6 @@ class Result(object):
         else:
             _conv = self.session["conv"]
 
-        sline = 60 * "="
-
         _pi = tinfo['profile_info']
 
         output = ["Test tool version: {}".format(self.session.tool_version)]
@@ -134,41 +221,21 @@ class Result(object):
                            "Timestamp: {}".format(in_a_while())])
 
         _events = tinfo["events"]
-        output.extend(["", sline, ""])
-        output.extend(trace_output(_events))
-        output.extend(["", sline, ""])
-        output.extend(condition(_events))
-        output.extend(["", sline, ""])
-        # and lastly the result
-        output.append("RESULT: {}".format(self.print_result(_events)))
-        output.append("")
-
-        txt = "\n".join(output)
-
-        f = self._open_file(file_name, 'w')
-        f.write(txt)
-        f.close()
-
-        self.cache[test_id] = {'result': result_code(_events),
-                               'file_name': file_name}
+        _code = result_code(_events)
+        # The report only covers the events there are now. It's rendered by
+        # the writer, the events may have changed before it gets to it.
+        _events = _events.snapshot()
+
+        if self.index is not None:
+            _record = partial(self.record, file_name, test_id, _code,
+                              _events, **self.index_info(_conv, tag))
+        else:
+            _record = None
 
-    def _open_file(self, file_name, mode='w'):
-        try:
-            fp = open(file_name, mode)
-        except IOError:
-            try:
-                os.makedirs(os.path.dirname(file_name))
-            except OSError:
-                pass
+        self.writer.submit(file_name, self.iter_report(output, _events),
+                           _record)
 
-            try:
-                fp = open(file_name, mode)
-            except Exception as err:
-                logger.error(
-                    "Couldn't dump to log file {} reason: {}").format(
-                    file_name, err)
-                raise
-        return fp
+        self.cache[test_id] = {'result': _code, 'file_name': file_name}
 
     def test_status(self, tid):
         return self.cache[tid]
@@ -0,0 +1,252 @@
+"""
+    Index of test results
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    An SQLite database with one row per test result log file: test ID,
+    issuer, profile, tag, result code, duration, error summary and where
+    the log file is. Result.write_info adds a row when the log file has
+    been written.
+
+    Makes it possible to ask things like which tests failed for an issuer
+    across profiles without reading log files. When log directories are
+    listed the names the index knows about don't have to be checked, and
+    results whose log files are gone are removed from the index.
+
+    :copyright: (c) 2016 by Roland Hedberg.
+    :license: APACHE 2.0, see LICENSE for more details.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from otest.result_writer import ensure_dir
+
+__author__ = 'roland'
+
+logger = logging.getLogger(__name__)
+
+# Starts with a dot so log listings skip it
+RESULT_DB = os.path.join('log', '.results.db')
+
+COLUMNS = ['path', 'test_id', 'issuer', 'profile', 'tag', 'status',
+           'duration', 'errors', 'timestamp']
+
+# Columns that can be used in queries
+QUERY_COLUMNS = ['test_id', 'issuer', 'profile', 'tag', 'status']
+
+
+class ResultIndex(object):
+    def __init__(self, path=RESULT_DB):
+        """
+        :param path: The database file, created when the first result is
+            recorded
+        """
+        self.path = path
+        # sqlite3 connections can't be shared between threads
+        self._local = threading.local()
+
+    def _db(self, create=False):
+        try:
+            return self._local.db
+        except AttributeError:
+            pass
+
+        if not create and not os.path.isfile(self.path):
+            return None
+
+        _dir = os.path.dirname(self.path)
+        if _dir:
+            ensure_dir(_dir)
+        db = sqlite3.connect(self.path, timeout=30)
+        # Readers don't block writers and vice versa
+        db.execute('PRAGMA journal_mode=WAL')
+        with db:
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS result ('
+                'path TEXT PRIMARY KEY, dir TEXT, test_id TEXT, issuer TEXT, '
+                'profile TEXT, tag TEXT, status TEXT, duration REAL, '
+                'errors TEXT, timestamp REAL)')
+            db.execute('CREATE INDEX IF NOT EXISTS result_dir ON result (dir)')
+            db.execute('CREATE INDEX IF NOT EXISTS result_issuer '
+                       'ON result (issuer, profile)')
+        self._local.db = db
+        return db
+
+    def record(self, path, test_id, issuer='', profile='', tag='', status='',
+               duration=0.0, errors=''):
+        """
+        Add, or replace, the result for a log file.
+
+        :param path: The log file
+        :param test_id: The test ID
+        :param issuer: The entity that was tested
+        :param profile: The profile the test was run with
+        :param tag: Test tag
+        :param status: Result code, see otest.summation.result_code
+        :param duration: How long the test took, in seconds
+        :param errors: Error summary, see otest.summation.get_errors
+        """
+        path = os.path.abspath(path)
+        with self._db(True) as db:
+            db.execute(
+                'INSERT OR REPLACE INTO result (path, dir, test_id, issuer, '
+                'profile, tag, status, duration, errors, timestamp) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (path, os.path.dirname(path), test_id, issuer, profile, tag,
+                 status, duration, errors, time.time()))
+
+    def query(self, **kwargs):
+        """
+        Find results. Keyword arguments are column names from
+        QUERY_COLUMNS, the value is what the column should be equal to or
+        a list of values it should be one of.
+
+        :return: list of dictionaries with the keys in COLUMNS, sorted on
+            issuer, profile and test ID
+        """
+        _where = []
+        _args = []
+        for key, val in kwargs.items():
+            if key not in QUERY_COLUMNS:
+                raise ValueError('Unknown result attribute: {}'.format(key))
+            if isinstance(val, (list, tuple, set)):
+                _where.append('{} IN ({})'.format(
+                    key, ', '.join(['?'] * len(val))))
+                _args.extend(val)
+            else:
+                _where.append('{} = ?'.format(key))
+                _args.append(val)
+
+        db = self._db()
+        if db is None:
+            return []
+
+        sql = 'SELECT {} FROM result'.format(', '.join(COLUMNS))
+        if _where:
+            sql += ' WHERE ' + ' AND '.join(_where)
+        sql += ' ORDER BY issuer, profile, test_id'
+        return [dict(zip(COLUMNS, row)) for row in db.execute(sql, _args)]
+
+    def known(self, directory, dirs=False):
+        """
+        What the index has results for in a directory.
+
+        :param directory: A directory
+        :param dirs: Whether to list subdirectories instead of log files
+        :return: Set of file or subdirectory names
+        """
+        db = self._db()
+        if db is None:
+            return set()
+
+        _dir = os.path.abspath(directory)
+        if not dirs:
+            return set(
+                os.path.basename(row[0]) for row in db.execute(
+                    'SELECT path FROM result WHERE dir = ?', (_dir,)))
+
+        prefix = os.path.join(_dir, '')
+        names = set()
+        for (path,) in db.execute(
+                'SELECT DISTINCT dir FROM result '
+                'WHERE substr(dir, 1, ?) = ?', (len(prefix), prefix)):
+            names.add(path[len(prefix):].split(os.sep)[0])
+        return names
+
+    def entries(self, directory, dirs=False):
+        """
+        The log files, or subdirectories, in a directory as they are on
+        disk. The index saves checking whether the names it knows about
+        are files or directories. Names it knows about that are no longer
+        on disk are removed from the index.
+
+        :param directory: A directory
+        :param dirs: Whether to list subdirectories instead of log files
+        :return: Sorted list of file or subdirectory names
+        """
+        known = self.known(directory, dirs)
+        try:
+            names = list_dir(directory, dirs, known)
+        except OSError:
+            # Gone, and everything that was in it
+            self.forget_dir(directory)
+            raise
+
+        for _name in known.difference(names):
+            _path = os.path.join(directory, _name)
+            if dirs:
+                self.forget_dir(_path)
+            else:
+                self.forget(_path)
+        return names
+
+    def forget(self, path):
+        """
+        Remove the result for a log file.
+        """
+        db = self._db()
+        if db is None:
+            return
+        with db:
+            db.execute('DELETE FROM result WHERE path = ?',
+                       (os.path.abspath(path),))
+
+    def forget_dir(self, directory):
+        """
+        Remove the results for all log files in a directory and its
+        subdirectories.
+        """
+        db = self._db()
+        if db is None:
+            return
+        _dir = os.path.abspath(directory)
+        prefix = os.path.join(_dir, '')
+        with db:
+            db.execute('DELETE FROM result WHERE dir = ? OR '
+                       'substr(dir, 1, ?) = ?', (_dir, len(prefix), prefix))
+
+
+RESULT_INDEX = ResultIndex()
+
+
+def list_dir(path, dirs=False, known=None):
+    """
+    List the files, or subdirectories, in a directory.
+
+    :param path: A directory
+    :param dirs: Whether to list subdirectories instead of files
+    :param known: Names that are known to be of the kind asked for. If
+        they are in the directory they are included without being checked.
+    :return: Sorted list of names
+    """
+    known = known or set()
+    names = []
+    for _name in os.listdir(path):
+        if _name.startswith("."):
+            continue
+        if _name in known:
+            names.append(_name)
+            continue
+        fn = os.path.join(path, _name)
+        if dirs and os.path.isdir(fn):
+            names.append(_name)
+        elif not dirs and os.path.isfile(fn):
+            names.append(_name)
+    return sorted(names)
+
+
+def log_entries(path, dirs=False, index=RESULT_INDEX):
+    """
+    List log files, or directories, in a log directory. What's listed is
+    what's on disk, see ResultIndex.entries.
+
+    :param path: A directory
+    :param dirs: Whether to list subdirectories instead of log files
+    :param index: ResultIndex instance
+    :return: Sorted list of names
+    """
+    if index is not None:
+        return index.entries(path, dirs)
+    return list_dir(path, dirs)
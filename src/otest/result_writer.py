@@ -0,0 +1,223 @@
+"""
+    Background writer of test result files
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Result files are written by a worker thread so that the request that
+    ended a test doesn't have to wait for the report to be rendered and
+    written to disk.
+
+    A write job is a file name and an iterable of text lines, typically a
+    generator that renders the report as it's consumed. The worker takes
+    all jobs that are waiting, handles them directory by directory and, if
+    there are several jobs for the same file, only writes the last one.
+    Directories that have been created are remembered so they aren't
+    checked again for every file.
+
+    Whoever needs the files on disk, like something making an archive of
+    them, calls flush which returns when everything queued before it has
+    been written.
+
+    :copyright: (c) 2016 by Roland Hedberg.
+    :license: APACHE 2.0, see LICENSE for more details.
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import OrderedDict
+from queue import Queue
+
+__author__ = 'roland'
+
+logger = logging.getLogger(__name__)
+
+# Directories known to exist
+_DIRS = set()
+_DIRS_LOCK = threading.Lock()
+
+
+def ensure_dir(path):
+    """
+    Create a directory, and its parents, unless it's known to exist.
+
+    :param path: Directory path
+    """
+    if path in _DIRS:
+        return
+    if not os.path.isdir(path):
+        try:
+            os.makedirs(path)
+        except OSError:
+            # Someone else may just have created it
+            if not os.path.isdir(path):
+                raise
+    with _DIRS_LOCK:
+        _DIRS.add(path)
+
+
+def forget_dir(path):
+    """
+    Remove a directory from the set of directories known to exist, for
+    instance when it's been removed.
+    """
+    with _DIRS_LOCK:
+        _DIRS.discard(path)
+
+
+def write_lines(file_name, lines, buffer_size=65536):
+    """
+    Write lines separated by newlines. Writes to a temporary file that
+    replaces the file when complete, so readers never see a partial file.
+
+    :param file_name: The file
+    :param lines: Iterable of text lines
+    :param buffer_size: How many characters to collect before writing
+    """
+    _dir = os.path.dirname(file_name)
+    if _dir:
+        ensure_dir(_dir)
+
+    tmp = '{}.{}.tmp'.format(file_name, threading.current_thread().ident)
+    try:
+        fp = open(tmp, 'w')
+    except (IOError, OSError):
+        if not _dir:
+            raise
+        # The directory may have been removed
+        forget_dir(_dir)
+        ensure_dir(_dir)
+        fp = open(tmp, 'w')
+
+    try:
+        with fp:
+            _buf = []
+            _size = 0
+            cont = False
+            for line in lines:
+                if cont:
+                    _buf.append("\n")
+                _buf.append(line)
+                cont = True
+                _size += len(line)
+                if _size >= buffer_size:
+                    fp.write(''.join(_buf))
+                    _buf = []
+                    _size = 0
+            fp.write(''.join(_buf))
+    except Exception:
+        os.unlink(tmp)
+        raise
+    os.rename(tmp, file_name)
+
+
+class ResultWriter(object):
+    def __init__(self, asynchronous=True):
+        """
+        :param asynchronous: Write in a worker thread, otherwise the files
+            are written when the job is submitted.
+        """
+        self.asynchronous = asynchronous
+        self._queue = Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        # Number of files written and number of jobs that were superseded
+        # by a later job for the same file before they were written
+        self.written = 0
+        self.skipped = 0
+
+    def start(self):
+        """
+        Start the worker thread, if it's not already running.
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run,
+                                            name='otest-result-writer')
+            self._thread.daemon = True
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def submit(self, file_name, lines, callback=None):
+        """
+        Queue a file to be written.
+
+        :param file_name: The file
+        :param lines: Iterable of text lines, consumed by the worker thread
+        :param callback: Function that is called, without arguments, when
+            the file has been written
+        """
+        if not self.asynchronous:
+            self._write(file_name, lines, callback)
+            return
+
+        self.start()
+        self._queue.put((file_name, (lines, callback)))
+
+    def flush(self, timeout=None):
+        """
+        Wait until everything submitted before this call has been written.
+
+        :param timeout: Max number of seconds to wait
+        :return: True if everything was written, False on timeout
+        """
+        if self._thread is None or not self._thread.is_alive():
+            return self._queue.empty()
+
+        barrier = threading.Event()
+        self._queue.put((None, barrier))
+        return barrier.wait(timeout)
+
+    def _write(self, file_name, lines, callback=None):
+        try:
+            write_lines(file_name, lines)
+        except Exception as err:
+            logger.error("Couldn't write result file {} reason: {}".format(
+                file_name, err))
+            return
+
+        self.written += 1
+        if callback is not None:
+            try:
+                callback()
+            except Exception as err:
+                logger.error("Result file {} callback failed: {}".format(
+                    file_name, err))
+
+    def _batch(self):
+        """
+        Wait for a job and then take all that are waiting.
+        """
+        batch = [self._queue.get()]
+        while not self._queue.empty():
+            batch.append(self._queue.get())
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._batch()
+
+            # directory -> {file name: (lines, callback)}, the last job for
+            # a file wins
+            jobs = OrderedDict()
+            barriers = []
+            for file_name, job in batch:
+                if file_name is None:
+                    barriers.append(job)
+                    continue
+                _files = jobs.setdefault(os.path.dirname(file_name),
+                                         OrderedDict())
+                if file_name in _files:
+                    self.skipped += 1
+                    del _files[file_name]
+                _files[file_name] = job
+
+            for _dir, _files in jobs.items():
+                for file_name, (lines, callback) in _files.items():
+                    self._write(file_name, lines, callback)
+
+            for barrier in barriers:
+                barrier.set()
+
+
+RESULT_WRITER = ResultWriter()
@@ -1,6 +1,4 @@
-import inspect
 import json
-import sys
 import requests
 
 from future.backports.urllib.parse import urlparse
@@ -10,6 +8,7 @@ from otest.check import ERROR
 from otest.check import WARNING
 from otest.events import EV_PROTOCOL_REQUEST
 from otest.events import NoSuchEvent
+from otest.registry import CHECKS
 from otest.shannon_entropy import calculate
 
 from oic.oauth2 import AuthorizationRequest
@@ -49,6 +48,7 @@ def access_token_request(conv):
 class VerifyRegistrationOfflineAccess(Check):
     cid = 'verify-registration-offline-access'
     msg = "Check if offline access is requested"
+    pure = True
 
     def _func(self, conv):
         try:
@@ -74,6 +74,7 @@ class VerifyRegistrationOfflineAccess(Check):
 class VerifyRegistrationResponseTypes(Check):
     cid = 'verify-registration-response_types'
     msg = "Only one of 'code' or 'token' allowed"
+    pure = True
 
     def _func(self, conv):
         try:
@@ -110,6 +111,7 @@ class VerifyRegistrationResponseTypes(Check):
 class VerifyRegistrationSoftwareStatement(Check):
     cid = 'verify-registration-software-statement'
     msg = "Verify that the correct claims appear in the Software statement"
+    pure = True
 
     def _func(self, conv):
         try:
@@ -141,6 +143,8 @@ class VerifyRegistrationSoftwareStatement(Check):
 class VerifyRegistrationRedirectUriScheme(Check):
     cid = 'verify-registration-redirect_uri-scheme'
     msg = "Only certain redirect_uri schemes are allowed"
+    # Reads conv.data
+    pure = False
 
     def _func(self, conv):
         try:
@@ -183,6 +187,8 @@ class VerifyRegistrationRedirectUriScheme(Check):
 class VerifyRegistrationPublicKeyRegistration(Check):
     cid = 'verify-registration-public_key-registration'
     msg = "Public key must be registered"
+    # Fetches the keys from jwks_uri
+    pure = False
 
     def _func(self, conv):
         try:
@@ -228,6 +234,7 @@ class VerifyRegistrationPublicKeyRegistration(Check):
 class VerifyAuthorizationOfflineAccess(Check):
     cid = 'verify-authorization-offline-access'
     msg = "Check if offline access is requested"
+    pure = True
 
     def _func(self, conv):
         try:
@@ -252,6 +259,7 @@ class VerifyAuthorizationOfflineAccess(Check):
 class VerifyAuthorizationStateEntropy(Check):
     cid = 'verify-authorization-state-entropy'
     msg = "Check if offline access is requested"
+    pure = True
 
     def _func(self, conv):
         try:
@@ -271,6 +279,7 @@ class VerifyAuthorizationStateEntropy(Check):
 class VerifyAuthorizationRedirectUri(Check):
     cid = 'verify-authorization-redirect_uri'
     msg = "Check if offline access is requested"
+    pure = True
 
     def _func(self, conv):
         try:
@@ -295,6 +304,7 @@ class VerifyAuthorizationRedirectUri(Check):
 class VerifyTokenRequestClientAssertion(Check):
     cid = 'verify-token-request-client_assertion'
     msg = "Check that the client_assertion JWT contains expected claims"
+    pure = True
 
     def _func(self, conv):
         request = access_token_request(conv)
@@ -320,13 +330,4 @@ class VerifyTokenRequestClientAssertion(Check):
 
 
 def factory(cid):
-    for name, obj in inspect.getmembers(sys.modules[__name__]):
-        if inspect.isclass(obj) and issubclass(obj, Check):
-            try:
-                if obj.cid == cid:
-                    return obj
-            except AttributeError:
-                pass
-
-    from otest import check
-    return check.factory(cid)
+    return CHECKS.find(cid, [__name__, 'otest.check'])
@@ -4,6 +4,7 @@ from otest.check import OK
 from otest.check import WARNING
 from otest.check import ERROR
 from otest.check import CRITICAL
+from otest.events import EV_CACHED_RESULT
 from otest.events import EV_CONDITION, EV_HTTP_INFO
 from otest.events import EV_HTTP_RESPONSE
 from otest.events import EV_PROTOCOL_RESPONSE
@@ -50,6 +51,10 @@ BG_COLOR = {
 }
 
 
+def do_cached_result(event):
+    return []
+
+
 def do_condition(event):
     return ['<li style="{}">{}</li>'.format(BG_COLOR[event.data.status],
                                             event.data.test_id)]
@@ -176,6 +181,7 @@ def do_path(event):
 
 
 FUNC_MAP = {
+    EV_CACHED_RESULT: do_cached_result,
     EV_CONDITION: do_condition,
     EV_FAULT: do_fault,
     EV_HANDLER_RESPONSE: do_handler_response,
@@ -198,27 +204,48 @@ FUNC_MAP = {
 }
 
 
-def display(events):
-    last = ''
-    lines = []
+def _display(event):
+    return tuple(FUNC_MAP[event.typ](event))
+
+
+def iter_display(events):
+    """
+    Render the events one at the time. Conditions are shown as lists, every
+    list that is opened is also closed, so any part of a trace, like a
+    page, can be rendered by itself.
+
+    :param events: Anything that iterates over events
+    :return: generator of HTML lines
+    """
+    in_list = False
     request = None
     for event in events:
-        if event.typ != last:
-            if event.typ == EV_CONDITION:
-                lines.append('<ul>')
-            elif last == EV_CONDITION:
-                lines.append('</ul>')
-
+        _events = [event]
         if request:
             if event.typ != EV_PROTOCOL_REQUEST:
-                func = FUNC_MAP[request.typ]
-                lines.extend(func(request))
-                last = request.data
+                _events.insert(0, request)
             request = None
         elif event.typ == EV_REQUEST:
             request = event
             continue
-        func = FUNC_MAP[event.typ]
-        lines.extend(func(event))
-        last = event.typ
-    return "\n".join(lines)
+
+        for _event in _events:
+            lines = _event.render('display', _display)
+            if not lines:
+                continue
+            if _event.typ == EV_CONDITION:
+                if not in_list:
+                    in_list = True
+                    yield '<ul>'
+            elif in_list:
+                in_list = False
+                yield '</ul>'
+            for line in lines:
+                yield line
+
+    if in_list:
+        yield '</ul>'
+
+
+def display(events):
+    return "\n".join(iter_display(events))
@@ -7,6 +7,7 @@ from otest.check import ERROR
 from otest.events import EV_CONDITION
 from otest.events import EV_HTTP_INFO
 from otest.events import EV_REQUEST
+from otest.rp.jwks import JWKS_CACHE
 
 from future.backports.urllib.parse import parse_qs
 
@@ -47,6 +48,11 @@ def wsgi_wrapper(environ, func, events, **kwargs):
         raise
 
 
+def is_jwks(path):
+    _name = os.path.basename(path)
+    return _name.startswith('jwks') and _name.endswith('.json')
+
+
 # noinspection PyUnresolvedReferences
 def static_mime(path, environ, start_response):
     logger.info("[static]sending: %s" % (path,))
@@ -59,7 +65,9 @@ def static_mime(path, environ, start_response):
     content_type = mimetypes.types_map.get(ext, None)
 
     try:
-        if not content_type.startswith('image/'):
+        if is_jwks(path):
+            data = JWKS_CACHE.file(path)
+        elif not content_type.startswith('image/'):
             data = open(path, 'r').read()
         else:
             data = open(path, 'rb').read()
@@ -8,6 +8,8 @@ from otest.check import OK
 from otest.check import WARNING
 from otest.check import INCOMPLETE
 from otest.handling import InfoHandling
+from otest.handling import respond_with_trace
+from otest.rp.display import iter_display
 
 __author__ = 'roland'
 
@@ -58,21 +60,37 @@ class WebIh(InfoHandling):
         argv.update(kwargs)
         return resp(self.environ, self.start_response, **argv)
 
-    def test_info(self, testid):
+    def test_info(self, testid, page=None):
+        """
+        :param testid: Test ID
+        :param page: If given, only this page of the trace is shown
+        """
         resp = Response(mako_template="testinfo.mako",
                         template_lookup=self.lookup,
                         headers=[])
 
         info = self.flows.test_info[testid]
+        _page = info["events"].page(page or 0)
+        if page is not None and not 0 <= page < _page.pages:
+            return self.not_found()
 
         argv = {
             "profile": info["profile_info"],
             "events": info["events"],
             "result": info['result'],
             "base": self.base_url,
+            "page": _page
         }
 
-        return resp(self.environ, self.start_response, **argv)
+        if not self.stream_trace:
+            return resp(self.environ, self.start_response, **argv)
+
+        if page is None:
+            _trace = iter_display(info["events"])
+        else:
+            _trace = iter_display(_page)
+        return respond_with_trace(resp, self.environ, self.start_response,
+                                  _trace, **argv)
 
     def not_found(self):
         """Called if no URL matches."""
@@ -0,0 +1,241 @@
+"""
+    Key material and JWKS documents for the test OP
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    KeyPool generates RSA, EC and symmetric key material in a worker thread
+    so that tests that rotate keys don't have to wait for, in particular,
+    RSA key generation.
+
+    JWKSCache keeps serialized JWKS documents, keyed on a fingerprint of
+    the set of keys they were made from, and the content of JWKS files
+    keyed on file modification time and size.
+
+    :copyright: (c) 2016 by Roland Hedberg.
+    :license: APACHE 2.0, see LICENSE for more details.
+"""
+import logging
+import os
+import threading
+from collections import deque
+from collections import OrderedDict
+
+from Cryptodome.PublicKey import RSA
+from jwkest.ecc import P256
+from jwkest.jwk import ECKey
+from jwkest.jwk import RSAKey
+from jwkest.jwk import SYMKey
+
+__author__ = 'roland'
+
+logger = logging.getLogger(__name__)
+
+KEY_TYPES = ['RSA', 'EC', 'oct']
+
+
+class KeyPool(object):
+    def __init__(self, depth=2, rsa_size=2048, curve=P256, sym_size=32):
+        """
+        :param depth: How many keys of each type to have ready
+        :param rsa_size: Size of RSA keys in bits
+        :param curve: The curve EC keys are on
+        :param sym_size: Size of symmetric keys in bytes
+        """
+        self.depth = depth
+        self.rsa_size = rsa_size
+        self.curve = curve
+        self.sym_size = sym_size
+        self._pool = dict([(kty, deque()) for kty in KEY_TYPES])
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stop = False
+        # key type -> number of keys that had to be made on demand
+        self.misses = dict([(kty, 0) for kty in KEY_TYPES])
+
+    def _make(self, kty):
+        if kty == 'RSA':
+            return RSA.generate(self.rsa_size)
+        elif kty == 'EC':
+            return self.curve.key_pair()
+        elif kty == 'oct':
+            return os.urandom(self.sym_size)
+        else:
+            raise ValueError('Unknown key type: {}'.format(kty))
+
+    def _wanted(self):
+        for kty in KEY_TYPES:
+            if len(self._pool[kty]) < self.depth:
+                return kty
+        return None
+
+    def _fill(self):
+        while True:
+            with self._cond:
+                kty = self._wanted()
+                while kty is None and not self._stop:
+                    self._cond.wait()
+                    kty = self._wanted()
+                if self._stop:
+                    return
+
+            try:
+                _mtrl = self._make(kty)
+            except Exception as err:
+                logger.error('Key generation failed: {}'.format(err))
+                return
+
+            with self._cond:
+                self._pool[kty].append(_mtrl)
+
+    def start(self):
+        """
+        Start the worker thread, if it's not already running.
+        """
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop = False
+            self._thread = threading.Thread(target=self._fill,
+                                            name='otest-key-pool')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+
+    def material(self, kty):
+        """
+        Get new key material. If none is ready it's made on demand.
+
+        :param kty: Key type, one of 'RSA', 'EC' and 'oct'
+        :return: RSA key, EC key pair or bytes depending on key type
+        """
+        self.start()
+        with self._cond:
+            try:
+                _mtrl = self._pool[kty].popleft()
+            except KeyError:
+                raise ValueError('Unknown key type: {}'.format(kty))
+            except IndexError:
+                _mtrl = None
+                self.misses[kty] += 1
+            # Time to make some more
+            self._cond.notify_all()
+
+        if _mtrl is None:
+            _mtrl = self._make(kty)
+        return _mtrl
+
+    def new_key(self, kty, use='', kid=''):
+        """
+        Get a new key.
+
+        :param kty: Key type, one of 'RSA', 'EC' and 'oct'
+        :param use: Key usage
+        :param kid: Key ID
+        :return: A jwkest.jwk.Key instance
+        """
+        _mtrl = self.material(kty)
+        if kty == 'RSA':
+            return RSAKey(kid=kid, use=use).load_key(_mtrl)
+        elif kty == 'EC':
+            _key = ECKey(kid=kid, use=use, curve=self.curve)
+            _key.d, (_key.x, _key.y) = _mtrl
+            return _key
+        else:
+            return SYMKey(kid=kid, use=use, key=_mtrl)
+
+    def ready(self):
+        """
+        :return: Dictionary with key type as key and the number of keys that
+            are ready as value
+        """
+        with self._cond:
+            return dict([(kty, len(q)) for kty, q in self._pool.items()])
+
+
+def fingerprint(keys):
+    """
+    Fingerprint of a set of keys. Keys that are changed in place, apart from
+    key ID, usage and being made inactive, must be replaced, not modified.
+
+    :param keys: list of jwkest.jwk.Key instances
+    :return: A hashable fingerprint
+    """
+    return tuple(
+        (id(k), k.kty, k.kid, k.use, k.inactive_since) for k in keys)
+
+
+class JWKSCache(object):
+    def __init__(self, size=256):
+        """
+        :param size: Max number of documents to keep
+        """
+        self.size = size
+        self._docs = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key):
+        with self._lock:
+            try:
+                _val = self._docs.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            self._docs[key] = _val
+            self.hits += 1
+            return _val
+
+    def _put(self, key, val):
+        with self._lock:
+            self._docs[key] = val
+            while len(self._docs) > self.size:
+                self._docs.popitem(last=False)
+
+    def get(self, keys, make, *extra):
+        """
+        Get a document made from a set of keys.
+
+        :param keys: The keys the document is made from
+        :param make: Function that makes the document, called with no
+            arguments if the document isn't cached. What's returned must
+            not be modified by the caller.
+        :param extra: Anything else the document depends on
+        :return: The document
+        """
+        key = (fingerprint(keys),) + extra
+        _val = self._get(key)
+        if _val is None:
+            # The keys are kept so their ids can't be reused while
+            # the document is cached
+            _val = (list(keys), make())
+            self._put(key, _val)
+        return _val[1]
+
+    def file(self, path):
+        """
+        Get the content of a JWKS file.
+
+        :param path: Path to the file
+        :return: The file content as text
+        """
+        _stat = os.stat(path)
+        key = ('file', path, _stat.st_mtime, _stat.st_size)
+        _val = self._get(key)
+        if _val is None:
+            with open(path, 'r') as fp:
+                _val = fp.read()
+            self._put(key, _val)
+        return _val
+
+    def clear(self):
+        with self._lock:
+            self._docs = OrderedDict()
+
+
+# Shared by all Provider instances
+KEY_POOL = KeyPool()
+JWKS_CACHE = JWKSCache()
@@ -0,0 +1,183 @@
+"""
+    Parallel key bootstrap
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Does what oic.utils.keyio.build_keyjar does but the keys for the
+    different key specifications are made in a process pool. The result is
+    stored in a local key cache keyed on a hash of the key configuration,
+    so a restart reuses the keys instead of making new ones.
+
+    The cache holds private keys, cache files are only readable by the
+    owner.
+
+    :copyright: (c) 2016 by Roland Hedberg.
+    :license: APACHE 2.0, see LICENSE for more details.
+"""
+import copy
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from oic.utils.keyio import KeyBundle
+from oic.utils.keyio import KeyJar
+from oic.utils.keyio import build_keyjar
+
+__author__ = 'roland'
+
+logger = logging.getLogger(__name__)
+
+KEY_CACHE_DIR = 'key_cache'
+
+
+def config_hash(key_conf, kid_template=''):
+    """
+    :param key_conf: The key configuration
+    :param kid_template: A template by which to build the kids
+    :return: Hex digest
+    """
+    _info = json.dumps({'keys': key_conf, 'kid_template': kid_template},
+                       sort_keys=True)
+    return hashlib.sha256(_info.encode('utf-8')).hexdigest()
+
+
+def _key_files(key_conf):
+    """
+    The key files the key configuration refers to and their modification
+    time and size. A key file that is replaced invalidates the cache.
+    """
+    res = {}
+    for spec in key_conf:
+        try:
+            path = spec['key']
+        except KeyError:
+            continue
+        try:
+            _stat = os.stat(path)
+        except OSError:
+            res[path] = None
+        else:
+            res[path] = [_stat.st_mtime, _stat.st_size]
+    return res
+
+
+def spec_keys(spec):
+    """
+    Make the keys for one key specification. Run in a worker process.
+
+    :param spec: A key specification
+    :return: list of private keys as dictionaries
+    """
+    _jwks, keyjar, _kidd = build_keyjar([spec])
+    return [k.serialize(private=True) for k in keyjar.get_issuer_keys('')]
+
+
+class KeyCache(object):
+    def __init__(self, cache_dir=KEY_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, '{}.json'.format(key))
+
+    def load(self, key, key_conf):
+        """
+        :param key: The configuration hash
+        :param key_conf: The key configuration
+        :return: list of list of keys as dictionaries, one list per key
+            specification, or None if there is nothing usable in the cache
+        """
+        try:
+            with open(self._path(key), 'r') as fp:
+                _info = json.load(fp)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if _info.get('files') != _key_files(key_conf):
+            logger.info('Key files changed, not using cached keys')
+            return None
+        return _info['keys']
+
+    def store(self, key, key_conf, keys):
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+        path = self._path(key)
+        tmp = path + '.tmp'
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as fp:
+            json.dump({'keys': keys, 'files': _key_files(key_conf)}, fp)
+        os.rename(tmp, path)
+
+
+def make_keys(key_conf, processes=None):
+    """
+    Make the keys for all key specifications.
+
+    :param key_conf: The key configuration
+    :param processes: Max number of worker processes, None means as many
+        as there are CPUs
+    :return: list of list of keys as dictionaries, one list per key
+        specification
+    """
+    # build_keyjar may add things to a specification
+    _conf = copy.deepcopy(key_conf)
+    if len(_conf) <= 1 or processes == 1:
+        return [spec_keys(spec) for spec in _conf]
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(spec_keys, _conf))
+
+
+def bootstrap_keys(key_conf, kid_template="", keyjar=None, kidd=None,
+                   cache_dir=KEY_CACHE_DIR, processes=None):
+    """
+    Same as oic.utils.keyio.build_keyjar but with the keys made in parallel
+    and cached.
+
+    :param key_conf: The key configuration
+    :param kid_template: A template by which to build the kids
+    :param keyjar: KeyJar instance the keys should be added to
+    :param kidd: Which kids that can be used for what
+    :param cache_dir: Where the key cache is, None means no caching
+    :param processes: Max number of worker processes
+    :return: a tuple consisting of a JWKS dictionary, a KeyJar instance
+        and a representation of which kids that can be used for what.
+    """
+    if keyjar is None:
+        keyjar = KeyJar()
+
+    if kidd is None:
+        kidd = {"sig": {}, "enc": {}}
+
+    _keys = None
+    if cache_dir:
+        cache = KeyCache(cache_dir)
+        _hash = config_hash(key_conf, kid_template)
+        _keys = cache.load(_hash, key_conf)
+
+    if _keys is None:
+        _keys = make_keys(key_conf, processes)
+        if cache_dir:
+            cache.store(_hash, key_conf, _keys)
+    else:
+        logger.info('Using cached keys')
+
+    kid = 0
+    jwks = {"keys": []}
+    for _kl in _keys:
+        kb = KeyBundle(_kl)
+        for k in kb.keys():
+            if kid_template:
+                k.kid = kid_template % kid
+                kid += 1
+            else:
+                k.add_kid()
+            kidd[k.use][k.kty] = k.kid
+
+        jwks["keys"].extend(
+            [k.serialize() for k in kb.keys() if k.kty != 'oct'])
+
+        keyjar.add_kb("", kb)
+
+    return jwks, keyjar, kidd
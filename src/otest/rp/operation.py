@@ -1,7 +1,5 @@
 import copy
-import inspect
 import logging
-import sys
 
 from future.backports.http.cookies import CookieError
 from future.backports.http.cookies import SimpleCookie
@@ -22,6 +20,7 @@ from otest.events import EV_RUN
 from otest.events import EV_PROTOCOL_RESPONSE
 from otest.events import EV_REDIRECT_URL
 from otest.events import EV_REQUEST
+from otest.registry import OPERATIONS
 from otest.rp.response import Response
 from otest.verify import Verify
 
@@ -259,7 +258,4 @@ class UserInfoResponse(Response):
 
 
 def factory(name):
-    for fname, obj in inspect.getmembers(sys.modules[__name__]):
-        if inspect.isclass(obj):
-            if name == fname:
-                return obj
+    return OPERATIONS.lookup(__name__, name)
@@ -2,22 +2,27 @@ import json
 import time
 from future.backports.urllib.parse import parse_qs
 
-from Cryptodome.PublicKey import RSA
-from jwkest.ecc import P256
-from jwkest.jwk import RSAKey
-from jwkest.jwk import ECKey
 from jwkest.jwk import SYMKey
 from oic.extension import provider
 from oic.extension.client import RegistrationRequest
 from oic.oauth2.message import AccessTokenRequest
 from oic.oauth2.message import ASConfigurationResponse
+from oic.utils.keyio import KeyBundle
 from oic.utils.keyio import keyjar_init
 
+from otest.checkpoint import keyjar_state
+from otest.checkpoint import restore_keyjar
 from otest.events import EV_PROTOCOL_REQUEST
 from otest.events import EV_HTTP_RESPONSE
+from otest.rp.jwks import JWKS_CACHE
+from otest.rp.jwks import KEY_POOL
 
 __author__ = 'roland'
 
+# Provider attributes that are part of the provider state, see export_state
+STATE_ATTRIBUTES = ['claims_type', 'strict', 'update_key_use',
+                    'claim_access_token']
+
 
 class TestError(Exception):
     pass
@@ -37,7 +42,8 @@ class Provider(provider.Provider):
                  client_authn, symkey, urlmap=None, ca_certs="", keyjar=None,
                  hostname="", template_lookup=None, template=None,
                  verify_ssl=True, capabilities=None, event_db=None,
-                 config=None, **kwargs):
+                 config=None, key_pool=KEY_POOL, jwks_cache=JWKS_CACHE,
+                 **kwargs):
 
         provider.Provider.__init__(
             self, name, sdb, cdb, authn_broker, authz=authz,
@@ -57,6 +63,10 @@ class Provider(provider.Provider):
         self.template_lookup = template_lookup
         self.template = template
         self.strict = False
+        self.key_pool = key_pool
+        self.jwks_cache = jwks_cache
+        # Clients registered with this instance
+        self.client_ids = []
 
     def create_providerinfo(self, pcr_class=ASConfigurationResponse,
                             setup=None):
@@ -102,11 +112,11 @@ class Provider(provider.Provider):
             self, request=request, authn=authn, **kwargs)
 
         self.init_keys = []
-        if "jwks_uri" in reg_req:
-            if _response.status == "200 OK":
-                # find the client id
-                req_resp = ASConfigurationResponse().from_json(
-                    _response.message)
+        if _response.status == "200 OK":
+            # find the client id
+            req_resp = ASConfigurationResponse().from_json(_response.message)
+            self.client_ids.append(req_resp["client_id"])
+            if "jwks_uri" in reg_req:
                 for kb in self.keyjar[req_resp["client_id"]]:
                     if kb.imp_jwks:
                         self.trace.info("Client JWKS: {}".format(kb.imp_jwks))
@@ -155,38 +165,44 @@ class Provider(provider.Provider):
         return _response
 
     def generate_jwks(self, mode):
+        _keys = [k for kb in self.keyjar[""] for k in list(kb.keys())]
+
         if "rotenc" in self.behavior_type:  # Rollover encryption keys
-            rsa_key = RSAKey(kid="rotated_rsa_{}".format(time.time()),
-                             use="enc").load_key(RSA.generate(2048))
-            ec_key = ECKey(kid="rotated_ec_{}".format(time.time()),
-                           use="enc").load_key(P256)
+            rsa_key = self.key_pool.new_key(
+                'RSA', use="enc", kid="rotated_rsa_{}".format(time.time()))
+            ec_key = self.key_pool.new_key(
+                'EC', use="enc", kid="rotated_ec_{}".format(time.time()))
 
             keys = [rsa_key.serialize(private=True),
                     ec_key.serialize(private=True)]
             new_keys = {"keys": keys}
             #self.do_key_rollover(new_keys, "%d")
 
-            signing_keys = [k.to_dict() for k in self.keyjar.get_signing_key()]
-            new_keys["keys"].extend(signing_keys)
+            signing_keys = self.keyjar.get_signing_key()
+            new_keys["keys"].extend(self.jwks_cache.get(
+                signing_keys, lambda: [k.to_dict() for k in signing_keys],
+                'sig'))
             return json.dumps(new_keys)
         elif "nokid1jwk" in self.behavior_type:
             alg = mode["sign_alg"]
             if not alg:
                 alg = "RS256"
-            keys = [k.to_dict() for kb in self.keyjar[""] for k in
-                    list(kb.keys())]
-            for key in keys:
-                if key["use"] == "sig" and key["kty"].startswith(alg[:2]):
-                    key.pop("kid", None)
-                    jwk = dict(keys=[key])
-                    return json.dumps(jwk)
-            raise Exception(
-                "Did not find sig {} key for nokid1jwk test ".format(alg))
+            return self.jwks_cache.get(
+                _keys, lambda: self._nokid1jwk(_keys, alg), 'nokid1jwk', alg)
         else:  # Return all keys
-            keys = [k.to_dict() for kb in self.keyjar[""] for k in
-                    list(kb.keys())]
-            jwks = dict(keys=keys)
-            return json.dumps(jwks)
+            return self.jwks_cache.get(
+                _keys, lambda: json.dumps(
+                    dict(keys=[k.to_dict() for k in _keys])))
+
+    @staticmethod
+    def _nokid1jwk(keys, alg):
+        for key in [k.to_dict() for k in keys]:
+            if key["use"] == "sig" and key["kty"].startswith(alg[:2]):
+                key.pop("kid", None)
+                jwk = dict(keys=[key])
+                return json.dumps(jwk)
+        raise Exception(
+            "Did not find sig {} key for nokid1jwk test ".format(alg))
 
     def _update_client_keys(self, client_id):
         if "updkeys" in self.behavior_type:
@@ -227,6 +243,60 @@ class Provider(provider.Provider):
                                       "{} changed, {} same".format(
                                           len(self.init_keys) - same, same))
 
+    def _client_sessions(self):
+        try:
+            _db = self.sdb._db
+        except AttributeError:
+            return {}
+        return dict([(sid, info) for sid, info in _db.items()
+                     if info.get('client_id') in self.client_ids])
+
+    def export_state(self):
+        """
+        The state that is specific to the test session: behaviour, the
+        registered clients with their keys and the authorization sessions
+        of those clients. Used by otest.checkpoint.
+
+        :return: Dictionary
+        """
+        state = dict([(attr, getattr(self, attr))
+                      for attr in STATE_ATTRIBUTES])
+        state['behavior_type'] = list(self.behavior_type)
+        state['init_keys'] = [k.serialize(private=True)
+                              for k in self.init_keys]
+        state['clients'] = dict([(cid, self.cdb[cid])
+                                 for cid in self.client_ids
+                                 if cid in self.cdb])
+        state['keyjar'] = keyjar_state(self.keyjar, self.client_ids)
+
+        sessions = self._client_sessions()
+        state['sessions'] = sessions
+        state['uid2sid'] = {}
+        for uid, sids in getattr(self.sdb, 'uid2sid', {}).items():
+            _sids = [sid for sid in sids if sid in sessions]
+            if _sids:
+                state['uid2sid'][uid] = _sids
+        return state
+
+    def import_state(self, state):
+        """
+        Restore what export_state returned.
+        """
+        for attr in STATE_ATTRIBUTES:
+            setattr(self, attr, state[attr])
+        # Shared with the server instance
+        self.behavior_type[:] = state['behavior_type']
+        self.init_keys = KeyBundle(state['init_keys']).keys()
+        self.client_ids = list(state['clients'].keys())
+        self.cdb.update(state['clients'])
+        restore_keyjar(self.keyjar, state['keyjar'])
+
+        if state['sessions']:
+            self.sdb._db.update(state['sessions'])
+            for uid, sids in state['uid2sid'].items():
+                _sids = self.sdb.uid2sid.setdefault(uid, [])
+                _sids.extend([sid for sid in sids if sid not in _sids])
+
     def __setattr__(self, key, value):
         if key == "keys":
             # Update the keyjar instead of just storing the keys description
@@ -13,6 +13,8 @@ from oic.utils.sdb import SessionDB
 from oic.utils.userinfo import UserInfo
 
 from otest.events import Events
+from otest.rp.key_setup import KEY_CACHE_DIR
+from otest.rp.key_setup import bootstrap_keys
 from otest.rp.provider import Provider
 
 logger = logging.getLogger(__name__)
@@ -219,7 +221,12 @@ def main_setup(args, lookup, config):
     logger.info('setup kwargs: {}'.format(kwargs))
 
     try:
-        op_arg["marg"] = multi_keys(as_args, config.multi_keys)
+        _cache_dir = config.KEY_CACHE_DIR
+    except AttributeError:
+        _cache_dir = KEY_CACHE_DIR
+
+    try:
+        op_arg["marg"] = multi_keys(as_args, config.multi_keys, _cache_dir)
     except AttributeError as err:
         pass
 
@@ -241,9 +248,14 @@ def main_setup(args, lookup, config):
     return as_args, op_arg, config
 
 
-def multi_keys(as_args, key_conf):
+def multi_keys(as_args, key_conf, cache_dir=KEY_CACHE_DIR):
+    """
+    The keys are made in parallel and cached in cache_dir, see
+    otest.rp.key_setup.
+    """
     # a throw-away OP used to do the initial key setup
     _op = Provider(**as_args)
-    jwks = keyjar_init(_op, key_conf, "m%d")
+    jwks, _op.keyjar, _op.kid = bootstrap_keys(
+        key_conf, "m%d", _op.keyjar, _op.kid, cache_dir=cache_dir)
 
     return {"jwks": jwks, "keys": key_conf}
@@ -23,6 +23,8 @@ from otest.events import EV_REQUEST
 from otest.events import EV_RESPONSE
 from otest.result import Result
 from otest.result import safe_path
+from otest.result import safe_url
+from otest.summation import verdict
 from otest.verify import Verify
 
 logger = logging.getLogger(__name__)
@@ -45,6 +47,11 @@ class WebTester(tool.Tester):
         except (AttributeError, KeyError):
             return safe_path('dummy', _pname, test_id)
 
+    def journal_key(self):
+        # Many RPs are tested at the same time, each in its own session
+        return [safe_url(self.sh['test_conf']['start_page']),
+                self.sh['sid'], self.sh.profile]
+
     def match_profile(self, test_id, **kwargs):
         _spec = self.flows[test_id]
         # There must be an intersection between the two profile lists.
@@ -59,22 +66,39 @@ class WebTester(tool.Tester):
 
         self.sh.session_setup(path=test_id)
         _flow = self.flows[test_id]
+        _ent = self.make_provider(kw_args['sid'], **kw_args)
+        self.conv = Conversation(_flow, _ent,
+                                 msg_factory=kw_args["msg_factory"])
+        self.conv.events.journal = self.journal(test_id)
+        self.conv.sequence = self.sh["sequence"]
+        _ent.conv = self.conv
+        _ent.events = self.conv.events
+        self.sh["conv"] = self.conv
+        return True
+
+    def make_provider(self, sid, **kw_args):
         try:
             _cap = kw_args['op_profiles'][self.sh['test_conf']['profile']]
         except KeyError:
             _cap = None
         _ent = self.provider_cls(capabilities=_cap, **kw_args['as_args'])
-        _ent.baseurl = os.path.join(_ent.baseurl, kw_args['sid'])
+        _ent.baseurl = os.path.join(_ent.baseurl, sid)
         _ent.jwks_uri = os.path.join(_ent.baseurl,
                                      kw_args['as_args']['jwks_name'])
         _ent.name = _ent.baseurl
-        self.conv = Conversation(_flow, _ent,
-                                 msg_factory=kw_args["msg_factory"])
-        self.conv.sequence = self.sh["sequence"]
-        _ent.conv = self.conv
-        _ent.events = self.conv.events
-        self.sh["conv"] = self.conv
-        return True
+        return _ent
+
+    def restore_conversation(self, conv, **kw_args):
+        """
+        Give a conversation restored from a session store, see
+        otest.session_store, a new provider instance.
+        """
+        _ent = self.make_provider(self.sh['sid'], **kw_args)
+        conv.entity = _ent
+        conv.msg_factory = kw_args["msg_factory"]
+        _ent.conv = conv
+        _ent.events = conv.events
+        self.conv = conv
 
     def run(self, test_id, **kw_args):
         if not self.setup(test_id, **kw_args):
@@ -281,13 +305,7 @@ class WebTester(tool.Tester):
             self.store_result()
             return resp
 
-        _done = False
-        for _cond in self.conv.events.get_data(EV_CONDITION):
-            if _cond.test_id == 'Done' and _cond.status == OK:
-                _done = True
-                break
-
-        if not _done:
+        if OK not in verdict(self.conv.events).done:
             self.conv.events.store(EV_CONDITION, State('Done', OK),
                                    sender='do_next')
 
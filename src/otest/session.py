@@ -2,6 +2,9 @@ import copy
 import logging
 
 from otest import Done
+from otest.checkpoint import Checkpoint
+from otest.checkpoint import restore_entity
+from otest.conversation import Conversation
 from otest.parse_cnf import sort
 
 __author__ = 'roland'
@@ -45,6 +48,7 @@ class SessionHandler(object):
         self.extra = kwargs
         self.tool_version = tool_version
         self._dict = {}
+        self._checkpoint = None
 
     @property
     def profile(self):
@@ -93,11 +97,92 @@ class SessionHandler(object):
         else:
             return False
 
-    def dump(self, filename):
-        pass
-
-    def load(self, filename):
-        pass
+    def copy(self, flows=None):
+        """
+        A session handler with the same configuration and session
+        information but that can be changed independently of this one.
+
+        :param flows: Flows to use instead of the ones this instance uses
+        :return: SessionHandler instance
+        """
+        _sh = copy.copy(self)
+        _sh._dict = dict(self._dict)
+        _sh._checkpoint = None
+        if flows is not None:
+            _sh.test_flows = flows
+        return _sh
+
+    def take_over(self, other):
+        """
+        Take over the session information from a copy, see copy(). Used
+        when a test that was run with a copy is to be continued with this
+        instance.
+
+        :param other: SessionHandler instance
+        """
+        self._dict = dict(other._dict)
+
+    def export_state(self):
+        """
+        The information that is specific to this session in a form that
+        can be serialized. The configuration (flows, order, extra) is not
+        included, it's the same for all sessions.
+
+        :return: Dictionary
+        """
+        state = {'tool_version': self.tool_version, 'dict': {}}
+        for key, val in self._dict.items():
+            if key == 'conv':
+                state['conv'] = val.export_state()
+            else:
+                state['dict'][key] = val
+        return state
+
+    def import_state(self, state, restore_conversation=None):
+        """
+        Replace the session information with what export_state returned.
+
+        :param state: The session state
+        :param restore_conversation: Function that given this instance and
+            a Conversation restored without an entity finishes the
+            restoration, typically by attaching a new entity. If the state
+            contains entity state, from a checkpoint, it's restored into
+            that entity.
+        """
+        self._dict = dict(state['dict'])
+        try:
+            _conv = state['conv']
+        except KeyError:
+            pass
+        else:
+            conv = Conversation.from_state(_conv)
+            self._dict['conv'] = conv
+            if restore_conversation:
+                restore_conversation(self, conv)
+            if 'entity' in _conv and conv.entity is not None:
+                restore_entity(conv.entity, _conv['entity'])
+
+    def dump(self, filename, delta=True):
+        """
+        Checkpoint the session, see otest.checkpoint.
+
+        :param filename: The checkpoint file
+        :param delta: If this session was checkpointed to the same file
+            before, only write what has changed since then.
+        """
+        if self._checkpoint is None or self._checkpoint.filename != filename:
+            self._checkpoint = Checkpoint(filename)
+        self._checkpoint.dump(self, delta)
+
+    def load(self, filename, restore_conversation=None):
+        """
+        Restore the session from a checkpoint.
+
+        :param filename: The checkpoint file
+        :param restore_conversation: See import_state
+        """
+        self.import_state(Checkpoint(filename).load(), restore_conversation)
+        self._checkpoint = None
 
     def keys(self):
         return self._dict.keys()
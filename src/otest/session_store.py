@@ -0,0 +1,372 @@
+"""
+    Session stores
+    ~~~~~~~~~~~~~~
+
+    Where a test tool keeps its SessionHandler instances, keyed on session
+    ID, between requests.
+
+    MemoryStore keeps the instances in the process. SQLiteStore and
+    FileStore keep them serialized, by a SessionCodec, so that several
+    worker processes behind one port can serve the same session and
+    sessions survive a restart. A FileStore with its directory on a
+    memory backed file system (like /dev/shm) is a shared memory store.
+
+    All stores expire sessions that have not been used for a while.
+
+    :copyright: (c) 2016 by Roland Hedberg.
+    :license: APACHE 2.0, see LICENSE for more details.
+"""
+import logging
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from otest.checkpoint import entity_state
+from otest.checkpoint import portable_event
+
+__author__ = 'roland'
+
+logger = logging.getLogger(__name__)
+
+# Sessions not used for this many seconds are removed
+DEFAULT_TTL = 24 * 3600
+# How often, in number of stored sessions, expired sessions are removed
+SWEEP_INTERVAL = 100
+
+SID_PAT = re.compile('^[A-Za-z0-9_-]+$')
+
+
+class SessionStoreError(Exception):
+    pass
+
+
+class SessionCodec(object):
+    """
+    Serializes the state of a SessionHandler, including the Conversation
+    and the state of its entity, see SessionHandler.export_state and
+    otest.checkpoint.entity_state. The entity itself is recreated by
+    restore_conversation when the session is loaded.
+    """
+    version = 1
+
+    def __init__(self, make_handler, restore_conversation=None):
+        """
+        :param make_handler: Function that returns a new SessionHandler
+            instance with the tool configuration
+        :param restore_conversation: Passed on to
+            SessionHandler.import_state
+        """
+        self.make_handler = make_handler
+        self.restore_conversation = restore_conversation
+
+    def dumps(self, sh):
+        """
+        :param sh: SessionHandler instance
+        :return: bytes
+        """
+        state = sh.export_state()
+        if 'conv' in state and sh['conv'].entity is not None:
+            # Client registrations, keys and so on. Another process doesn't
+            # share the entity this one has.
+            state['conv']['entity'] = entity_state(sh['conv'].entity)
+        try:
+            data = pickle.dumps((self.version, state),
+                                pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            if 'conv' not in state:
+                raise
+            state['conv']['events'] = [portable_event(ev)
+                                       for ev in state['conv']['events']]
+            try:
+                data = pickle.dumps((self.version, state),
+                                    pickle.HIGHEST_PROTOCOL)
+            except Exception as err:
+                raise SessionStoreError(
+                    'Could not serialize session: {}'.format(err))
+        return zlib.compress(data)
+
+    def loads(self, data):
+        """
+        :param data: What dumps returned
+        :return: SessionHandler instance
+        """
+        try:
+            version, state = pickle.loads(zlib.decompress(data))
+        except Exception as err:
+            raise SessionStoreError(
+                'Could not deserialize session: {}'.format(err))
+
+        if version != self.version:
+            raise SessionStoreError(
+                'Unsupported session format version: {}'.format(version))
+
+        sh = self.make_handler()
+        sh.import_state(state, self.restore_conversation)
+        return sh
+
+
+class SessionStore(object):
+    def __init__(self, ttl=DEFAULT_TTL):
+        """
+        :param ttl: Number of seconds a session is kept after it was last
+            used
+        """
+        self.ttl = ttl
+        self._stored = 0
+
+    def get(self, sid, default=None):
+        raise NotImplementedError()
+
+    def set(self, sid, sh):
+        raise NotImplementedError()
+
+    def delete(self, sid):
+        raise NotImplementedError()
+
+    def expire(self):
+        """
+        Remove expired sessions.
+        """
+        raise NotImplementedError()
+
+    def _sweep(self):
+        self._stored += 1
+        if self._stored % SWEEP_INTERVAL == 0:
+            self.expire()
+
+    def __getitem__(self, sid):
+        sh = self.get(sid)
+        if sh is None:
+            raise KeyError(sid)
+        return sh
+
+    def __setitem__(self, sid, sh):
+        self.set(sid, sh)
+
+    def __delitem__(self, sid):
+        self.delete(sid)
+
+    def __contains__(self, sid):
+        return self.get(sid) is not None
+
+
+class MemoryStore(SessionStore):
+    """
+    Least recently used sessions are removed when there are more then
+    maxsize of them.
+    """
+
+    def __init__(self, maxsize=1000, ttl=DEFAULT_TTL):
+        SessionStore.__init__(self, ttl)
+        self.maxsize = maxsize
+        # sid -> (expires, session handler), least recently used first
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sid, default=None):
+        with self._lock:
+            try:
+                expires, sh = self._sessions.pop(sid)
+            except KeyError:
+                return default
+            if expires < time.time():
+                return default
+            self._sessions[sid] = (time.time() + self.ttl, sh)
+            return sh
+
+    def set(self, sid, sh):
+        with self._lock:
+            self._sessions.pop(sid, None)
+            self._sessions[sid] = (time.time() + self.ttl, sh)
+            while len(self._sessions) > self.maxsize:
+                self._sessions.popitem(last=False)
+        self._sweep()
+
+    def delete(self, sid):
+        with self._lock:
+            self._sessions.pop(sid, None)
+
+    def expire(self):
+        _now = time.time()
+        with self._lock:
+            # Least recently used first so the first one that hasn't expired
+            # ends the search
+            for sid, (expires, sh) in list(self._sessions.items()):
+                if expires >= _now:
+                    break
+                del self._sessions[sid]
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SQLiteStore(SessionStore):
+    def __init__(self, path, codec, ttl=DEFAULT_TTL):
+        """
+        :param path: The database file
+        :param codec: SessionCodec instance
+        """
+        SessionStore.__init__(self, ttl)
+        self.path = path
+        self.codec = codec
+        # sqlite3 connections can't be shared between threads
+        self._local = threading.local()
+        with self._db() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS session ('
+                       'sid TEXT PRIMARY KEY, expires REAL, data BLOB)')
+
+    def _db(self):
+        try:
+            return self._local.db
+        except AttributeError:
+            db = sqlite3.connect(self.path, timeout=30)
+            # Readers don't block writers and vice versa
+            db.execute('PRAGMA journal_mode=WAL')
+            self._local.db = db
+            return db
+
+    def get(self, sid, default=None):
+        row = self._db().execute(
+            'SELECT expires, data FROM session WHERE sid = ?',
+            (sid,)).fetchone()
+        if row is None or row[0] < time.time():
+            return default
+        return self.codec.loads(row[1])
+
+    def __contains__(self, sid):
+        row = self._db().execute(
+            'SELECT expires FROM session WHERE sid = ?', (sid,)).fetchone()
+        return row is not None and row[0] >= time.time()
+
+    def set(self, sid, sh):
+        data = self.codec.dumps(sh)
+        with self._db() as db:
+            db.execute(
+                'INSERT OR REPLACE INTO session (sid, expires, data) '
+                'VALUES (?, ?, ?)',
+                (sid, time.time() + self.ttl, sqlite3.Binary(data)))
+        self._sweep()
+
+    def delete(self, sid):
+        with self._db() as db:
+            db.execute('DELETE FROM session WHERE sid = ?', (sid,))
+
+    def expire(self):
+        with self._db() as db:
+            db.execute('DELETE FROM session WHERE expires < ?',
+                       (time.time(),))
+
+    def __len__(self):
+        return self._db().execute('SELECT COUNT(*) FROM session').fetchone()[0]
+
+
+class FileStore(SessionStore):
+    """
+    One file per session. The modification time of the file is when the
+    session was last stored.
+    """
+
+    def __init__(self, path, codec, ttl=DEFAULT_TTL):
+        """
+        :param path: The directory where the files are kept
+        :param codec: SessionCodec instance
+        """
+        SessionStore.__init__(self, ttl)
+        self.path = path
+        self.codec = codec
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def _file(self, sid):
+        if not SID_PAT.match(sid):
+            return None
+        return os.path.join(self.path, sid)
+
+    def get(self, sid, default=None):
+        fname = self._file(sid)
+        if fname is None:
+            return default
+        try:
+            if os.stat(fname).st_mtime + self.ttl < time.time():
+                return default
+            with open(fname, 'rb') as fp:
+                data = fp.read()
+        except (IOError, OSError):
+            return default
+        return self.codec.loads(data)
+
+    def __contains__(self, sid):
+        fname = self._file(sid)
+        if fname is None:
+            return False
+        try:
+            return os.stat(fname).st_mtime + self.ttl >= time.time()
+        except OSError:
+            return False
+
+    def set(self, sid, sh):
+        fname = self._file(sid)
+        if fname is None:
+            raise SessionStoreError('Bad session ID: {}'.format(sid))
+
+        data = self.codec.dumps(sh)
+        # Write and rename so readers never see a partial file
+        tmp = '{}.{}.{}.tmp'.format(fname, os.getpid(),
+                                    threading.current_thread().ident)
+        with open(tmp, 'wb') as fp:
+            fp.write(data)
+        os.rename(tmp, fname)
+        self._sweep()
+
+    def delete(self, sid):
+        fname = self._file(sid)
+        if fname is None:
+            return
+        try:
+            os.unlink(fname)
+        except OSError:
+            pass
+
+    def expire(self):
+        _limit = time.time() - self.ttl
+        for fname in os.listdir(self.path):
+            if fname.endswith('.tmp'):
+                continue
+            _path = os.path.join(self.path, fname)
+            try:
+                if os.stat(_path).st_mtime < _limit:
+                    os.unlink(_path)
+            except OSError:
+                pass
+
+    def __len__(self):
+        return len([f for f in os.listdir(self.path)
+                    if not f.endswith('.tmp')])
+
+
+def make_store(spec, codec=None, ttl=DEFAULT_TTL):
+    """
+    Create a session store given a specification like 'memory',
+    'sqlite:<database file>' or 'file:<directory>'.
+
+    :param spec: The store specification
+    :param codec: SessionCodec instance, needed by all but the memory store
+    :param ttl: Session time to live
+    :return: SessionStore instance
+    """
+    typ, _, arg = spec.partition(':')
+    if typ == 'memory':
+        if arg:
+            return MemoryStore(int(arg), ttl=ttl)
+        return MemoryStore(ttl=ttl)
+    elif typ == 'sqlite':
+        return SQLiteStore(arg, codec, ttl=ttl)
+    elif typ == 'file':
+        return FileStore(arg, codec, ttl=ttl)
+    else:
+        raise SessionStoreError('Unknown session store: {}'.format(spec))
@@ -1,31 +1,153 @@
 import json
 import os
-import tarfile
 
+from otest.archive import iter_archive
 from otest.check import CRITICAL
 from otest.check import ERROR
 from otest.check import INCOMPLETE
+from otest.check import INTERACTION
 from otest.check import OK
 from otest.check import STATUSCODE
 from otest.check import WARNING
 from otest.events import EV_CONDITION
 from otest.events import EV_FAULT
 from otest.events import layout
+from otest.result_writer import RESULT_WRITER
+from otest.result_writer import ensure_dir
 
 __author__ = 'roland'
 
 
+# A condition with one of these statuses stops the flow
+HALT = [CRITICAL, INTERACTION]
+
+
+def _message(item):
+    try:
+        return item.message
+    except AttributeError:
+        return '{}'.format(item)
+
+
+class Verdict(object):
+    """
+    The verdict of a test, accumulated as conditions and faults are
+    stored so that it never has to be computed by going through the
+    events.
+    """
+
+    def __init__(self):
+        self.complete = False
+        # Status of the Done conditions
+        self.done = set()
+        self.worst = None
+        self.faults = []
+        # Messages of conditions with status ERROR or CRITICAL
+        self.error_messages = []
+        # Non empty messages of conditions with status ERROR and WARNING
+        self.errors = []
+        self.warnings = []
+        # The last condition that stops the flow
+        self.halt = None
+
+    @classmethod
+    def from_events(cls, events):
+        _verdict = cls()
+        for event in events:
+            _verdict.add(event)
+        return _verdict
+
+    def add(self, event):
+        """
+        :param event: An otest.events.Event instance, anything but
+            conditions and faults is ignored
+        """
+        if event.typ == EV_CONDITION:
+            self.add_condition(event.data)
+        elif event.typ == EV_FAULT:
+            self.faults.append(_message(event.data))
+
+    def add_condition(self, state):
+        status = state.status
+        if self.worst is None or status > self.worst:
+            self.worst = status
+
+        if state.test_id == "Done":
+            self.done.add(status)
+            if status in [OK, ERROR]:
+                self.complete = True
+
+        if status in [ERROR, CRITICAL]:
+            self.error_messages.append(state.message)
+        if status == ERROR:
+            if state.message:
+                self.errors.append('{}'.format(state.message))
+        elif status == WARNING:
+            if state.message:
+                self.warnings.append('{}'.format(state.message))
+        elif status in HALT:
+            self.halt = state
+
+    @property
+    def state(self):
+        """
+        The state of the test is equal to the worst status encountered
+        """
+        if self.faults:
+            return ERROR  # Can't get worse
+
+        if self.complete:
+            res = OK
+        else:
+            res = INCOMPLETE
+
+        if self.worst is not None and self.worst > res:
+            res = self.worst
+        return res
+
+    @property
+    def result_code(self):
+        _state = self.state
+        if _state == INCOMPLETE:
+            return "PARTIAL RESULT"
+        elif _state < WARNING:
+            return "PASSED"
+        else:
+            return STATUSCODE[_state]
+
+
+def verdict(events):
+    """
+    The verdict of a test. It's attached to the Events instance the first
+    time it's asked for and then kept up to date as events are stored.
+
+    :param events: An otest.events.Events instance
+    :return: A Verdict instance
+    """
+    try:
+        _verdict = events.verdict
+    except AttributeError:
+        # Not an Events instance, nothing to attach it to
+        return Verdict.from_events(events)
+
+    if _verdict is None:
+        _verdict = Verdict.from_events(events)
+        events.verdict = _verdict
+    return _verdict
+
+
 def assert_summation(events, sid):
-    status = OK
+    _verdict = verdict(events)
     result = []
 
-    if events.get_data(EV_FAULT):
+    if _verdict.faults:
         status = ERROR
     else:
+        status = OK
+        if _verdict.worst is not None and _verdict.worst > status:
+            status = _verdict.worst
         for test_result in events.get_data(EV_CONDITION):
             result.append('{}'.format(test_result))
-            if test_result.status > status:
-                status = test_result.status
 
     info = {
         "id": sid,
@@ -42,11 +164,7 @@ def completed(events):
     :param events: An otest.events.Events instance
     :return: True/False
     """
-    for item in events.get_data(EV_CONDITION):
-        if item.test_id == "Done" and item.status in [OK, ERROR]:
-            return True
-
-    return False
+    return verdict(events).complete
 
 
 def eval_state(events):
@@ -55,44 +173,16 @@ def eval_state(events):
     :param events: An otest.events.Events instance
     :return: An integer representing a status code
     """
-    if completed(events):
-        res = OK
-    else:
-        res = INCOMPLETE
-
-    if events.get_data(EV_FAULT):
-        return ERROR  # Can't get worse
-
-    for state in events.get_data(EV_CONDITION):
-        if state.status > res:
-            res = state.status
-
-    return res
+    return verdict(events).state
 
 
 def get_errors(events):
-    res = []
-    for item in events.get_data(EV_FAULT):
-        res.append(item.message)
-
-    for item in events.get_data(EV_CONDITION):
-        if item.status in [ERROR, CRITICAL]:
-            res.append(item.message)
-
-    return '. '.join(res)
+    _verdict = verdict(events)
+    return '. '.join(_verdict.faults + _verdict.error_messages)
 
 
 def result_code(events):
-    _state = eval_state(events)
-    if _state == INCOMPLETE:
-        tag = "PARTIAL RESULT"
-    else:
-        if _state < WARNING:
-            tag = "PASSED"
-        else:
-            tag = STATUSCODE[_state]
-
-    return tag
+    return verdict(events).result_code
 
 
 def represent_result(events):
@@ -101,28 +191,17 @@ def represent_result(events):
     :param events: An otest.events.Events instance
     :return: A text string
     """
+    _verdict = verdict(events)
 
-    tag = result_code(events)
+    lines = [_verdict.result_code]
 
-    lines = [tag]
-
-    errors = []
-    warning = []
-    for state in events.get_data(EV_CONDITION):
-        if state.status == ERROR:
-            if state.message:
-                errors.append('{}'.format(state.message))
-        elif state.status == WARNING:
-            if state.message:
-                warning.append('{}'.format(state.message))
-
-    if errors:
+    if _verdict.errors:
         lines.append('Errors:')
-        lines.append("\n".join(errors))
+        lines.append("\n".join(_verdict.errors))
 
-    if warning:
+    if _verdict.warnings:
         lines.append('Warnings:')
-        lines.append("\n".join(warning))
+        lines.append("\n".join(_verdict.warnings))
 
     text = "\n".join(lines)
 
@@ -131,18 +210,28 @@ def represent_result(events):
 
 # -----------------------------------------------------------------------------
 
-def trace_output(events):
+def iter_trace_output(events):
     """
+    Render the trace one event at the time.
 
+    :param events: Anything that iterates over events, for instance an
+        otest.events.Events or an otest.journal.Journal instance
+    :return: generator of text lines
     """
     start = 0
-    element = ["Trace output\n"]
+    yield "Trace output\n"
     for event in events:
         if not start:
             start = event.timestamp
-        element.append(layout(start, event))
-    element.append("\n")
-    return element
+        yield layout(start, event)
+    yield "\n"
+
+
+def trace_output(events):
+    """
+
+    """
+    return list(iter_trace_output(events))
 
 
 def condition(events, html=False):
@@ -167,49 +256,18 @@ def pprint_json(json_txt):
     return json.dumps(_jso, sort_keys=True, indent=2, separators=(',', ': '))
 
 
-def mk_tar_dir(issuer, test_profile):
-    wd = os.getcwd()
-
-    # Make sure there is a tar directory
-    tardirname = wd
-    for part in ["tar", issuer, test_profile]:
-        tardirname = os.path.join(tardirname, part)
-        if not os.path.isdir(tardirname):
-            os.mkdir(tardirname)
-
-    # Now walk through the log directory and make symlinks from
-    # the log files to links in the tar directory
-    logdirname = os.path.join(wd, "log", issuer, test_profile)
-    for item in os.listdir(logdirname):
-        if item.startswith("."):
-            continue
-
-        ln = os.path.join(logdirname, item)
-        tn = os.path.join(tardirname, "{}.txt".format(item))
-
-        if os.path.isfile(tn):
-            os.unlink(tn)
-
-        if not os.path.islink(tn):
-            os.symlink(ln, tn)
-
-
-def create_tar_archive(issuer, test_profile):
-    mk_tar_dir(issuer, test_profile)
-
-    wd = os.getcwd()
-    _dir = os.path.join(wd, "tar", issuer)
-    os.chdir(_dir)
-
-    tar = tarfile.open("{}.tar".format(test_profile), "w")
-
-    for item in os.listdir(test_profile):
-        if item.startswith("."):
-            continue
-
-        fn = os.path.join(test_profile, item)
-
-        if os.path.isfile(fn):
-            tar.add(fn)
-    tar.close()
-    os.chdir(wd)
+def create_tar_archive(issuer, test_profile, writer=RESULT_WRITER):
+    """
+    Write an archive, tar/<issuer>/<test_profile>.tar, of the log files of
+    a profile.
+    """
+    _dir = os.path.join("tar", issuer)
+    ensure_dir(_dir)
+    path = os.path.join(_dir, "{}.tar".format(test_profile))
+
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp, 'wb') as fp:
+        for chunk in iter_archive(os.path.join("log", issuer, test_profile),
+                                  test_profile, writer=writer):
+            fp.write(chunk)
+    os.rename(tmp, path)
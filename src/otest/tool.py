@@ -1,5 +1,7 @@
 import logging
+import os
 
+from otest import aio
 from otest import ConditionError
 from otest import Done
 from otest import exception_trace
@@ -10,7 +12,11 @@ from otest.check import State
 from otest.conversation import Conversation
 from otest.events import EV_CONDITION
 from otest.events import EV_FAULT
+from otest.journal import FSYNC_BATCH
+from otest.journal import Journal
+from otest.journal import JOURNAL_EXT
 from otest.result import Result
+from otest.result import safe_url
 from otest.verify import Verify
 
 __author__ = 'roland'
@@ -65,6 +71,64 @@ class Tester(object):
         return self.map_prof(self.profile.split("."),
                              _spec["profile"].split("."))
 
+    def journal_key(self):
+        """
+        Who is tested, by whom and with which profile. The journals are
+        kept in the same layout as the log files.
+
+        :return: list of path components
+        """
+        return [safe_url(self.sh.iss), self.sh.tag, self.sh.profile]
+
+    def journal(self, test_id):
+        """
+        If a journal directory is configured, get a new journal for
+        the test. The journal of the previous test is closed.
+
+        A journal file is never reused, another Events instance may still
+        be writing to it. If the test has been run before the next free
+        name is picked, <test_id>.<n>.jnl.
+
+        :param test_id: The test ID
+        :return: otest.journal.Journal instance or None
+        """
+        self.close_journal()
+        try:
+            _dir = self.kwargs['journal_dir']
+        except KeyError:
+            return None
+
+        _dir = os.path.join(_dir, *['{}'.format(k) for k in
+                                    self.journal_key()])
+        if not os.path.isdir(_dir):
+            os.makedirs(_dir)
+
+        n = 0
+        while True:
+            if n:
+                name = '{}.{}.{}'.format(test_id, n, JOURNAL_EXT)
+            else:
+                name = '{}.{}'.format(test_id, JOURNAL_EXT)
+            path = os.path.join(_dir, name)
+            try:
+                # Claim the name, also against other processes
+                os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            except FileExistsError:
+                n += 1
+            else:
+                break
+
+        return Journal(path, fsync=self.kwargs.get('journal_fsync',
+                                                   FSYNC_BATCH))
+
+    def close_journal(self):
+        try:
+            _journal = self.conv.events.journal
+        except AttributeError:
+            return
+        if _journal is not None:
+            _journal.close()
+
     def setup(self, test_id, **kw_args):
         redirs = get_redirect_uris(kw_args['client_info'])
 
@@ -73,6 +137,7 @@ class Tester(object):
             **kw_args['client_info'])
         self.conv = Conversation(_flow, _cli, kw_args["msg_factory"],
                                  callback_uris=redirs)
+        self.conv.events.journal = self.journal(test_id)
         self.conv.entity_config = _cli_info
         self.conv.tool_config = kw_args['tool_conf']
         _cli.conv = self.conv
@@ -94,6 +159,28 @@ class Tester(object):
             self.store_result()
             return self.inut.err_response("run", err)
 
+    async def arun(self, test_id, **kw_args):
+        """
+        Async variant of run.
+        """
+        if not self.setup(test_id, **kw_args):
+            raise ConfigurationError()
+
+        try:
+            return await self.arun_flow(test_id, conf=kw_args['conf'])
+        except Exception as err:
+            exception_trace("", err, logger)
+            self.store_result()
+            return self.inut.err_response("run", err)
+
+    async def arun_flow(self, test_id, index=0, profiles=None, **kwargs):
+        """
+        Async variant of run_flow. Unless a subclass has an async
+        implementation run_flow is done in an executor.
+        """
+        return await aio.run_in_executor(self.run_flow, test_id, index=index,
+                                         profiles=profiles, **kwargs)
+
     def handle_response(self, resp, index, oper=None):
         return None
 
@@ -111,6 +198,8 @@ class Tester(object):
         if res is None:
             res = Result(self.sh, self.kwargs['profile_handler'])
         res.write_info(tinfo)
+        # Opened again if the test goes on
+        self.close_journal()
         return tinfo
 
     def run_flow(self, test_id, index=0, profiles=None, **kwargs):
@@ -1,15 +1,20 @@
+import copy
+import json
 import logging
 import sys
+import threading
 import traceback
 
+from concurrent.futures import ThreadPoolExecutor
+
 from otest import Break
 from otest import ConditionError
 from otest import exception_trace
-from otest.check import CRITICAL
-from otest.check import INTERACTION
 from otest.events import EV_ASSERTION
+from otest.events import EV_CACHED_RESULT
 from otest.events import EV_CONDITION
 from otest.events import EV_FAULT
+from otest.summation import HALT
 
 __author__ = 'roland'
 
@@ -21,11 +26,48 @@ LABELS = {
 }
 
 
+# Max number of pure checks run at the same time
+MAX_WORKERS = 4
+
+_EXECUTOR = None
+_executor_lock = threading.Lock()
+
+
+def check_executor():
+    """
+    The thread pool pure checks are run in, shared by all Verify instances.
+    """
+    global _EXECUTOR
+
+    with _executor_lock:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+    return _EXECUTOR
+
+
 class MissingTest(Exception):
     pass
 
 
+class ConversationView(object):
+    """
+    The conversation as pure checks see it. Everything is the conversation's
+    except the events which are a snapshot that doesn't change while the
+    checks are run.
+    """
+
+    def __init__(self, conv, events):
+        self._conv = conv
+        self.events = events
+
+    def __getattr__(self, item):
+        return getattr(self._conv, item)
+
+
 class Verify(object):
+    # Reuse the results of pure checks as long as the events haven't changed
+    memoize = True
+
     def __init__(self, check_factory, conv, cls_name=''):
         self.check_factory = check_factory
         self.ignore_check = []
@@ -34,7 +76,11 @@ class Verify(object):
         self.cls_name = cls_name
 
     def check_severity(self, stat):
-        if stat.status in [CRITICAL, INTERACTION]:
+        """
+        Stop the flow if the condition, that has just been stored, is one
+        that should stop it.
+        """
+        if stat.status in HALT:
             for attr, label in LABELS.items():
                 try:
                     _val = getattr(stat, attr)
@@ -54,30 +100,136 @@ class Verify(object):
             except KeyError:
                 pass
 
-    def do_check(self, test, **kwargs):
+    def make_check(self, test, **kwargs):
         logger.debug("do_check({}, {})".format(test, kwargs))
         if isinstance(test, str):
             try:
-                chk = self.check_factory(test)(**kwargs)
+                return self.check_factory(test)(**kwargs)
             except TypeError:
                 raise MissingTest(test)
         else:
-            chk = test(**kwargs)
+            return test(**kwargs)
+
+    def memo_key(self, chk):
+        """
+        What the result of a check is kept under in Events.check_results.
+        Only results of pure checks are kept.
+
+        :return: (check class, check ID, arguments, event log version) tuple
+            or None if the result shouldn't be kept
+        """
+        if not self.memoize or not getattr(chk, 'pure', False):
+            return None
+        try:
+            _kwargs = json.dumps(getattr(chk, '_kwargs', {}), sort_keys=True)
+        except (TypeError, ValueError):
+            return None
+        return chk.__class__, chk.cid, _kwargs, self.conv.events.version
+
+    def store_result(self, stat, key=None):
+        """
+        Store the result of a check and stop the flow if it says so.
+
+        :param stat: What the check returned
+        :param key: If given, the result is kept under this key for reuse
+        """
+        if key is not None:
+            _stat = copy.copy(stat)
+        if self.cls_name:
+            stat.context = self.cls_name
+
+        _ts = self.conv.events.store(EV_CONDITION, stat, sender=self.__class__)
+        if key is not None:
+            self.conv.events.check_results[key] = (_stat, _ts)
+        self.check_severity(stat)
+
+    def do_check(self, test, **kwargs):
+        chk = self.make_check(test, **kwargs)
 
         if chk.__class__.__name__ not in self.ignore_check:
-            self.conv.events.store(EV_ASSERTION, chk.__class__.__name__)
-            try:
-                stat = chk(self.conv)
-            except Exception as err:
-                exception_trace('do_check', err, logger)
-                raise
-            else:
-                if self.cls_name:
-                    stat.context = self.cls_name
-
-                self.conv.events.store(EV_CONDITION, stat,
-                                       sender=self.__class__)
-                self.check_severity(stat)
+            self.run_batch([chk])
+
+    def plan(self, checks):
+        """
+        Splits checks into the batches they are run in. Checks that only
+        read the events (Check.pure) and come one after the other end up in
+        the same batch. Any other check is a batch of its own since it may
+        change what the checks after it see.
+
+        :param checks: Iterable of check instances in the order they were
+            given
+        :return: generator of lists of check instances
+        """
+        batch = []
+        try:
+            for chk in checks:
+                if chk.__class__.__name__ in self.ignore_check:
+                    continue
+                if getattr(chk, 'pure', False):
+                    batch.append(chk)
+                    continue
+                if batch:
+                    yield batch
+                    batch = []
+                yield [chk]
+        except Exception:
+            # Whatever was before the check that couldn't be made is run
+            if batch:
+                yield batch
+            raise
+        if batch:
+            yield batch
+
+    def run_batch(self, batch):
+        """
+        Run a batch of checks and store the results in the order the checks
+        were given.
+
+        Pure checks are run concurrently over a snapshot of the events taken
+        before the batch is started. The results are stored one by one as if
+        the checks had been run one after the other, so if one of them
+        stops the flow the results of the checks after it are thrown away.
+
+        A pure check that has already been run with the same arguments
+        against the same version of the events isn't run again. Its earlier
+        result is stored after an EV_CACHED_RESULT event that refers to
+        when the result was first stored.
+        """
+        _events = self.conv.events
+        keys = [self.memo_key(chk) for chk in batch]
+        hits = [None if key is None else _events.check_results.get(key)
+                for key in keys]
+
+        todo = [chk for chk, hit in zip(batch, hits) if hit is None]
+        futures = {}
+        if len(todo) > 1:
+            _conv = ConversationView(self.conv, _events.snapshot())
+            _executor = check_executor()
+            for chk in todo:
+                futures[chk] = _executor.submit(chk, _conv)
+
+        try:
+            for chk, key, hit in zip(batch, keys, hits):
+                _name = chk.__class__.__name__
+                _events.store(EV_ASSERTION, _name)
+                if hit is not None:
+                    _stat, _ts = hit
+                    _events.store(EV_CACHED_RESULT, _name, first=_ts)
+                    self.store_result(copy.copy(_stat))
+                    continue
+
+                try:
+                    if chk in futures:
+                        stat = futures[chk].result()
+                    else:
+                        stat = chk(self.conv)
+                except Exception as err:
+                    exception_trace('do_check', err, logger)
+                    raise
+                self.store_result(stat, key)
+        finally:
+            for future in futures.values():
+                future.cancel()
 
     def err_check(self, test, err=None, bryt=True):
         if err:
@@ -91,18 +243,18 @@ class Verify(object):
 
     def test_sequence(self, sequence):
         if isinstance(sequence, dict):
-            for test, kwargs in list(sequence.items()):
-                if not kwargs:
-                    self.do_check(test)
-                else:
-                    self.do_check(test, **kwargs)
+            items = list(sequence.items())
         else:
+            items = []
             for test in sequence:
                 if isinstance(test, tuple):
-                    test, kwargs = test
-                    if not kwargs:
-                        kwargs = {}
+                    items.append(test)
                 else:
-                    kwargs = {}
-                self.do_check(test, **kwargs)
+                    items.append((test, {}))
+
+        # Checks are made as they are needed
+        checks = (self.make_check(test, **(kwargs or {}))
+                  for test, kwargs in items)
+        for batch in self.plan(checks):
+            self.run_batch(batch)
         return True
@@ -1,6 +1,9 @@
+import json
 import os
 
+from otest.bundle import compile_flows
 from otest.flow import match_usage, Flow
+from otest.flow import SpecCache
 from otest.prof_util import from_profile
 
 PROFILE = ['C.T.T.T.e', 'C.T.T.T.s', 'C.T.T.T.se', 'C.T.T.T.sen',
@@ -49,3 +52,147 @@ def test_flow():
     assert len(tl) == 41
     tl = _flow.matches_profile(PROFILE[7])
     assert len(tl) == 55
+
+
+def test_flow_spec_cache(tmpdir):
+    _dir = str(tmpdir)
+    fname = os.path.join(_dir, 'T-1.json')
+    with open(fname, 'w') as fp:
+        json.dump({'desc': 'first', 'sequence': ['A']}, fp)
+
+    cache = SpecCache()
+    _flow = Flow(_dir, None, spec_cache=cache)
+    assert _flow['T-1']['desc'] == 'first'
+    assert list(_flow.keys()) == ['T-1']
+    _ver = cache.version
+    assert _flow['T-1']['desc'] == 'first'
+    assert cache.version == _ver
+
+    # rewrite with different size
+    with open(fname, 'w') as fp:
+        json.dump({'desc': 'second one', 'sequence': ['A']}, fp)
+    assert _flow['T-1']['desc'] == 'second one'
+    assert cache.version > _ver
+
+
+def test_flow_spec_copy_on_write():
+    _flow = Flow(BASE_PATH, None, spec_cache=SpecCache())
+    spec = _flow['OP-Response-code']
+    spec['sequence'].append('Foo')
+    spec['desc'] = 'changed'
+    del spec['MTI']
+    assert 'MTI' not in spec
+
+    _orig = _flow['OP-Response-code']
+    assert 'Foo' not in _orig['sequence']
+    assert _orig['desc'] == 'Request with response_type=code'
+    assert 'MTI' in _orig
+    assert dict(_orig) == _flow._spec('OP-Response-code')
+
+
+def test_flow_spec_is_a_dict():
+    _flow = Flow(BASE_PATH, None, spec_cache=SpecCache())
+    spec = _flow['OP-Response-code']
+    assert isinstance(spec, dict)
+    assert json.loads(json.dumps(spec)) == _flow._spec('OP-Response-code')
+
+    for _spec in [spec.to_dict(), dict(spec), spec.copy()]:
+        assert type(_spec) is dict
+        _spec['sequence'].append('Foo')
+    spec.get('sequence').append('Bar')
+    dict(spec.items())['usage']['extra'] = True
+    assert _flow._spec('OP-Response-code') == _flow['OP-Response-code']
+    assert 'Foo' not in _flow['OP-Response-code']['sequence']
+
+
+def _brute_force(_flow, profile):
+    _use = from_profile(profile)
+    return [tid for tid, spec in _flow._items() if match_usage(spec, **_use)]
+
+
+def test_profile_index():
+    _flow = Flow(BASE_PATH, None, spec_cache=SpecCache())
+    for prof in PROFILE + ['CIT.T.T.T.se.+.T', 'IT.F.F.F', 'C']:
+        assert _flow.matches_profile(prof) == _brute_force(_flow, prof)
+
+    _tids = _flow.pick('group', 'Discovery')
+    assert _tids
+    assert _tids == [tid for tid, spec in _flow._items()
+                     if spec.get('group') == 'Discovery']
+    assert _flow.pick('group', 'No such group') == []
+
+    for prof in ['C.T.T.T', 'C.T.T.F', 'I.T.T.T']:
+        _use = from_profile(prof)
+        for tid, spec in _flow._items():
+            _mti = spec.get('MTI', [])
+            _expected = (_use['return_type'][0] in _mti and 'DYN' in _mti and
+                         'CNF' in _mti and _use['register'] and
+                         _use['discover'])
+            assert _flow.mandatory_to_implement(tid, prof) == _expected
+
+
+def test_profile_index_invalidation(tmpdir):
+    _dir = str(tmpdir)
+    with open(os.path.join(_dir, 'T-1.json'), 'w') as fp:
+        json.dump({'usage': {'register': True}}, fp)
+
+    _flow = Flow(_dir, None, spec_cache=SpecCache())
+    _flow.index_poll_interval = 0
+    assert _flow.matches_profile('C.T.T.T') == ['T-1']
+    assert _flow.matches_profile('C.T.T.F') == []
+
+    with open(os.path.join(_dir, 'T-2.json'), 'w') as fp:
+        json.dump({'usage': {'register': False}}, fp)
+    # make sure the directory looks changed
+    os.utime(_dir, (0, 0))
+    assert _flow.matches_profile('C.T.T.F') == ['T-2']
+
+
+def test_profile_index_file_changed(tmpdir):
+    _dir = str(tmpdir)
+    _path = os.path.join(_dir, 'T-1.json')
+    with open(_path, 'w') as fp:
+        json.dump({'usage': {'register': True}}, fp)
+    compile_flows(_dir)
+
+    _flow = Flow(_dir, None, spec_cache=SpecCache())
+    _flow.index_poll_interval = 0
+    assert _flow.bundle is not None
+    assert _flow.matches_profile('C.T.T.T') == ['T-1']
+
+    # Only the file changes, not the directory
+    _dir_stat = os.stat(_dir)
+    with open(_path, 'w') as fp:
+        json.dump({'usage': {'register': False}}, fp)
+    os.utime(_dir, ns=(_dir_stat.st_atime_ns, _dir_stat.st_mtime_ns))
+    assert _flow.matches_profile('C.T.T.T') == []
+    assert _flow.matches_profile('C.T.T.F') == ['T-1']
+
+
+def test_profile_index_poll(tmpdir, monkeypatch):
+    _dir = str(tmpdir)
+    _path = os.path.join(_dir, 'T-1.json')
+    with open(_path, 'w') as fp:
+        json.dump({'usage': {'register': True}}, fp)
+
+    _flow = Flow(_dir, None, spec_cache=SpecCache())
+    assert _flow.matches_profile('C.T.T.T') == ['T-1']
+
+    _stat = []
+    _os_stat = os.stat
+
+    def _count(path, *args, **kwargs):
+        _stat.append(path)
+        return _os_stat(path, *args, **kwargs)
+
+    monkeypatch.setattr(os, 'stat', _count)
+    with open(_path, 'w') as fp:
+        json.dump({'usage': {'register': False}}, fp)
+    # Within the poll interval the files aren't looked at
+    for _ in range(10):
+        assert _flow.matches_profile('C.T.T.T') == ['T-1']
+    assert _stat == []
+
+    _flow._index_checked -= _flow.index_poll_interval
+    assert _flow.matches_profile('C.T.T.T') == []
+    assert _stat
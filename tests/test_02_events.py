@@ -0,0 +1,174 @@
+import time
+
+from otest.events import EV_CONDITION
+from otest.events import EV_PROTOCOL_RESPONSE
+from otest.events import EV_RESPONSE
+from otest.events import Event
+from otest.events import Events
+from otest.events import INCOMING
+from otest.events import NS_PER_SEC
+from otest.events import NoSuchEvent
+from otest.events import OUTGOING
+from otest.events import elapsed
+from otest.events import layout
+from otest.events import now
+
+
+class Foo(object):
+    pass
+
+
+def test_get_and_last():
+    events = Events()
+    events.store(EV_RESPONSE, 'first', sender='a')
+    events.store(EV_CONDITION, 'cond')
+    events.store(EV_RESPONSE, 'second', sender='b')
+
+    assert events.get_data(EV_RESPONSE) == ['first', 'second']
+    assert events.get_data(EV_RESPONSE, sender='b') == ['second']
+    assert events.last(EV_RESPONSE).data == 'second'
+    assert events.last_item(EV_CONDITION) == 'cond'
+    assert events.last('foo') is None
+    assert events[EV_RESPONSE] == ['first', 'second']
+
+    try:
+        events.last_item('foo')
+    except NoSuchEvent:
+        pass
+    else:
+        assert False
+
+
+def test_by_ref_sender_direction():
+    events = Events()
+    events.store(EV_RESPONSE, 'one', ref='ABC', direction=INCOMING)
+    events.store(EV_RESPONSE, 'two', ref='abc', direction=OUTGOING,
+                 sender='me')
+
+    assert [e.data for e in events.by_ref('Abc')] == ['one', 'two']
+    assert [e.data for e in events.by_direction(OUTGOING)] == ['two']
+    assert [e.data for e in events.by_sender('me')] == ['two']
+    assert events.by_ref('xyz') == []
+
+
+def test_get_message():
+    events = Events()
+    foo = Foo()
+    events.store(EV_PROTOCOL_RESPONSE, foo)
+    events.store(EV_PROTOCOL_RESPONSE, 'text')
+
+    assert events.get_message(EV_PROTOCOL_RESPONSE, Foo) == foo
+    assert events.get_messages(EV_PROTOCOL_RESPONSE, Foo) == [foo]
+
+
+def test_append_extend_reset():
+    events = Events()
+    ev = Event(1, EV_RESPONSE, 'x')
+    events.append(ev)
+    events.extend([Event(2, EV_CONDITION, 'y'), Event(3, EV_RESPONSE, 'z')])
+
+    assert len(events) == 3
+    assert ev in events
+    assert events.get_data(EV_RESPONSE) == ['x', 'z']
+
+    events.reset()
+    assert len(events) == 0
+    assert events.get(EV_RESPONSE) == []
+
+
+def test_returned_list_is_a_copy():
+    events = Events()
+    events.store(EV_RESPONSE, 'one')
+    _l = events.get(EV_RESPONSE)
+    _l.append('two')
+    assert len(events.get(EV_RESPONSE)) == 1
+
+
+def test_by_index():
+    events = Events()
+    indexes = [events.store(EV_RESPONSE, i) for i in range(100)]
+
+    # No collisions even if stored within the same clock tick
+    assert len(set(indexes)) == 100
+    for i, index in enumerate(indexes):
+        assert events.by_index(index).data == i
+
+    try:
+        events.by_index(indexes[-1] + 1)
+    except KeyError:
+        pass
+    else:
+        assert False
+
+
+def test_between():
+    events = Events()
+    indexes = [events.store(EV_RESPONSE, i) for i in range(10)]
+
+    assert [e.data for e in events.between(indexes[2], indexes[5])] == [2, 3,
+                                                                         4]
+    assert [e.data for e in events.between(indexes[8])] == [8, 9]
+
+
+def test_out_of_order_append():
+    events = Events()
+    late = Event(now(), EV_RESPONSE, 'late')
+    events.store(EV_RESPONSE, 'early')
+    events.append(late)
+
+    assert events.by_index(late.timestamp) == late
+    assert [e.data for e in events.between(0)] == ['late', 'early']
+
+
+def test_imported_events_advance_the_clock():
+    # Made by another worker whose clock is ahead
+    ahead = now() + 60 * NS_PER_SEC
+    events = Events()
+    events.append(Event(ahead, EV_RESPONSE, 'imported'))
+    events.store(EV_RESPONSE, 'local')
+    assert events.events[1].timestamp > ahead
+    assert elapsed(ahead, events.events[1]) >= 0
+    # Still runs at the normal pace
+    time.sleep(0.01)
+    events.store(EV_RESPONSE, 'later')
+    assert elapsed(events.events[1].timestamp, events.events[2]) >= 0.01
+
+    # Only that Events instance is ahead, the clock is still wall clock time
+    assert abs(now() - time.time() * NS_PER_SEC) < NS_PER_SEC
+    other = Events()
+    other.store(EV_RESPONSE, 'other')
+    assert other.events[0].timestamp < ahead
+
+
+def test_layout_sub_millisecond():
+    ev = Event(2000, EV_RESPONSE, 'text')
+    assert layout(1000, ev).startswith('0.000001 ')
+
+
+class HttpResp(object):
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+        self.headers = {}
+        self.url = 'https://example.com'
+
+
+def test_compact_event():
+    ev = Event(1, EV_RESPONSE, 'blåbär', ref='REF', sender='me', note='x')
+    assert not hasattr(ev, '__dict__')
+    # body is kept packed until first access
+    assert ev._packed
+    assert ev.data == 'blåbär'
+    assert not ev._packed
+    assert ev.ref == 'ref'
+    assert ev.kwargs == {'note': 'x'}
+    assert Event(2, EV_RESPONSE, {'a': 1}).data == {'a': 1}
+
+
+def test_lazy_http_response_text():
+    events = Events()
+    events.store('http response', HttpResp(400, '{"error":"foo"}'))
+    _resp = events.last_item('http response')
+    assert _resp._packed
+    assert _resp.text == '{"error":"foo"}'
+    assert not _resp._packed
@@ -0,0 +1,156 @@
+import os
+
+from oic.oic import AccessTokenResponse
+
+from otest.check import OK
+from otest.check import State
+from otest.events import EV_CONDITION
+from otest.events import EV_HTTP_RESPONSE
+from otest.events import EV_PROTOCOL_RESPONSE
+from otest.events import EV_RESPONSE
+from otest.events import Events
+from otest.journal import FSYNC_ALWAYS
+from otest.journal import Journal
+from otest.journal import load_events
+from otest.journal import read_journal
+from otest.rp.tool import WebTester
+from otest.session import SessionHandler
+from otest.summation import trace_output
+from otest.tool import Tester
+
+
+class Response(object):
+    def __init__(self, **kwargs):
+        for key, val in kwargs.items():
+            setattr(self, key, val)
+
+
+def make_events(path, fsync=FSYNC_ALWAYS):
+    events = Events(journal=Journal(path, fsync=fsync))
+    events.store(EV_RESPONSE, '{"access_token": "foo"}', sender='me')
+    events.store(EV_PROTOCOL_RESPONSE,
+                 AccessTokenResponse(access_token='foo', token_type='Bearer'))
+    events.store(EV_HTTP_RESPONSE,
+                 Response(status_code=400, headers={}, text='error',
+                          url='https://example.com'))
+    events.store(EV_CONDITION, State('check', OK), sender=State)
+    return events
+
+
+def test_round_trip(tmpdir):
+    path = os.path.join(str(tmpdir), 'test.jnl')
+    events = make_events(path)
+
+    _ev = load_events(path)
+    assert len(_ev) == 4
+    assert _ev.last_item(EV_RESPONSE) == '{"access_token": "foo"}'
+    assert isinstance(_ev.last_item(EV_PROTOCOL_RESPONSE),
+                      AccessTokenResponse)
+    assert _ev.last_item(EV_HTTP_RESPONSE).status_code == 400
+    assert _ev.last_item(EV_CONDITION).status == OK
+    assert _ev.last(EV_CONDITION).sender == 'otest.check.State'
+    assert [e.timestamp for e in _ev] == [e.timestamp for e in events]
+
+    assert trace_output(events.journal) == trace_output(events)
+
+
+def test_truncated(tmpdir):
+    path = os.path.join(str(tmpdir), 'test.jnl')
+    events = make_events(path)
+    events.journal.close()
+
+    with open(path, 'rb') as fp:
+        data = fp.read()
+    with open(path, 'wb') as fp:
+        fp.write(data[:-10])
+
+    assert len(list(read_journal(path))) == 3
+
+
+def test_batch_sync(tmpdir):
+    path = os.path.join(str(tmpdir), 'sub', 'test.jnl')
+    events = Events(journal=Journal(path, batch_size=2))
+    events.store(EV_RESPONSE, 'one')
+    assert events.journal._pending == 1
+    events.store(EV_RESPONSE, 'two')
+    assert events.journal._pending == 0
+    assert len(list(read_journal(path))) == 2
+
+
+def test_reset(tmpdir):
+    path = os.path.join(str(tmpdir), 'test.jnl')
+    events = make_events(path)
+    events.reset()
+    assert events.journal._fp is None
+    assert list(events.journal) == []
+
+    events.store(EV_RESPONSE, 'after')
+    assert [e.data for e in events.journal] == ['after']
+    events.journal.close()
+    assert events.journal._fp is None
+    # Opened again when written to
+    events.store(EV_RESPONSE, 'more')
+    assert len(list(read_journal(path))) == 2
+
+
+class Conv(object):
+    def __init__(self, journal):
+        self.events = Events(journal)
+
+
+class Session(object):
+    def __init__(self, iss, tag='tag', profile='C.T.T.T'):
+        self.iss = iss
+        self.tag = tag
+        self.profile = profile
+
+
+def test_tester_closes_journal(tmpdir):
+    tester = Tester(None, Session('https://op.example.com'),
+                    journal_dir=str(tmpdir))
+    _first = tester.journal('OP-a')
+    assert _first.path == os.path.join(
+        str(tmpdir), 's_op.example.com', 'tag', 'C.T.T.T', 'OP-a.jnl')
+    tester.conv = Conv(_first)
+    tester.conv.events.store(EV_RESPONSE, 'one')
+    assert _first._fp is not None
+
+    # Same test again, the old one is closed and left as it is
+    _second = tester.journal('OP-a')
+    assert _first._fp is None
+    assert _second.path != _first.path
+    assert [e.data for e in read_journal(_first.path)] == ['one']
+
+
+def test_journal_per_session(tmpdir):
+    _first = Tester(None, Session('https://op.example.com'),
+                    journal_dir=str(tmpdir)).journal('OP-a')
+    _other = Tester(None, Session('https://other.example.com'),
+                    journal_dir=str(tmpdir)).journal('OP-a')
+    _events = Events(_first)
+    _events.store(EV_RESPONSE, 'first')
+    # Running the same test in another session doesn't touch the journal
+    Events(_other).store(EV_RESPONSE, 'other')
+    assert _other.path != _first.path
+    assert [e.data for e in _first] == ['first']
+
+    # Nor does running it concurrently in the same session
+    _again = Tester(None, Session('https://op.example.com'),
+                    journal_dir=str(tmpdir)).journal('OP-a')
+    assert _again.path.endswith('OP-a.1.jnl')
+    _events.store(EV_RESPONSE, 'more')
+    assert [e.data for e in _first] == ['first', 'more']
+
+
+def test_rp_journal_per_session(tmpdir):
+    paths = []
+    for sid in ['abc', 'def']:
+        sh = SessionHandler(profile='C')
+        sh['sid'] = sid
+        sh['test_conf'] = {'start_page': 'https://rp.example.com'}
+        tester = WebTester(None, sh, base='https://op.example.org',
+                           provider_cls=None, journal_dir=str(tmpdir))
+        paths.append(tester.journal('rp-a').path)
+    assert paths == [
+        os.path.join(str(tmpdir), 's_rp.example.com', sid, 'C', 'rp-a.jnl')
+        for sid in ['abc', 'def']]
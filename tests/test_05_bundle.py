@@ -0,0 +1,114 @@
+import json
+import os
+
+from otest import Done
+from otest import Unknown
+from otest.bundle import BUNDLE_NAME
+from otest.bundle import compile_flows
+from otest.bundle import find_bundle
+from otest.bundle import FlowBundle
+from otest.bundle import name_table
+from otest.flow import Flow
+from otest.flow import RPFlow
+
+BASE_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "flows"))
+
+
+def _spec(tid):
+    with open(os.path.join(BASE_PATH, tid + '.json')) as fp:
+        return json.load(fp)
+
+
+def test_compile_and_read(tmpdir):
+    path = compile_flows(BASE_PATH, str(tmpdir.join('flows.bundle')))
+    bundle = FlowBundle(path)
+    _tids = [fn[:-5] for fn in os.listdir(BASE_PATH) if fn.endswith('.json')]
+    assert set(bundle.keys()) == set(_tids)
+    for tid in _tids:
+        assert bundle.get(tid) == _spec(tid)
+    assert 'OP-Unknown' not in bundle
+    bundle.close()
+
+
+def test_flow_from_bundle(tmpdir):
+    path = compile_flows(BASE_PATH, str(tmpdir.join('flows.bundle')))
+    _flow = Flow(path, None)
+    _dir_flow = Flow(BASE_PATH, None)
+    assert sorted(_flow.keys()) == sorted(_dir_flow.keys())
+    assert _flow['OP-Discovery-Config'] == _dir_flow['OP-Discovery-Config']
+    assert 'OP-Discovery-Config' in _flow
+
+
+def test_stale_bundle(tmpdir):
+    fdir = tmpdir.mkdir('flows')
+    fdir.join('T-1.json').write(json.dumps({'sequence': []}))
+    fdir.join('T-2.json').write(json.dumps({'sequence': []}))
+    path = compile_flows(str(fdir))
+    assert find_bundle(str(fdir)) == path
+
+    _flow = Flow(str(fdir), None)
+    assert _flow['T-1'] == {'sequence': []}
+    assert _flow.bundle.is_current('T-1')
+
+    # Same directory mtime, but the file has changed
+    _dir_stat = os.stat(str(fdir))
+    fdir.join('T-1.json').write(json.dumps({'sequence': ['Oper']}))
+    os.utime(str(fdir), ns=(_dir_stat.st_atime_ns, _dir_stat.st_mtime_ns))
+    assert not _flow.bundle.is_current('T-1')
+    assert _flow['T-1'] == {'sequence': ['Oper']}
+    assert _flow.bundle.is_current('T-2')
+
+    # Added and removed files
+    fdir.join('T-3.json').write(json.dumps({'sequence': []}))
+    fdir.join('T-2.json').remove()
+    assert sorted(_flow.keys()) == ['T-1', 'T-3']
+    assert 'T-3' in _flow
+    assert 'T-2' not in _flow
+    assert _flow['T-3'] == {'sequence': []}
+
+
+def test_old_bundle(tmpdir):
+    fdir = tmpdir.mkdir('flows')
+    fdir.join('T-1.json').write(json.dumps({'sequence': []}))
+    fdir.join(BUNDLE_NAME).write(b'not a bundle', mode='wb')
+    _flow = Flow(str(fdir), None)
+    assert _flow.bundle is None
+    assert _flow['T-1'] == {'sequence': []}
+
+
+class Oper(object):
+    pass
+
+
+def set_op_args(oper, arg):
+    pass
+
+
+def factory(name):
+    if name == 'Oper':
+        return Oper
+    raise Unknown(name)
+
+
+def func_factory(name):
+    if name == 'set_op_args':
+        return set_op_args
+    return None
+
+
+def test_name_table(tmpdir):
+    fdir = tmpdir.mkdir('flows')
+    fdir.join('T-1.json').write(json.dumps(
+        {'sequence': ['Oper', {'Oper': {'set_op_args': {'a': 1}}}]}))
+
+    table = name_table({'T-1': json.loads(fdir.join('T-1.json').read())},
+                       {'': factory}, func_factory)
+    assert table['classes'] == {'Oper': 'test_05_bundle:Oper'}
+    assert table['functions'] == {'set_op_args': 'test_05_bundle:set_op_args'}
+
+    compile_flows(str(fdir), cls_factories={'': factory},
+                  func_factory=func_factory)
+    _flow = RPFlow(str(fdir), None, {'': factory}, func_factory)
+    assert _flow.bundle is not None
+    _seq = _flow.expanded_conf('T-1')['sequence']
+    assert _seq == [Oper, (Oper, {set_op_args: {'a': 1}}), Done]
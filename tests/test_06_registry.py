@@ -0,0 +1,118 @@
+import inspect
+import sys
+
+from otest import check
+from otest import func
+from otest import operation
+from otest.aus import check as aus_check
+from otest.check import Check
+from otest.check import list_checks
+from otest.registry import CHECKS
+from otest.registry import CheckRegistry
+from otest.registry import OPERATIONS
+from otest.registry import Registry
+
+
+def _scan(module, predicate):
+    return dict(inspect.getmembers(sys.modules[module], predicate))
+
+
+def test_operations():
+    _classes = _scan('otest.operation', inspect.isclass)
+    for name, cls in _classes.items():
+        assert operation.factory(name) is cls
+    assert operation.factory('NoSuchOperation') is None
+
+
+def test_functions():
+    _funcs = _scan('otest.func', inspect.isfunction)
+    for name, fn in _funcs.items():
+        assert func.factory(name) is fn
+    assert func.factory('no_such_function') is None
+
+
+def test_checks():
+    assert check.factory('check-http-response') is None
+    assert aus_check.factory('check-http-response') is \
+        aus_check.CheckHTTPResponse
+    # falls back to otest.check
+    assert aus_check.factory('check') is check.factory('check')
+    assert 'verify-error' in CHECKS.names('otest.aus.check')
+
+
+def _scan_factory(module, cid):
+    # How the check factories used to work
+    for name, obj in inspect.getmembers(sys.modules[module]):
+        if inspect.isclass(obj) and issubclass(obj, Check):
+            if getattr(obj, 'cid', None) == cid:
+                return obj
+    return check.factory(cid)
+
+
+def test_check_factory_unchanged():
+    _cids = set([cid for cid, cls in CHECKS.checks()])
+    for cid in _cids:
+        assert aus_check.factory(cid) is _scan_factory('otest.aus.check', cid)
+    assert aus_check.factory('no-such-check') is None
+
+
+def test_check_layers():
+    from otest.rp import check as rp_check
+
+    _cid = rp_check.VerifyRegistrationOfflineAccess.cid
+    assert CHECKS.find(_cid) is rp_check.VerifyRegistrationOfflineAccess
+    assert CHECKS.find(_cid, ['otest.aus.check', 'otest.check']) is None
+    assert CHECKS.find('check') is Check
+
+    _list = list_checks()
+    assert len(_list) == len(CHECKS.checks())
+    assert ('check', 'otest.check', 'Check', 'General test') in _list
+
+
+def test_check_registered_at_import():
+    class MyCheck(Check):
+        cid = 'my-test-check'
+
+    assert CHECKS.lookup(__name__, 'my-test-check') is MyCheck
+    assert CHECKS.find('my-test-check', [__name__]) is MyCheck
+
+
+def test_duplicate_check_id():
+    reg = CheckRegistry()
+
+    class B(object):
+        cid = 'dup'
+
+    class A(object):
+        cid = 'dup'
+
+    reg.add(B, 'mod')
+    reg.add(A, 'mod')
+    assert reg.lookup('mod', 'dup') is A
+    assert reg.duplicates() == {('mod', 'dup'): [B, A]}
+
+
+def test_register_and_invalidate():
+    class Extra(object):
+        pass
+
+    reg = Registry(inspect.isclass)
+    _ver = reg.version
+    assert reg.lookup('otest.operation', 'Extra') is None
+    reg.register('otest.operation', Extra)
+    assert reg.version > _ver
+    assert reg.lookup('otest.operation', 'Extra') is Extra
+    assert reg.names('otest.operation')['Extra'] is Extra
+
+    setattr(operation, 'Extra2', Extra)
+    try:
+        assert reg.lookup('otest.operation', 'Extra2') is None
+        reg.invalidate('otest.operation')
+        assert reg.lookup('otest.operation', 'Extra2') is Extra
+    finally:
+        delattr(operation, 'Extra2')
+        reg.invalidate()
+    assert reg.lookup('otest.operation', 'Extra2') is None
+    # explicit registrations survive invalidation
+    assert reg.lookup('otest.operation', 'Extra') is Extra
+    assert OPERATIONS.lookup('otest.operation', 'Extra') is None
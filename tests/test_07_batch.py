@@ -0,0 +1,118 @@
+import os
+import random
+import threading
+import time
+
+from otest import tool
+from otest.batch import BatchRunner
+from otest.check import OK
+from otest.check import State
+from otest.events import EV_CONDITION
+from otest.events import Events
+from otest.flow import FlowState
+from otest.flow import GRPS
+from otest.session import SessionHandler
+
+BASE_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "flows"))
+
+
+class Conv(object):
+    def __init__(self, test_id):
+        self.test_id = test_id
+        self.events = Events()
+        self.index = 0
+
+
+class FakeTester(tool.Tester):
+    running = 0
+    max_running = 0
+    lock = threading.Lock()
+
+    def run(self, test_id, **kw_args):
+        with self.lock:
+            FakeTester.running += 1
+            FakeTester.max_running = max(FakeTester.max_running,
+                                         FakeTester.running)
+        try:
+            self.sh.session_setup(path=test_id)
+            self.conv = Conv(test_id)
+            time.sleep(random.random() / 100)
+            if test_id.endswith('Config'):
+                raise ValueError(test_id)
+            self.conv.events.store(EV_CONDITION, State('Done', OK))
+            return self.store_result()['state']
+        finally:
+            with self.lock:
+                FakeTester.running -= 1
+
+    def store_result(self, res=None):
+        return self.flows.store_test_info(self)
+
+
+def test_batch_run():
+    flows = FlowState(BASE_PATH, None, {}, None, display_order=GRPS)
+    flows.expanded_conf = lambda tid: {'sequence': [], 'desc': tid}
+    sh = SessionHandler(flows=flows, profile='C.T.T.T')
+    tids = sorted(flows.keys())[:20]
+
+    def make_tester(_flows):
+        return FakeTester(None, sh.copy(_flows), flows=_flows)
+
+    _progress = []
+    runner = BatchRunner(make_tester, flows, concurrency=4,
+                         progress=lambda *args: _progress.append(args))
+    results = runner.run(tids)
+
+    assert [r.test_id for r in results] == tids
+    assert list(flows.test_info.keys()) == [r.test_id for r in results
+                                            if r.error is None]
+    assert [p[0] for p in _progress] == list(range(1, len(tids) + 1))
+    assert 1 < FakeTester.max_running <= 4
+    # the shared session handler isn't touched by the workers
+    assert 'testid' not in sh
+
+    _failed = [r for r in results if r.error]
+    assert [r.test_id for r in _failed] == ['OP-Discovery-Config']
+    assert isinstance(_failed[0].error, ValueError)
+
+
+class PausingTester(tool.Tester):
+    started = []
+
+    def run(self, test_id, **kw_args):
+        PausingTester.started.append(test_id)
+        self.sh.session_setup(path=test_id)
+        self.sh['index'] = 1
+        if test_id == 'OP-Discovery-Config':
+            return 'interaction'
+        time.sleep(0.01)
+        return True
+
+
+def test_batch_pause():
+    flows = FlowState(BASE_PATH, None, {}, None, display_order=GRPS)
+    flows.expanded_conf = lambda tid: {'sequence': [], 'desc': tid}
+    sh = SessionHandler(flows=flows, profile='C.T.T.T')
+    tids = sorted(flows.keys())
+    tids.insert(1, tids.pop(tids.index('OP-Discovery-Config')))
+
+    def make_tester(_flows):
+        return PausingTester(None, sh.copy(_flows), flows=_flows)
+
+    PausingTester.started = []
+    runner = BatchRunner(make_tester, flows, concurrency=2,
+                         is_paused=lambda res: res.result == 'interaction')
+    results = runner.run(tids)
+
+    assert runner.paused.test_id == 'OP-Discovery-Config'
+    assert runner.paused.paused
+    # The tests that hadn't started when the test paused were not run
+    assert len(PausingTester.started) < len(tids)
+    assert [r.test_id for r in results] == [
+        tid for tid in tids if tid in PausingTester.started]
+
+    # The paused test can be continued with the shared session handler
+    assert 'testid' not in sh
+    sh.take_over(runner.paused.session)
+    assert sh['testid'] == 'OP-Discovery-Config'
+    assert sh['index'] == 1
@@ -0,0 +1,155 @@
+import asyncio
+import threading
+import time
+
+from otest import aio
+from otest import Done
+from otest.aus import tool as aus_tool
+from otest.check import Check
+from otest.check import ERROR
+from otest.check import OK
+from otest.check import State
+from otest.conversation import Conversation
+from otest.events import EV_CONDITION
+from otest.events import EV_EVENT
+from otest.events import Events
+from otest.operation import Operation
+from otest.operation import TimeDelay
+
+
+class Conv(object):
+    def __init__(self):
+        self.events = Events()
+
+
+class SyncOper(Operation):
+    def run(self, *args, **kwargs):
+        return threading.current_thread().name
+
+
+class OwnCall(Operation):
+    def __call__(self, *args, **kwargs):
+        return 'own'
+
+
+class AsyncEntity(object):
+    async def async_http_request(self, url, method='GET', **kwargs):
+        await asyncio.sleep(0)
+        return 'async {} {}'.format(method, url)
+
+
+class SyncEntity(object):
+    def http_request(self, url, method='GET', **kwargs):
+        return 'sync {} {}'.format(method, url)
+
+
+def test_sync_operations_in_executor():
+    _main = threading.current_thread().name
+    assert aio.run(aio.call(SyncOper(Conv(), None, None))) != _main
+    assert aio.run(aio.call(OwnCall(Conv(), None, None))) == 'own'
+    # Not an Operation at all
+    assert aio.run(aio.call(lambda: 'plain')) == 'plain'
+
+
+def test_http_request():
+    url = 'https://op.example.org'
+    assert aio.run(aio.http_request(AsyncEntity(), url, 'POST')) == \
+        'async POST {}'.format(url)
+    assert aio.run(aio.http_request(SyncEntity(), url)) == \
+        'sync GET {}'.format(url)
+
+
+def test_time_delay_does_not_block():
+    opers = []
+    for _ in range(50):
+        _op = TimeDelay(Conv(), None, None)
+        _op.delay = 0.05
+        opers.append(_op)
+
+    start = time.time()
+    aio.run(asyncio.gather(*[aio.call(op) for op in opers]))
+    assert time.time() - start < 1
+
+
+class FakeTester(object):
+    async def arun(self, test_id, **kwargs):
+        await asyncio.sleep(0.01)
+        if test_id == 13:
+            raise ValueError(test_id)
+        return test_id
+
+
+def test_run_tests():
+    tids = list(range(1000))
+    start = time.time()
+    res = aio.run(aio.run_tests(FakeTester, tids, concurrency=500))
+    assert time.time() - start < 5
+    assert isinstance(res[13], ValueError)
+    del res[13]
+    del tids[13]
+    assert res == tids
+
+
+class Profiles(object):
+    PROFILEMAP = {}
+
+
+class Session(dict):
+    profile = 'C.T.T.T'
+
+
+class Flows(object):
+    def __init__(self):
+        self.complete = {}
+
+
+class Pre(Check):
+    def __call__(self, conv=None, output=None):
+        conv.events.store(EV_EVENT, threading.current_thread().name)
+        return State('pre', OK)
+
+
+class Step(Operation):
+    _tests = {'pre': [(Pre, {})], 'post': []}
+
+    def run(self, *args, **kwargs):
+        self.conv.events.store(EV_EVENT, threading.current_thread().name)
+
+
+class Failing(Operation):
+    def run(self, *args, **kwargs):
+        raise ValueError('failing')
+
+
+class FlowTester(aus_tool.Tester):
+    def store_result(self, res=None):
+        self.stored = self.conv.events.get_data(EV_CONDITION)
+        return {'state': max(s.status for s in self.stored)}
+
+
+def _flow_tester(sequence):
+    tester = FlowTester(None, Session(), Profiles(), flows=Flows(),
+                        profile_handler=None, tool_conf={})
+    tester.conv = Conversation({'sequence': [], 'assert': {}}, None, None)
+    tester.conv.sequence = sequence
+    return tester
+
+
+def test_run_flow_and_arun_flow():
+    _main = threading.current_thread().name
+    for run, in_main in [(lambda t: t.run_flow('T-1'), True),
+                         (lambda t: aio.run(t.arun_flow('T-1')), False)]:
+        tester = _flow_tester([Step, Done])
+        assert run(tester) == OK
+        assert [s.test_id for s in tester.stored] == ['pre', 'Done']
+        assert tester.sh['index'] == 1
+        # The async variant runs the pre checks in the executor
+        _threads = tester.conv.events.get_data(EV_EVENT)
+        assert len(_threads) == 2
+        assert all((t == _main) == in_main for t in _threads)
+
+        tester = _flow_tester([Failing, Step, Done])
+        res = run(tester)
+        assert 'exception_trace' in res
+        assert [s.status for s in tester.stored] == [ERROR]
+        assert tester.sh['index'] == 0
@@ -0,0 +1,84 @@
+import threading
+from http.server import BaseHTTPRequestHandler
+from http.server import HTTPServer
+from socketserver import ThreadingMixIn
+
+from otest.aus.client import OicClient
+from otest.events import EV_HTTP_POOL
+from otest.events import Events
+from otest.http_pool import HTTPPool
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = (self.headers.get('Cookie') or '').encode('utf-8')
+        self.send_response(200)
+        if self.path == '/set':
+            self.send_header('Set-Cookie', 'sid=abc; Path=/')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def _server():
+    srv = Server(('127.0.0.1', 0), Handler)
+    _thr = threading.Thread(target=srv.serve_forever)
+    _thr.daemon = True
+    _thr.start()
+    return srv, 'http://127.0.0.1:{}'.format(srv.server_address[1])
+
+
+def _client(pool):
+    cli = OicClient(verify_ssl=False)
+    cli.http_pool = pool
+    cli.events = Events()
+    return cli
+
+
+def test_pooled_requests():
+    srv, base = _server()
+    pool = HTTPPool()
+    try:
+        cli1 = _client(pool)
+        cli2 = _client(pool)
+
+        r = cli1.http_request(base + '/set')
+        assert r.status_code == 200
+        cli1.http_request(base + '/echo')
+        r = cli1.http_request(base + '/echo')
+        assert 'sid=abc' in r.text
+
+        # cookies stay with the conversation
+        r = cli2.http_request(base + '/echo')
+        assert r.text == ''
+
+        _stats = pool.stats()['total']
+        assert _stats['requests'] == 4
+        assert _stats['new_connections'] == 1
+        assert _stats['hits'] == 3
+        assert _stats['tls_handshakes'] == 0
+
+        _info = cli1.events.get_data(EV_HTTP_POOL)
+        assert [i['reused'] for i in _info] == [False, True, True]
+        assert cli2.events.get_data(EV_HTTP_POOL)[0]['reused']
+    finally:
+        pool.close()
+        srv.shutdown()
+        srv.server_close()
+
+
+def test_pool_key():
+    assert HTTPPool.key('https://op.example.org/authz') == (
+        'https', 'op.example.org', 443, True, None)
+    assert HTTPPool.key('http://op.example.org:8080/', False,
+                        ['cert.pem', 'key.pem']) == (
+        'http', 'op.example.org', 8080, False, ('cert.pem', 'key.pem'))
@@ -0,0 +1,103 @@
+import time
+
+from oic.utils.keyio import KeyBundle
+from oic.utils.keyio import build_keyjar
+from oic.utils.keyio import ec_init
+
+from otest.aus.client import Factory
+from otest.aus.client import OicClient
+from otest.keyjar import KeyJarView
+from otest.keyjar import kid_index
+from otest.keyjar import private_keys
+
+KEY_CONF = [
+    {"type": "EC", "crv": "P-256", "use": ["sig"]},
+    {"type": "EC", "crv": "P-256", "use": ["enc"]}
+]
+
+
+def _keyjar():
+    jwks, keyjar, kidd = build_keyjar(KEY_CONF, 'k%d')
+    return keyjar, kidd
+
+
+def test_view_shares_until_changed():
+    keyjar, kidd = _keyjar()
+    view = KeyJarView(keyjar)
+    assert view.issuer_keys[''][0] is keyjar.issuer_keys[''][0]
+    assert view == keyjar
+
+    view.add_kb('', ec_init({"type": "EC", "crv": "P-256", "use": ["sig"]}))
+    view.add_symmetric('https://op.example.com', 'secret')
+    assert len(view.issuer_keys['']) == 3
+    assert len(keyjar.issuer_keys['']) == 2
+    assert 'https://op.example.com' not in keyjar
+    # bundles are still shared
+    assert view.issuer_keys[''][0] is keyjar.issuer_keys[''][0]
+    assert not view.is_private('')
+
+
+def test_private_keys():
+    keyjar, kidd = _keyjar()
+    view = KeyJarView(keyjar)
+    private_keys(view)
+    assert view.is_private('')
+    assert view.issuer_keys[''][0] is not keyjar.issuer_keys[''][0]
+
+    view.get_key_by_kid('k0').inactive_since = time.time()
+    assert keyjar.get_key_by_kid('k0').inactive_since == 0
+    assert view.get_signing_key('EC') == []
+    assert keyjar.get_signing_key('EC')
+
+    # nothing to do for an ordinary key jar
+    private_keys(keyjar)
+
+
+def test_remove_outdated():
+    keyjar, kidd = _keyjar()
+    view = KeyJarView(keyjar)
+    view.remove_outdated()
+    assert not view.is_private('')
+
+    other = KeyJarView(keyjar)
+    private_keys(other)
+    other.get_key_by_kid('k1').inactive_since = 1
+    other.remove_outdated()
+    assert len(other.get_issuer_keys('')) == 1
+    assert len(keyjar.get_issuer_keys('')) == 2
+
+
+def test_kid_index():
+    keyjar, kidd = _keyjar()
+    view = KeyJarView(keyjar)
+    _index = kid_index(view)
+    assert [k.kid for k in _index.get('sig', 'EC')] == ['k0']
+    assert [k.kid for k in _index.get('dec', 'ec')] == ['k1']
+    assert _index.get('sig', 'EC', kid='k1') == []
+    assert _index.get('sig', 'RSA') == []
+    assert kid_index(view) is _index
+
+    kb = KeyBundle(keytype='EC', keyusage=['sig'])
+    kb.append(ec_init({"type": "EC", "crv": "P-256",
+                       "use": ["sig"]}).keys()[0])
+    kb.keys()[0].kid = 'k2'
+    view.add_kb('', kb)
+    _index = kid_index(view)
+    assert [k.kid for k in _index.get('sig', 'EC')] == ['k0', 'k2']
+
+    # Works on an ordinary key jar too
+    assert [k.kid for k in kid_index(keyjar).get('sig', 'EC')] == ['k0']
+
+
+def test_make_client():
+    keyjar, kidd = _keyjar()
+    factory = Factory(OicClient, http_pool=None)
+    kid = {'sig': {'EC': 'k0', 'RSA': 'r0'}, 'enc': {'EC': 'gone'}}
+    cli, c_info = factory.make_client(keyjar=keyjar, kid=kid)
+
+    assert isinstance(cli.keyjar, KeyJarView)
+    assert c_info['keyjar'] is cli.keyjar
+    assert cli.kid == {'sig': {'EC': 'k0'}, 'enc': {'EC': 'k1'}}
+
+    cli.keyjar.add_symmetric('', 'client_secret')
+    assert len(keyjar.issuer_keys['']) == 2
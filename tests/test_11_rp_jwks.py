@@ -0,0 +1,103 @@
+import json
+import os
+import time
+
+from Cryptodome.PublicKey import RSA
+from jwkest.jwk import ECKey
+from jwkest.jwk import RSAKey
+from jwkest.jwk import SYMKey
+from oic.utils.keyio import KeyBundle
+from oic.utils.keyio import build_keyjar
+
+from otest.rp.jwks import JWKSCache
+from otest.rp.jwks import KeyPool
+from otest.rp.provider import Provider
+
+KEY_CONF = [
+    {"type": "EC", "crv": "P-256", "use": ["sig"]},
+    {"type": "EC", "crv": "P-256", "use": ["enc"]}
+]
+
+
+def _provider(pool=None):
+    jwks, keyjar, kidd = build_keyjar(KEY_CONF)
+    return Provider('https://op.example.com', {}, {}, None, None, None, None,
+                    'abcdefghijklmnop', keyjar=keyjar,
+                    key_pool=pool or KeyPool(depth=1, rsa_size=1024),
+                    jwks_cache=JWKSCache())
+
+
+def test_key_pool():
+    pool = KeyPool(depth=1, rsa_size=1024)
+    pool.start()
+    for _ in range(100):
+        if pool.ready() == {'RSA': 1, 'EC': 1, 'oct': 1}:
+            break
+        time.sleep(0.1)
+    assert pool.ready() == {'RSA': 1, 'EC': 1, 'oct': 1}
+
+    _key = pool.new_key('RSA', use='enc', kid='r')
+    assert isinstance(_key, RSAKey)
+    assert _key.kid == 'r'
+    assert pool.misses['RSA'] == 0
+
+    _key = pool.new_key('EC', use='sig', kid='e')
+    assert isinstance(_key, ECKey)
+    assert _key.serialize(private=True)['crv'] == 'P-256'
+
+    _key = pool.new_key('oct')
+    assert isinstance(_key, SYMKey)
+    assert len(_key.key) == 32
+    pool.stop()
+
+
+def test_jwks_cache():
+    op = _provider()
+    _jwks = op.generate_jwks({})
+    assert op.generate_jwks({}) is _jwks
+    assert len(json.loads(_jwks)['keys']) == 2
+
+    # deactivating a key changes the fingerprint
+    op.keyjar[''][0].keys()[0].inactive_since = time.time()
+    assert op.generate_jwks({}) is not _jwks
+
+
+def test_nokid1jwk():
+    op = _provider()
+    kb = KeyBundle()
+    kb.append(RSAKey(use='sig', kid='rsa').load_key(RSA.generate(1024)))
+    op.keyjar.add_kb('', kb)
+    op.behavior_type.append('nokid1jwk')
+
+    _jwks = op.generate_jwks({'sign_alg': 'RS256'})
+    assert op.generate_jwks({'sign_alg': 'RS256'}) is _jwks
+    _jwks = json.loads(_jwks)
+    assert len(_jwks['keys']) == 1
+    assert _jwks['keys'][0]['kty'] == 'RSA'
+    assert 'kid' not in _jwks['keys'][0]
+    assert op.keyjar.get_key_by_kid('rsa')
+
+
+def test_rotenc():
+    op = _provider()
+    op.behavior_type.append('rotenc')
+    _first = json.loads(op.generate_jwks({}))
+    _second = json.loads(op.generate_jwks({}))
+    assert len(_first['keys']) == 3
+    assert _first['keys'][0]['n'] != _second['keys'][0]['n']
+    assert _first['keys'][2] == _second['keys'][2]
+
+
+def test_file(tmpdir):
+    path = os.path.join(str(tmpdir), 'jwks.json')
+    with open(path, 'w') as fp:
+        fp.write('{"keys": []}')
+
+    cache = JWKSCache()
+    assert cache.file(path) == '{"keys": []}'
+    assert cache.file(path) == '{"keys": []}'
+    assert cache.hits == 1
+
+    with open(path, 'w') as fp:
+        fp.write('{"keys": [{}]}')
+    assert cache.file(path) == '{"keys": [{}]}'
@@ -0,0 +1,67 @@
+import os
+import stat
+
+from otest.rp.key_setup import bootstrap_keys
+from otest.rp.key_setup import config_hash
+
+
+def _conf(tmpdir):
+    return [
+        {"type": "RSA", "key": os.path.join(str(tmpdir), "keys", "rsa_sig"),
+         "use": ["sig"], "size": 1024},
+        {"type": "EC", "crv": "P-256", "use": ["sig"]},
+        {"type": "EC", "crv": "P-256", "use": ["enc"]}
+    ]
+
+
+def test_bootstrap_keys(tmpdir):
+    key_conf = _conf(tmpdir)
+    cache_dir = os.path.join(str(tmpdir), 'cache')
+
+    jwks, keyjar, kidd = bootstrap_keys(key_conf, 'm%d', cache_dir=cache_dir,
+                                        processes=2)
+    assert [k['kid'] for k in jwks['keys']] == ['m0', 'm1', 'm2']
+    assert kidd == {'sig': {'RSA': 'm0', 'EC': 'm1'}, 'enc': {'EC': 'm2'}}
+    # only public keys in the JWKS
+    assert 'd' not in jwks['keys'][1]
+    assert keyjar.get_signing_key('EC')[0].d
+    # the configuration isn't modified
+    assert key_conf == _conf(tmpdir)
+
+    path = os.path.join(cache_dir, config_hash(key_conf, 'm%d') + '.json')
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+    # A restart gets the same keys
+    _jwks, _keyjar, _kidd = bootstrap_keys(key_conf, 'm%d',
+                                           cache_dir=cache_dir)
+    assert _jwks == jwks
+    assert _kidd == kidd
+
+    # Another template is another configuration
+    _jwks, _keyjar, _kidd = bootstrap_keys(key_conf, 'k%d',
+                                           cache_dir=cache_dir)
+    assert _jwks['keys'][1]['x'] != jwks['keys'][1]['x']
+
+
+def test_key_file_changed(tmpdir):
+    key_conf = _conf(tmpdir)
+    cache_dir = os.path.join(str(tmpdir), 'cache')
+
+    jwks, keyjar, kidd = bootstrap_keys(key_conf, cache_dir=cache_dir,
+                                        processes=1)
+    # No template, kids are thumbprints
+    assert jwks['keys'][0]['kid'] == keyjar.get_signing_key('RSA')[0].kid
+
+    _key_file = key_conf[0]['key']
+    os.remove(_key_file)
+    _jwks, _keyjar, _kidd = bootstrap_keys(key_conf, cache_dir=cache_dir,
+                                           processes=1)
+    assert os.path.isfile(_key_file)
+    assert _jwks['keys'][0]['n'] != jwks['keys'][0]['n']
+    assert _jwks['keys'][1]['x'] != jwks['keys'][1]['x']
+
+
+def test_no_cache(tmpdir):
+    jwks, keyjar, kidd = bootstrap_keys(_conf(tmpdir)[1:], 'm%d',
+                                        cache_dir=None)
+    assert len(jwks['keys']) == 2
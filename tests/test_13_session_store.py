@@ -0,0 +1,270 @@
+import os
+import sys
+import threading
+
+import pytest
+from oic.utils.http_util import Response
+from oic.utils.keyio import build_keyjar
+
+from otest.check import OK
+from otest.check import State
+from otest.conversation import Conversation
+from otest.events import EV_CONDITION
+from otest.rp import provider
+from otest.rp.jwks import JWKSCache
+from otest.rp.jwks import KeyPool
+from otest.session import Node
+from otest.session import SessionHandler
+from otest.session_store import FileStore
+from otest.session_store import MemoryStore
+from otest.session_store import SessionCodec
+from otest.session_store import SessionStoreError
+from otest.session_store import SQLiteStore
+from otest.session_store import make_store
+
+SCRIPT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..',
+                                          'script'))
+
+
+class Entity(object):
+    pass
+
+
+def _session(sid='abcdef'):
+    sh = SessionHandler(flows=None, order=['Code'], tool_version='1.0')
+    sh['sid'] = sid
+    sh['tests'] = [Node('rp-a', 'A test'), Node('rp-b', 'B test')]
+    sh['test_conf'] = {'start_page': 'https://rp.example.com'}
+    sh['index'] = 2
+    conv = Conversation({'sequence': []}, Entity(), None)
+    conv.test_id = 'rp-a'
+    conv.index = 2
+    conv.entity_id = sid
+    conv.events.store(EV_CONDITION, State('check', OK))
+    # Can't be serialized
+    conv.events.store('lock', threading.Lock())
+    sh['conv'] = conv
+    return sh
+
+
+def _restore(sh, conv):
+    conv.entity = Entity()
+    conv.entity.sid = sh['sid']
+
+
+def _codec():
+    return SessionCodec(lambda: SessionHandler(flows=None, order=['Code']),
+                        _restore)
+
+
+def _check(sh):
+    assert sh['index'] == 2
+    assert [n.name for n in sh['tests']] == ['rp-a', 'rp-b']
+    assert sh['test_conf'] == {'start_page': 'https://rp.example.com'}
+    conv = sh['conv']
+    assert conv.test_id == 'rp-a'
+    assert conv.index == 2
+    assert conv.entity_id == 'abcdef'
+    assert conv.entity.sid == 'abcdef'
+    assert conv.events.last_item(EV_CONDITION).status == OK
+    assert isinstance(conv.events.last_item('lock'), str)
+    assert len(conv.events) == 2
+
+
+def test_codec():
+    codec = _codec()
+    _sh = _session()
+    sh = codec.loads(codec.dumps(_sh))
+    _check(sh)
+    assert sh.order == ['Code']
+    # the original session isn't changed
+    assert not isinstance(_sh['conv'].events.last_item('lock'), str)
+
+    with pytest.raises(SessionStoreError):
+        codec.loads(b'garbage')
+
+
+def _provider():
+    keyjar = build_keyjar([{"type": "EC", "crv": "P-256", "use": ["sig"]}])[1]
+    return provider.Provider('https://op.example.com', {}, {}, None, None,
+                             None, None, 'abcdefghijklmnop', keyjar=keyjar,
+                             key_pool=KeyPool(depth=1, rsa_size=1024),
+                             jwks_cache=JWKSCache())
+
+
+def test_codec_provider():
+    sh = _session()
+    op = _provider()
+    op.behavior_type.append('updkeys')
+    op.claims_type = ['aggregated']
+    op.cdb['client'] = {'client_secret': 'secret'}
+    op.client_ids.append('client')
+    op.keyjar.add_symmetric('client', 'secret')
+    op.init_keys = op.keyjar.get_signing_key('EC')
+    sh['conv'].entity = op
+
+    def _restore_provider(sh, conv):
+        # Like another worker process, nothing is shared with op
+        conv.entity = _provider()
+
+    codec = SessionCodec(
+        lambda: SessionHandler(flows=None, order=['Code']), _restore_provider)
+    _op = codec.loads(codec.dumps(sh))['conv'].entity
+    assert _op is not op and _op.cdb is not op.cdb
+    assert _op.cdb == {'client': {'client_secret': 'secret'}}
+    assert _op.client_ids == ['client']
+    assert _op.behavior_type == ['updkeys']
+    assert _op.claims_type == ['aggregated']
+    assert _op.keyjar.get('sig', 'oct', 'client')[0].key == b'secret'
+    assert _op.init_keys == op.init_keys
+
+
+def test_memory_store():
+    store = MemoryStore(maxsize=2)
+    for sid in ['a', 'b', 'c']:
+        store[sid] = _session(sid)
+    assert 'a' not in store
+    assert store['b']['sid'] == 'b'
+    store['d'] = _session('d')
+    # b was used after c
+    assert 'c' not in store
+    assert 'b' in store
+
+    with pytest.raises(KeyError):
+        _ = store['a']
+
+    store.ttl = -1
+    store['e'] = _session('e')
+    assert store.get('e') is None
+
+
+@pytest.mark.parametrize('typ', ['sqlite', 'file'])
+def test_shared_store(tmpdir, typ):
+    if typ == 'sqlite':
+        spec = 'sqlite:{}'.format(os.path.join(str(tmpdir), 'sessions.db'))
+    else:
+        spec = 'file:{}'.format(os.path.join(str(tmpdir), 'sessions'))
+
+    # Two stores on the same database are like two worker processes
+    store = make_store(spec, _codec())
+    other = make_store(spec, _codec())
+    assert isinstance(store, SQLiteStore if typ == 'sqlite' else FileStore)
+
+    store['abcdef'] = _session()
+    assert 'abcdef' in other
+    sh = other['abcdef']
+    _check(sh)
+
+    sh['index'] = 3
+    other['abcdef'] = sh
+    assert store['abcdef']['index'] == 3
+    assert len(store) == 1
+
+    del store['abcdef']
+    assert 'abcdef' not in other
+    assert other.get('abcdef') is None
+
+
+def test_expire(tmpdir):
+    for store in [
+            SQLiteStore(os.path.join(str(tmpdir), 'sessions.db'), _codec()),
+            FileStore(os.path.join(str(tmpdir), 'sessions'), _codec())]:
+        store.ttl = -1
+        store['abc'] = _session('abc')
+        assert 'abc' not in store
+        store.expire()
+        assert len(store) == 0
+
+
+def test_bad_sid(tmpdir):
+    store = FileStore(str(tmpdir), _codec())
+    assert store.get('../etc') is None
+    assert '../etc' not in store
+    with pytest.raises(SessionStoreError):
+        store['../etc'] = _session()
+
+
+def test_unknown_store():
+    with pytest.raises(SessionStoreError):
+        make_store('redis:localhost')
+
+
+class Provider(object):
+    @staticmethod
+    def endpoints():
+        return ['authorization']
+
+
+class FakeWebTester(object):
+    def __init__(self, inut, sh, **kwargs):
+        self.inut = inut
+        self.sh = sh
+
+    def run(self, test_id, **kw_args):
+        conv = Conversation({'sequence': []}, Provider(), None)
+        conv.test_id = test_id
+        self.sh['conv'] = conv
+        self.sh['index'] = 0
+        return Response('started')
+
+    def restore_conversation(self, conv, **kw_args):
+        conv.entity = Provider()
+
+    def do_next(self, req, filename, path='', **kwargs):
+        self.sh['index'] += 1
+        self.sh['conv'].events.store('path', path)
+        return Response('next')
+
+
+class ProfileHandler(object):
+    def __init__(self, sh):
+        pass
+
+    @staticmethod
+    def log_path(sid, test_id):
+        return ''
+
+
+class BeakerSession(dict):
+    id = 'beaker'
+
+
+def test_testtool_serializing_store(tmpdir, monkeypatch):
+    sys.path.insert(0, SCRIPT_DIR)
+    try:
+        import testtool
+    finally:
+        sys.path.remove(SCRIPT_DIR)
+    monkeypatch.setattr(testtool, 'WebTester', FakeWebTester)
+
+    app = testtool.Application(
+        'https://op.example.org/',
+        session_store='sqlite:{}'.format(tmpdir.join('sessions.db')),
+        internal=False, flows={'rp-a': {}}, conf=None,
+        profile_handler=ProfileHandler, base='https://op.example.org/')
+    app.endpoints = {'.well-known/openid-configuration': 'provider_info'}
+
+    sh = app.new_session_handler()
+    sh['test_conf'] = {'start_page': 'https://rp.example.com'}
+    session = BeakerSession(session_info=sh)
+
+    def _request(path):
+        environ = {'beaker.session': session, 'REMOTE_ADDR': '127.0.0.1',
+                   'PATH_INFO': path, 'REQUEST_METHOD': 'GET',
+                   'QUERY_STRING': ''}
+        return b''.join(app.application(environ, lambda *args: None))
+
+    assert _request('rp-a') == b'started'
+    sid = sh['sid']
+
+    # Every request gets the session from the store
+    assert _request('{}/authorization'.format(sid)) == b'next'
+    assert _request('{}/.well-known/openid-configuration'.format(
+        sid)) == b'next'
+
+    _sh = app.session_conf[sid]
+    assert _sh is not sh
+    assert _sh['index'] == 2
+    assert _sh['conv'].test_id == 'rp-a'
+    assert _sh['conv'].events.get_data('path') == [
+        'authorization', 'provider_info']
@@ -0,0 +1,216 @@
+import os
+import threading
+
+import pytest
+from oic.oic.message import RegistrationResponse
+from oic.utils.keyio import build_keyjar
+
+from otest.check import OK
+from otest.check import State
+from otest.checkpoint import CheckpointError
+from otest.checkpoint import DELTA
+from otest.checkpoint import FULL
+from otest.checkpoint import HEADER
+from otest.checkpoint import MAGIC
+from otest.checkpoint import read_frames
+from otest.conversation import Conversation
+from otest.events import EV_CONDITION
+from otest.events import EV_PROTOCOL_RESPONSE
+from otest.rp.jwks import JWKSCache
+from otest.rp.jwks import KeyPool
+from otest.rp.provider import Provider
+from otest.session import Node
+from otest.session import SessionHandler
+
+KEY_CONF = [{"type": "EC", "crv": "P-256", "use": ["sig"]}]
+
+
+class Client(object):
+    def __init__(self):
+        self.keyjar = build_keyjar(KEY_CONF)[1]
+        self.client_id = ''
+        self.behaviour = {}
+
+
+def _session():
+    sh = SessionHandler(flows=None, order=['Code'], tool_version='1.0')
+    sh['sid'] = 'abcdef'
+    sh['tests'] = [Node('oidc-a', 'A test')]
+    sh['index'] = 1
+
+    client = Client()
+    client.client_id = 'client'
+    client.client_secret = 'secret'
+    client.registration_response = RegistrationResponse(
+        client_id='client', redirect_uris=['https://rp.example.com/cb'])
+    client.keyjar.add_symmetric('https://op.example.com', 'secret')
+
+    conv = Conversation({'sequence': []}, client, None)
+    conv.test_id = 'oidc-a'
+    conv.index = 1
+    conv.events.store(EV_CONDITION, State('check', OK))
+    # Can't be serialized
+    conv.events.store('lock', threading.Lock())
+    sh['conv'] = conv
+    return sh
+
+
+def _restore(sh, conv):
+    conv.entity = Client()
+
+
+def _load(path):
+    sh = SessionHandler(flows=None, order=['Code'])
+    sh.load(path, _restore)
+    return sh
+
+
+def test_checkpoint(tmpdir):
+    path = os.path.join(str(tmpdir), 'abcdef.cp')
+    _sh = _session()
+    _sh.dump(path)
+
+    sh = _load(path)
+    assert sh['index'] == 1
+    assert [n.name for n in sh['tests']] == ['oidc-a']
+    conv = sh['conv']
+    assert conv.test_id == 'oidc-a'
+    assert conv.index == 1
+    assert conv.events.last_item(EV_CONDITION).status == OK
+    assert isinstance(conv.events.last_item('lock'), str)
+
+    client = conv.entity
+    assert client.client_secret == 'secret'
+    assert client.registration_response['client_id'] == 'client'
+    assert client.keyjar.get_signing_key('EC')[0].d == \
+        _sh['conv'].entity.keyjar.get_signing_key('EC')[0].d
+    assert client.keyjar.get('sig', 'oct', 'https://op.example.com')
+
+
+def test_delta(tmpdir):
+    path = os.path.join(str(tmpdir), 'abcdef.cp')
+    _sh = _session()
+    _sh.dump(path)
+    _size = os.path.getsize(path)
+
+    _sh['index'] = 2
+    del _sh['tests']
+    _sh['conv'].index = 2
+    _sh['conv'].events.store(EV_PROTOCOL_RESPONSE, {'foo': 'bar'})
+    _sh.dump(path)
+    # Only the changes were appended
+    assert os.path.getsize(path) - _size < _size / 2
+
+    _sh['conv'].entity.client_secret = 'other'
+    _sh.dump(path)
+
+    sh = _load(path)
+    assert sh['index'] == 2
+    assert 'tests' not in sh
+    conv = sh['conv']
+    assert conv.index == 2
+    assert len(conv.events) == 3
+    assert conv.events.last_item(EV_PROTOCOL_RESPONSE) == {'foo': 'bar'}
+    assert conv.entity.client_secret == 'other'
+
+    # A new conversation replaces the old one
+    _sh['conv'] = Conversation({'sequence': []}, Client(), None)
+    _sh['conv'].test_id = 'oidc-b'
+    _sh.dump(path)
+    conv = _load(path)['conv']
+    assert conv.test_id == 'oidc-b'
+    assert len(conv.events) == 0
+
+    # Not a delta
+    _sh.dump(path, delta=False)
+    assert os.path.getsize(path) < _size
+
+
+def test_reset_events(tmpdir):
+    path = os.path.join(str(tmpdir), 'abcdef.cp')
+    _sh = _session()
+    _sh.dump(path)
+
+    events = _sh['conv'].events
+    events.reset()
+    for i in range(3):
+        events.store(EV_PROTOCOL_RESPONSE, {'n': i})
+    _sh.dump(path)
+
+    with open(path, 'rb') as fp:
+        assert [f[0] for f in read_frames(fp.read())] == [FULL]
+    conv = _load(path)['conv']
+    assert conv.events.get_data(EV_PROTOCOL_RESPONSE) == [
+        {'n': 0}, {'n': 1}, {'n': 2}]
+    assert len(conv.events) == 3
+
+    # Growing again gives a delta
+    events.store(EV_PROTOCOL_RESPONSE, {'n': 3})
+    _sh.dump(path)
+    with open(path, 'rb') as fp:
+        assert [f[0] for f in read_frames(fp.read())] == [FULL, DELTA]
+    assert len(_load(path)['conv'].events) == 4
+
+
+def test_incomplete_frame(tmpdir):
+    path = os.path.join(str(tmpdir), 'abcdef.cp')
+    _sh = _session()
+    _sh.dump(path)
+    _sh['index'] = 2
+    _sh.dump(path)
+
+    # The process died while writing the delta
+    with open(path, 'rb') as fp:
+        data = fp.read()
+    with open(path, 'wb') as fp:
+        fp.write(data[:-5])
+
+    assert _load(path)['index'] == 1
+    # Someone else wrote to the file, next checkpoint is a full one
+    _sh['index'] = 3
+    _sh.dump(path)
+    assert _load(path)['index'] == 3
+
+
+def test_bad_checkpoint(tmpdir):
+    path = os.path.join(str(tmpdir), 'abcdef.cp')
+    with pytest.raises(CheckpointError):
+        _load(path)
+
+    with open(path, 'wb') as fp:
+        fp.write(b'garbage' * 10)
+    with pytest.raises(CheckpointError):
+        _load(path)
+
+    with open(path, 'wb') as fp:
+        fp.write(HEADER.pack(MAGIC, 99, 0, 0))
+    with pytest.raises(CheckpointError):
+        _load(path)
+
+
+def _provider():
+    jwks, keyjar, kidd = build_keyjar(KEY_CONF)
+    return Provider('https://op.example.com', {}, {}, None, None, None, None,
+                    'abcdefghijklmnop', keyjar=keyjar,
+                    key_pool=KeyPool(depth=1, rsa_size=1024),
+                    jwks_cache=JWKSCache())
+
+
+def test_provider_state():
+    op = _provider()
+    op.behavior_type.append('updkeys')
+    op.cdb['client'] = {'client_secret': 'secret',
+                        'redirect_uris': [('https://rp.example.com/cb', {})]}
+    op.cdb['other'] = {'client_secret': 'secret'}
+    op.client_ids.append('client')
+    op.keyjar.add_symmetric('client', 'secret')
+    op.init_keys = op.keyjar.get_signing_key('EC')
+
+    _op = _provider()
+    _op.import_state(op.export_state())
+    assert _op.behavior_type == ['updkeys']
+    assert _op.server.behavior_type == ['updkeys']
+    assert _op.cdb == {'client': op.cdb['client']}
+    assert _op.client_ids == ['client']
+    assert _op.keyjar.get('sig', 'oct', 'client')[0].key == b'secret'
+    assert _op.init_keys == op.init_keys
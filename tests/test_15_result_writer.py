@@ -0,0 +1,139 @@
+import os
+import threading
+
+from otest.check import OK
+from otest.check import State
+from otest.conversation import Conversation
+from otest.events import EV_CONDITION
+from otest.events import EV_OPERATION
+from otest.events import Events
+from otest.journal import Journal
+from otest.result import Result
+from otest.result_writer import ResultWriter
+from otest.result_writer import write_lines
+from otest.session import SessionHandler
+
+
+def test_write_lines(tmpdir):
+    fname = os.path.join(str(tmpdir), 'a', 'b', 'test.txt')
+    write_lines(fname, iter(['one', 'two', '', 'three']), buffer_size=4)
+    with open(fname) as fp:
+        assert fp.read() == 'one\ntwo\n\nthree'
+    assert os.listdir(os.path.dirname(fname)) == ['test.txt']
+
+
+def test_writer(tmpdir):
+    writer = ResultWriter()
+    fname = os.path.join(str(tmpdir), 'log', 'test.txt')
+
+    # Holds up the worker until the other jobs are queued
+    _go = threading.Event()
+
+    def _wait():
+        _go.wait()
+        yield 'first'
+
+    writer.submit(os.path.join(str(tmpdir), 'log', 'first.txt'), _wait())
+    for i in range(3):
+        writer.submit(fname, ['version {}'.format(i)])
+    _go.set()
+    assert writer.flush(5)
+
+    with open(fname) as fp:
+        assert fp.read() == 'version 2'
+    assert writer.written + writer.skipped == 4
+    assert writer.skipped >= 1
+
+
+def test_write_info(tmpdir):
+    sh = SessionHandler(tool_version='1.0')
+    conv = Conversation({'sequence': []}, None, None)
+    conv.test_id = 'test'
+    sh['conv'] = conv
+
+    events = Events(Journal(os.path.join(str(tmpdir), 'test.jnl')))
+    events.store(EV_OPERATION, 'Discovery')
+    events.store(EV_CONDITION, State('Done', OK))
+    tinfo = {'test_id': 'test', 'profile_info': None, 'events': events}
+
+    writer = ResultWriter()
+    res = Result(sh, None, writer, index=None)
+    fname = os.path.join(str(tmpdir), 'test.txt')
+    res.write_info(tinfo, file_name=fname)
+    assert res.test_status('test')['result'] == 'PASSED'
+
+    # Not in the report
+    events.store(EV_OPERATION, 'Registration')
+
+    writer.flush()
+    with open(fname) as fp:
+        txt = fp.read()
+    assert txt.startswith('Test tool version: 1.0\nTest ID: test\n')
+    assert 'Discovery' in txt
+    assert 'Registration' not in txt
+    assert txt.endswith('RESULT: PASSED\n')
+
+
+def test_write_info_after_reset(tmpdir):
+    sh = SessionHandler(tool_version='1.0')
+    conv = Conversation({'sequence': []}, None, None)
+    conv.test_id = 'test'
+    sh['conv'] = conv
+
+    _path = os.path.join(str(tmpdir), 'test.jnl')
+    events = Events(Journal(_path))
+    events.store(EV_OPERATION, 'Discovery')
+    events.store(EV_CONDITION, State('Done', OK))
+    tinfo = {'test_id': 'test', 'profile_info': None, 'events': events}
+
+    writer = ResultWriter()
+    _go = threading.Event()
+
+    def _wait():
+        _go.wait()
+        yield 'first'
+
+    writer.submit(os.path.join(str(tmpdir), 'first.txt'), _wait())
+    res = Result(sh, None, writer, index=None)
+    fname = os.path.join(str(tmpdir), 'test.txt')
+    res.write_info(tinfo, file_name=fname)
+
+    # The test is run again before the report is written
+    events.reset()
+    events.journal.close()
+    os.unlink(_path)
+    events.store(EV_OPERATION, 'Registration')
+    _go.set()
+
+    assert writer.flush(5)
+    with open(fname) as fp:
+        txt = fp.read()
+    assert 'Discovery' in txt
+    assert 'Registration' not in txt
+    assert txt.endswith('RESULT: PASSED\n')
+
+
+class ThreadResult(Result):
+    threads = []
+
+    def print_result(self, events):
+        self.threads.append(threading.current_thread().name)
+        return Result.print_result(self, events)
+
+
+def test_write_info_renders_in_writer(tmpdir):
+    sh = SessionHandler(tool_version='1.0')
+    conv = Conversation({'sequence': []}, None, None)
+    conv.test_id = 'test'
+    sh['conv'] = conv
+
+    events = Events()
+    events.store(EV_OPERATION, 'Discovery')
+    events.store(EV_CONDITION, State('Done', OK))
+    tinfo = {'test_id': 'test', 'profile_info': None, 'events': events}
+
+    writer = ResultWriter()
+    res = ThreadResult(sh, None, writer, index=None)
+    res.write_info(tinfo, file_name=os.path.join(str(tmpdir), 'test.txt'))
+    assert writer.flush(5)
+    assert ThreadResult.threads == ['otest-result-writer']
@@ -0,0 +1,147 @@
+import os
+import shutil
+
+import pytest
+
+from otest.check import ERROR
+from otest.check import OK
+from otest.check import State
+from otest.conversation import Conversation
+from otest.events import EV_CONDITION
+from otest.events import EV_OPERATION
+from otest.events import Events
+from otest.result import Result
+from otest.result_index import ResultIndex
+from otest.result_index import log_entries
+from otest.result_writer import ResultWriter
+from otest.session import SessionHandler
+
+
+class Client(object):
+    provider_info = {'issuer': 'https://op.example.com'}
+
+
+def _touch(path):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    open(path, 'w').close()
+
+
+def _index(tmpdir, files=False):
+    index = ResultIndex(os.path.join(str(tmpdir), 'log', '.results.db'))
+    for profile, test_id, status in [('C.T.T.T', 'OP-a', 'PASSED'),
+                                     ('C.T.T.T', 'OP-b', 'ERROR'),
+                                     ('CI.T.T.T', 'OP-b', 'CRITICAL')]:
+        path = os.path.join(str(tmpdir), 'log', 's_op.example.com', profile,
+                            '{}.txt'.format(test_id))
+        index.record(path, test_id, issuer='https://op.example.com',
+                     profile=profile, status=status, errors='Bad')
+        if files:
+            _touch(path)
+    path = os.path.join(str(tmpdir), 'log', 's_other', 'C.T.T.T', 'OP-a.txt')
+    index.record(path, 'OP-a', issuer='https://other', profile='C.T.T.T',
+                 status='PASSED')
+    if files:
+        _touch(path)
+    return index
+
+
+def test_query(tmpdir):
+    index = _index(tmpdir)
+    res = index.query(issuer='https://op.example.com',
+                      status=['ERROR', 'CRITICAL'])
+    assert [(r['profile'], r['test_id']) for r in res] == [
+        ('C.T.T.T', 'OP-b'), ('CI.T.T.T', 'OP-b')]
+    assert res[0]['errors'] == 'Bad'
+    assert res[0]['path'].endswith(os.path.join('C.T.T.T', 'OP-b.txt'))
+
+    assert len(index.query(test_id='OP-a')) == 2
+    assert len(index.query()) == 4
+
+    # Replaces
+    index.record(res[0]['path'], 'OP-b', issuer='https://op.example.com',
+                 profile='C.T.T.T', status='PASSED')
+    assert len(index.query(status='ERROR')) == 0
+
+    with pytest.raises(ValueError):
+        index.query(path='/etc/passwd')
+
+    assert ResultIndex(os.path.join(str(tmpdir), 'none.db')).query() == []
+
+
+def test_entries(tmpdir):
+    index = _index(tmpdir, files=True)
+    root = os.path.join(str(tmpdir), 'log')
+    assert index.entries(root, dirs=True) == ['s_op.example.com', 's_other']
+    _iss = os.path.join(root, 's_op.example.com')
+    assert index.entries(_iss, dirs=True) == ['C.T.T.T', 'CI.T.T.T']
+    assert index.entries(os.path.join(_iss, 'C.T.T.T')) == ['OP-a.txt',
+                                                            'OP-b.txt']
+    assert log_entries(root, dirs=True, index=index) == ['s_op.example.com',
+                                                         's_other']
+
+    # Not indexed
+    _dir = os.path.join(str(tmpdir), 'old', 'C.T.T.T')
+    os.makedirs(_dir)
+    open(os.path.join(_dir, 'OP-c.txt'), 'w').close()
+    open(os.path.join(_dir, '.hidden'), 'w').close()
+    assert log_entries(_dir, index=index) == ['OP-c.txt']
+    assert log_entries(os.path.dirname(_dir), dirs=True,
+                       index=index) == ['C.T.T.T']
+
+    # Partly indexed, what's on disk is never hidden
+    _dir = os.path.join(_iss, 'C.T.T.T')
+    index.forget(os.path.join(_dir, 'OP-a.txt'))
+    os.makedirs(os.path.join(_dir, 'sub'))
+    assert log_entries(_dir, index=index) == ['OP-a.txt', 'OP-b.txt']
+    assert log_entries(_iss, dirs=True, index=index) == ['C.T.T.T',
+                                                         'CI.T.T.T']
+    assert log_entries(_dir, dirs=True, index=index) == ['sub']
+
+
+def test_entries_deleted(tmpdir):
+    index = _index(tmpdir, files=True)
+    root = os.path.join(str(tmpdir), 'log')
+    _dir = os.path.join(root, 's_op.example.com', 'C.T.T.T')
+
+    # A deleted log is no longer listed, nor in the index
+    os.unlink(os.path.join(_dir, 'OP-b.txt'))
+    assert log_entries(_dir, index=index) == ['OP-a.txt']
+    assert index.query(test_id='OP-b', profile='C.T.T.T') == []
+
+    shutil.rmtree(os.path.join(root, 's_other'))
+    assert log_entries(root, dirs=True, index=index) == ['s_op.example.com']
+    assert index.query(issuer='https://other') == []
+
+    shutil.rmtree(_dir)
+    with pytest.raises(OSError):
+        log_entries(_dir, index=index)
+    assert [r['profile'] for r in index.query()] == ['CI.T.T.T']
+
+
+def test_write_info(tmpdir):
+    sh = SessionHandler(tool_version='1.0', profile='C.T.T.T')
+    conv = Conversation({'sequence': []}, Client(), None)
+    conv.test_id = 'OP-a'
+    sh['conv'] = conv
+
+    events = Events()
+    events.store(EV_OPERATION, 'Discovery')
+    events.store(EV_CONDITION, State('check', ERROR, message='Bad'))
+    events.store(EV_CONDITION, State('Done', OK))
+    tinfo = {'test_id': 'OP-a', 'profile_info': None, 'events': events}
+
+    index = ResultIndex(os.path.join(str(tmpdir), 'results.db'))
+    writer = ResultWriter()
+    fname = os.path.join(str(tmpdir), 'OP-a.txt')
+    Result(sh, None, writer, index).write_info(tinfo, file_name=fname)
+    writer.flush()
+
+    res = index.query(issuer='https://op.example.com')
+    assert len(res) == 1
+    assert res[0]['test_id'] == 'OP-a'
+    assert res[0]['profile'] == 'C.T.T.T'
+    assert res[0]['status'] == 'ERROR'
+    assert res[0]['errors'] == 'Bad'
+    assert res[0]['duration'] > 0
+    assert res[0]['path'] == os.path.abspath(fname)
@@ -0,0 +1,108 @@
+import io
+import os
+import tarfile
+import zlib
+
+import pytest
+
+from otest.archive import ArchiveError
+from otest.archive import iter_archive
+from otest.archive import split_extension
+from otest.aus.app import WebApplication
+from otest.result_writer import ResultWriter
+from otest.summation import create_tar_archive
+
+LOGS = {'OP-a.txt': 'a' * 1000, 'OP-b.txt': 'b' * 100000, 'OP-c': 'c'}
+
+
+def _logs(root):
+    log_dir = os.path.join(root, 'log', 's_op.example.com', 'C.T.T.T')
+    os.makedirs(log_dir)
+    for name, txt in LOGS.items():
+        with open(os.path.join(log_dir, name), 'w') as fp:
+            fp.write(txt)
+    open(os.path.join(log_dir, '.hidden'), 'w').close()
+    open(os.path.join(log_dir, 'OP-d.txt.1.tmp'), 'w').close()
+    return log_dir
+
+
+def _check(data):
+    tar = tarfile.open(fileobj=io.BytesIO(data))
+    assert tar.getnames() == ['C.T.T.T/OP-a.txt', 'C.T.T.T/OP-b.txt',
+                              'C.T.T.T/OP-c.txt']
+    for name, txt in LOGS.items():
+        if not name.endswith('.txt'):
+            name += '.txt'
+        _member = tar.extractfile('C.T.T.T/{}'.format(name))
+        assert _member.read().decode() == txt
+
+
+def test_iter_archive(tmpdir):
+    log_dir = _logs(str(tmpdir))
+    writer = ResultWriter()
+    writer.submit(os.path.join(log_dir, 'OP-e.txt'), ['queued'])
+
+    chunks = list(iter_archive(log_dir, 'C.T.T.T', chunk_size=4096,
+                               writer=writer))
+    assert max(len(c) for c in chunks) <= 2 * 4096
+    tar = tarfile.open(fileobj=io.BytesIO(b''.join(chunks)))
+    assert 'C.T.T.T/OP-e.txt' in tar.getnames()
+
+
+def test_compressed(tmpdir):
+    log_dir = _logs(str(tmpdir))
+    data = b''.join(iter_archive(log_dir, 'C.T.T.T', 'tar.gz', writer=None))
+    _check(zlib.decompress(data, 31))
+    assert len(data) < 10000
+
+    _check(b''.join(iter_archive(log_dir, 'C.T.T.T', writer=None)))
+
+    with pytest.raises(ArchiveError):
+        iter_archive(log_dir, 'C.T.T.T', 'zip')
+
+
+def test_split_extension():
+    assert split_extension('C.T.T.T.tar.gz') == ('C.T.T.T', 'tar.gz')
+    assert split_extension('C.T.T.T.tar') == ('C.T.T.T', 'tar')
+    assert split_extension('C.T.T.T.zip') == ('C.T.T.T.zip', None)
+
+
+def test_create_tar_archive(tmpdir, monkeypatch):
+    _logs(str(tmpdir))
+    monkeypatch.chdir(str(tmpdir))
+    create_tar_archive('s_op.example.com', 'C.T.T.T', writer=None)
+    assert os.getcwd() == str(tmpdir)
+    with open(os.path.join('tar', 's_op.example.com', 'C.T.T.T.tar'),
+              'rb') as fp:
+        _check(fp.read())
+    assert os.listdir(os.path.join('tar', 's_op.example.com')) == [
+        'C.T.T.T.tar']
+
+
+class Info(object):
+    def not_found(self):
+        return 'not found'
+
+    def static(self, path):
+        return 'static {}'.format(path)
+
+
+def test_tar_route(tmpdir, monkeypatch):
+    _logs(str(tmpdir))
+    monkeypatch.chdir(str(tmpdir))
+    _resp = {}
+
+    def start_response(status, headers):
+        _resp['status'] = status
+        _resp['headers'] = dict(headers)
+
+    data = b''.join(WebApplication.archive(
+        Info(), 'tar/s_op.example.com/C.T.T.T.tgz', {}, start_response))
+    assert _resp['headers']['Content-Type'] == 'application/gzip'
+    _check(zlib.decompress(data, 31))
+
+    assert WebApplication.archive(Info(), 'tar/../C.T.T.T.tar', {},
+                                  start_response) == 'not found'
+    assert WebApplication.archive(
+        Info(), 'tar/s_op.example.com/C.tar', {},
+        start_response) == 'static tar/s_op.example.com/C.tar'
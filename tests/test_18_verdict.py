@@ -0,0 +1,85 @@
+import pytest
+
+from otest import Break
+from otest.check import CRITICAL
+from otest.check import ERROR
+from otest.check import INCOMPLETE
+from otest.check import OK
+from otest.check import State
+from otest.check import WARNING
+from otest.conversation import Conversation
+from otest.events import EV_CONDITION
+from otest.events import EV_FAULT
+from otest.events import EV_OPERATION
+from otest.events import Events
+from otest.summation import completed
+from otest.summation import eval_state
+from otest.summation import get_errors
+from otest.summation import represent_result
+from otest.summation import result_code
+from otest.summation import verdict
+from otest.verify import Verify
+
+
+def test_incremental():
+    events = Events()
+    events.store(EV_OPERATION, 'Discovery')
+    assert eval_state(events) == INCOMPLETE
+    assert result_code(events) == 'PARTIAL RESULT'
+    # Attached and kept up to date from now on
+    _verdict = verdict(events)
+    assert verdict(events) is _verdict
+
+    events.store(EV_CONDITION, State('check-a', WARNING, message='Hmm'))
+    events.store(EV_CONDITION, State('check-b', ERROR, message='Bad'))
+    assert not completed(events)
+    events.store(EV_CONDITION, State('Done', OK))
+    assert completed(events)
+    assert eval_state(events) == ERROR
+    assert represent_result(events) == 'ERROR\nErrors:\nBad\nWarnings:\nHmm'
+    assert get_errors(events) == 'Bad'
+
+    events.store(EV_FAULT, 'STATUS: 4')
+    assert get_errors(events) == 'STATUS: 4. Bad'
+
+    # The same as if it was made from scratch
+    _new = verdict(list(events))
+    assert _new.state == _verdict.state
+    assert _new.errors == _verdict.errors
+    assert _new.faults == _verdict.faults
+
+    events.reset()
+    assert eval_state(events) == INCOMPLETE
+    assert represent_result(events) == 'PARTIAL RESULT'
+
+
+def test_passed():
+    events = Events()
+    events.store(EV_CONDITION, State('check-a', OK))
+    events.store(EV_CONDITION, State('Done', OK))
+    assert result_code(events) == 'PASSED'
+    assert OK in verdict(events).done
+
+
+class Check(object):
+    def __init__(self, status):
+        self.status = status
+
+    def __call__(self, conv):
+        return State('check', self.status, message='Stop')
+
+
+def test_check_severity():
+    conv = Conversation({'sequence': []}, None, None)
+    ver = Verify(None, conv)
+    ver.do_check(Check, status=WARNING)
+    with pytest.raises(Break):
+        ver.do_check(Check, status=CRITICAL)
+    assert verdict(conv.events).halt.status == CRITICAL
+    assert 'INFO: Stop' in get_errors(conv.events)
+
+    # A stopping condition that isn't the latest one stored still stops
+    stat = State('Other', CRITICAL, message='Stop')
+    with pytest.raises(Break):
+        ver.check_severity(stat)
+    ver.check_severity(State('Fine', OK))
@@ -0,0 +1,243 @@
+import json
+from types import SimpleNamespace
+
+from mako.lookup import TemplateLookup
+from oic.oic import AuthorizationRequest
+from oic.utils.http_util import Response
+
+from otest.aus.handling import WebIh
+from otest.aus.preproc.testinfo import iter_trace_output
+from otest.aus.preproc.testinfo import trace_output
+from otest.events import EV_CONDITION
+from otest.events import EV_OPERATION
+from otest.events import EV_PROTOCOL_REQUEST
+from otest.events import EV_REQUEST
+from otest.events import EventPage
+from otest.events import Events
+from otest.events import OUTGOING
+from otest.events import layout
+from otest.check import OK
+from otest.check import State
+from otest.handling import TRACE_MARK
+from otest.handling import respond_with_trace
+from otest.handling import stream_into
+from otest.rp.display import display
+from otest.rp.display import iter_display
+from otest import summation
+
+
+def _events():
+    events = Events()
+    events.store(EV_OPERATION, 'Authorization')
+    events.store(EV_PROTOCOL_REQUEST,
+                 AuthorizationRequest(client_id='client', scope=['openid']),
+                 direction=OUTGOING)
+    events.store(EV_CONDITION, State('Done', OK))
+    return events
+
+
+def test_render_once():
+    events = _events()
+    event = events.get(EV_PROTOCOL_REQUEST)[0]
+    calls = []
+
+    def _render(ev):
+        calls.append(ev)
+        return ev.typ
+
+    assert event.render('test', _render) == EV_PROTOCOL_REQUEST
+    assert event.render('test', _render) == EV_PROTOCOL_REQUEST
+    assert len(calls) == 1
+
+    event.changed()
+    event.render('test', _render)
+    assert len(calls) == 2
+
+    event.data = AuthorizationRequest(client_id='other')
+    event.render('test', _render)
+    assert len(calls) == 3
+
+
+def test_layout():
+    events = _events()
+    start = events.events[0].timestamp
+    event = events.get(EV_PROTOCOL_REQUEST)[0]
+    txt = layout(start, event)
+    assert ' --> AuthorizationRequest {\n' in txt
+    assert '"client_id": "client"' in txt
+    assert layout(start, event) == txt
+
+    event.data['client_id'] = 'other'
+    assert layout(start, event) == txt
+    event.changed()
+    assert '"client_id": "other"' in layout(start, event)
+
+    lines = summation.trace_output(events)
+    assert lines[0] == 'Trace output\n'
+    assert lines[2] == layout(start, event)
+
+
+def test_html():
+    events = _events()
+    rows = list(iter_trace_output(events))
+    assert rows[0].startswith('<table')
+    assert rows[1].startswith('<tr class="info"><td>0.000000</td>')
+    assert rows[-1] == '</table>'
+    assert trace_output(events) == '\n'.join(rows)
+
+    lines = list(iter_display(events))
+    assert lines[:2] == ['<h4>Request</h4>', '<pre>']
+    assert lines[-3:] == [
+        '<ul>', '<li style="background-color:lightgreen;">Done</li>',
+        '</ul>']
+    assert display(events) == '\n'.join(lines)
+
+
+def test_stream_into():
+    page = ['<html>', '<body>{}</body>'.format(TRACE_MARK), '</html>']
+    rendered = []
+
+    def _lines():
+        for line in ['a', 'b']:
+            rendered.append(line)
+            yield line
+
+    body = stream_into(page, _lines())
+    assert rendered == []
+    assert ''.join(body) == '<html><body>a\nb\n</body></html>'
+
+    body = stream_into([p.encode('utf-8') for p in page], iter(['a']))
+    assert b''.join(body) == b'<html><body>a\n</body></html>'
+
+    # Not in the page
+    assert list(stream_into(['<html></html>'], _lines())) == ['<html></html>']
+    assert rendered == ['a', 'b']
+
+
+def _many(n):
+    events = Events()
+    for i in range(n):
+        events.store(EV_OPERATION, '<op {}>'.format(i))
+    return events
+
+
+def test_to_html():
+    events = _events()
+    txt = events.to_html()
+    assert '<td>phase</td><td>Authorization</td></tr>' in txt
+    assert '&quot;client_id&quot;: &quot;client&quot;' in txt
+    assert events.to_html('list').count('<li>') == 3
+
+
+def test_page():
+    events = _many(25)
+    page = events.page(2, 10)
+    assert (page.offset, len(page), page.total, page.pages) == (20, 5, 25, 3)
+    assert page.number == 2
+    assert page.has_previous() and not page.has_next()
+    assert events.page(0, 10).has_next()
+    assert len(events.page(3, 10)) == 0
+
+    rows = list(page.html())
+    assert len(rows) == 7
+    assert '&lt;op 20&gt;' in rows[1]
+    # Only the events on the page are rendered
+    assert events.events[20]._render is not None
+    assert events.events[19]._render is None
+
+    res = json.loads(''.join(page.json()))
+    assert (res['offset'], res['limit'], res['total']) == (20, 10, 25)
+    assert [e['data'] for e in res['events']] == [
+        '<op {}>'.format(i) for i in range(20, 25)]
+
+    res = json.loads(''.join(EventPage(_events(), 0, None).json()))
+    assert res['events'][1]['data']['client_id'] == 'client'
+
+
+
+def _page(template):
+    lookup = TemplateLookup()
+    lookup.put_string('page.mako', template)
+    return Response(mako_template='page.mako', template_lookup=lookup)
+
+
+def test_respond_with_trace():
+    _status = []
+
+    def start_response(status, headers):
+        _status.append(status)
+
+    body = respond_with_trace(_page('<p>${trace_output}</p>'), {},
+                              start_response, iter(['a', 'b']))
+    assert ''.join(body) == '<p>a\nb\n</p>'
+
+    # A template that doesn't put trace_output in the page as it is
+    body = respond_with_trace(_page('<p>${trace_output | h}</p>'), {},
+                              start_response, iter(['<a>', 'b']))
+    assert body == ['<p>&lt;a&gt;\nb</p>']
+    assert _status == ['200 OK', '200 OK']
+
+
+def _balanced(lines):
+    depth = 0
+    for line in lines:
+        if line == '<ul>':
+            depth += 1
+        elif line == '</ul>':
+            depth -= 1
+        assert 0 <= depth <= 1
+    return depth == 0
+
+
+def test_display_pages():
+    events = Events()
+    for i in range(4):
+        events.store(EV_CONDITION, State('c{}'.format(i), OK))
+        events.store(EV_REQUEST, '{"n": %d}' % i)
+        events.store(EV_CONDITION, State('d{}'.format(i), OK))
+        events.store(EV_OPERATION, 'op')
+
+    lines = list(iter_display(events))
+    assert _balanced(lines)
+    # The request is shown before the condition that followed it
+    assert lines[:5] == [
+        '<ul>', '<li style="background-color:lightgreen;">c0</li>', '</ul>',
+        '<h4>Request</h4>', '<pre>']
+
+    for size in range(1, 6):
+        for number in range(events.page(0, size).pages):
+            assert _balanced(iter_display(events.page(number, size)))
+
+
+def _web_ih(template, **kwargs):
+    lookup = TemplateLookup()
+    lookup.put_string('testinfo.mako', template)
+    events = _events()
+    flows = SimpleNamespace(
+        test_info={'OP-a': {'events': events, 'profile_info': None}})
+    info = WebIh(flow_state=flows, lookup=lookup, environ={},
+                 start_response=lambda *args: None, **kwargs)
+    info.flows = flows
+    return info, events
+
+
+def test_test_info_stream_opt_in():
+    info, events = _web_ih('<p>${len(events)}</p>')
+    assert ''.join(info.test_info('OP-a')) == '<p>3</p>'
+    # The template doesn't show a trace, none is rendered
+    assert [ev._render for ev in events] == [None] * 3
+
+    info, events = _web_ih('<p>${trace_output}</p>', stream_trace=True)
+    body = ''.join(info.test_info('OP-a'))
+    assert body.startswith('<p><table')
+    assert 'Done: status=OK' in body
+
+
+def test_test_info_bad_page():
+    _status = []
+    info, events = _web_ih('<p>${page.number}</p>')
+    info.start_response = lambda status, headers: _status.append(status)
+    assert ''.join(info.test_info('OP-a', page=0)) == '<p>0</p>'
+    for page in [-1, 1, 100]:
+        info.test_info('OP-a', page=page)
+    assert [s.split()[0] for s in _status] == ['200', '404', '404', '404']
@@ -0,0 +1,175 @@
+import threading
+import time
+
+import pytest
+
+from otest import Break
+from otest.aus.check import VerifyResponse
+from otest.check import CRITICAL
+from otest.check import Check
+from otest.check import OK
+from otest.check import State
+from otest.check import WARNING
+from otest.conversation import Conversation
+from otest.events import EV_ASSERTION
+from otest.events import EV_CACHED_RESULT
+from otest.events import EV_CONDITION
+from otest.events import EV_OPERATION
+from otest.rp.check import VerifyRegistrationPublicKeyRegistration
+from otest.rp.check import VerifyRegistrationRedirectUriScheme
+from otest.rp.check import VerifyRegistrationResponseTypes
+from otest.summation import trace_output
+from otest.verify import MissingTest
+from otest.verify import Verify
+
+
+class Pure(Check):
+    pure = True
+
+    def __init__(self, name, status=OK, delay=0, **kwargs):
+        Check.__init__(self, name=name, status=status, **kwargs)
+        self.name = name
+        self.status = status
+        self.delay = delay
+
+    def __call__(self, conv=None, output=None):
+        time.sleep(self.delay)
+        return State(self.name, self.status,
+                     message=threading.current_thread().name,
+                     seen=len(conv.events))
+
+
+class Impure(Pure):
+    pure = False
+
+    def __call__(self, conv=None, output=None):
+        conv.events.store(EV_OPERATION, self.name)
+        return Pure.__call__(self, conv)
+
+
+def _conv():
+    conv = Conversation({'sequence': []}, None, None)
+    conv.events.store(EV_OPERATION, 'start')
+    return conv
+
+
+def test_plan():
+    ver = Verify(None, _conv())
+    ver.ignore_check = ['Ignored']
+    Ignored = type('Ignored', (Pure,), {})
+    checks = [Pure('a'), Pure('b'), Impure('c'), Ignored('x'), Pure('d')]
+    batches = list(ver.plan(iter(checks)))
+    assert [[c.name for c in b] for b in batches] == [['a', 'b'], ['c'],
+                                                      ['d']]
+
+
+def test_order_and_snapshot():
+    conv = _conv()
+    ver = Verify(None, conv)
+    ver.test_sequence([(Pure, {'name': 'a', 'delay': 0.2}),
+                       (Pure, {'name': 'b'}),
+                       (Pure, {'name': 'c', 'delay': 0.1}),
+                       (Impure, {'name': 'd'}),
+                       (Pure, {'name': 'e'})])
+
+    conds = conv.events.get_data(EV_CONDITION)
+    assert [c.test_id for c in conds] == ['a', 'b', 'c', 'd', 'e']
+    # The concurrent ones only saw the events from before the batch
+    assert [c.kwargs['seen'] for c in conds[:3]] == [1, 1, 1]
+    assert len(set(c.message for c in conds[:3])) > 1
+    assert conds[-1].message == threading.current_thread().name
+    assert conv.events.get_data(EV_ASSERTION) == ['Pure'] * 3 + [
+        'Impure', 'Pure']
+
+
+def test_short_circuit():
+    conv = _conv()
+    ver = Verify(None, conv)
+    with pytest.raises(Break):
+        ver.test_sequence([(Pure, {'name': 'a'}),
+                           (Pure, {'name': 'b', 'status': CRITICAL}),
+                           (Pure, {'name': 'c'}),
+                           (Impure, {'name': 'd'})])
+    assert [c.test_id for c in conv.events.get_data(EV_CONDITION)] == [
+        'a', 'b']
+    assert len(conv.events.get_data(EV_ASSERTION)) == 2
+    assert conv.events.get_data(EV_OPERATION) == ['start']
+
+
+def test_missing_test():
+    conv = _conv()
+    ver = Verify(lambda cid: None, conv)
+    with pytest.raises(MissingTest):
+        ver.test_sequence([(Pure, {'name': 'a', 'status': WARNING}),
+                           (Pure, {'name': 'b'}),
+                           'no-such-check'])
+    assert [c.test_id for c in conv.events.get_data(EV_CONDITION)] == [
+        'a', 'b']
+
+
+def test_pure_inherited():
+    assert VerifyResponse.pure
+
+    class MyVerifyResponse(VerifyResponse):
+        def _func(self, conv):
+            return {}
+
+    assert not MyVerifyResponse.pure
+    assert type('Other', (VerifyResponse,), {}).pure
+
+
+def test_impure_rp_checks():
+    # Reads conv.data
+    assert not VerifyRegistrationRedirectUriScheme.pure
+    # Fetches keys
+    assert not VerifyRegistrationPublicKeyRegistration.pure
+    assert VerifyRegistrationResponseTypes.pure
+
+
+class Counted(Pure):
+    calls = []
+
+    def __call__(self, conv=None, output=None):
+        self.calls.append(self.name)
+        return Pure.__call__(self, conv)
+
+
+def test_memoize():
+    conv = _conv()
+    Counted.calls = []
+    sequence = [(Counted, {'name': 'a'}), (Counted, {'name': 'b'})]
+    Verify(None, conv, cls_name='Post').test_sequence(sequence)
+    Verify(None, conv).test_sequence(sequence + [(Counted, {'name': 'c'})])
+    assert Counted.calls == ['a', 'b', 'c']
+
+    conds = conv.events.get(EV_CONDITION)
+    assert [c.data.test_id for c in conds] == ['a', 'b', 'a', 'b', 'c']
+    assert [c.data.context for c in conds] == ['Post', 'Post', '', '', '']
+    assert conds[2].data is not conds[0].data
+    hits = conv.events.get(EV_CACHED_RESULT)
+    assert [e.data for e in hits] == ['Counted', 'Counted']
+    assert hits[0].kwargs['first'] == conds[0].timestamp
+    assert len(conv.events.get(EV_ASSERTION)) == 5
+    assert 'cached result Counted' in ''.join(trace_output(conv.events))
+
+    # Something new happened
+    conv.events.store(EV_OPERATION, 'more')
+    Verify(None, conv).test_sequence(sequence)
+    assert Counted.calls == ['a', 'b', 'c', 'a', 'b']
+
+    # Not memoized if not pure
+    _ver = Verify(None, conv)
+    _ver.test_sequence([(Impure, {'name': 'd'})])
+    _version = conv.events.version
+    _ver.test_sequence([(Impure, {'name': 'd'})])
+    assert conv.events.version == _version + 1
+
+
+def test_memoized_critical():
+    conv = _conv()
+    sequence = [(Pure, {'name': 'a', 'status': CRITICAL})]
+    for _ in range(2):
+        with pytest.raises(Break):
+            Verify(None, conv).test_sequence(sequence)
+    # The faults stored when the flow was stopped are new events
+    assert conv.events.get(EV_CACHED_RESULT) == []